@@ -0,0 +1,120 @@
+#include "collision.h"
+
+#include <algorithm>
+
+#include <Eigen/Dense>
+
+typedef Eigen::Matrix<float, 8, 3, Eigen::RowMajor> Corners;
+typedef Eigen::Matrix<float, 3, 3, Eigen::RowMajor> Axes;
+
+// projects both sets of corners onto the axis, and checks if the two ranges overlap
+static inline bool intersects_on_projection(const Eigen::Map<const Corners>& corners1,
+                                            const Eigen::Map<const Corners>& corners2,
+                                            const Eigen::Vector3f& axis)
+{
+    Eigen::Matrix<float, 8, 1> projection1 = corners1 * axis;
+    Eigen::Matrix<float, 8, 1> projection2 = corners2 * axis;
+    float min1 = projection1.minCoeff(), max1 = projection1.maxCoeff();
+    float min2 = projection2.minCoeff(), max2 = projection2.maxCoeff();
+
+    // if they overlap, the sum of the two lengths will be less than the length between the biggest and the smallest
+    float total_length = std::max(max1, max2) - std::min(min1, min2);
+    float sum_of_both = (max1 - min1) + (max2 - min2);
+    return total_length <= sum_of_both;
+}
+
+// separating axis test, same as unaligned_intersect in enginelib/physics.py
+bool obb_intersect(const float* corners1_ptr, const float* axes1_ptr, const float* corners2_ptr, const float* axes2_ptr)
+{
+    Eigen::Map<const Corners> corners1(corners1_ptr), corners2(corners2_ptr);
+    Eigen::Map<const Axes> axes1(axes1_ptr), axes2(axes2_ptr);
+
+    for (int i = 0; i < 3; i++)
+    {
+        if (!intersects_on_projection(corners1, corners2, axes1.row(i).transpose()))
+            return false;
+        if (!intersects_on_projection(corners1, corners2, axes2.row(i).transpose()))
+            return false;
+    }
+
+    for (int i = 0; i < 3; i++)
+    {
+        Eigen::Vector3f axis1 = axes1.row(i).transpose();
+        for (int j = 0; j < 3; j++)
+        {
+            Eigen::Vector3f axis = axis1.cross(axes2.row(j).transpose());
+            if (axis.isZero(0))  // vectors were parallel, so skip it
+                continue;
+            if (!intersects_on_projection(corners1, corners2, axis))
+                return false;
+        }
+    }
+    return true;
+}
+
+void obb_intersect_batch(const float* corners1, const float* axes1, const float* corners2, const float* axes2,
+                         int count, unsigned char* results)
+{
+    for (int i = 0; i < count; i++)
+        results[i] = obb_intersect(corners1 + i*24, axes1 + i*9, corners2 + i*24, axes2 + i*9);
+}
+
+// returns the axis with the given index (see obb_separating_axis)
+static inline Eigen::Vector3f sat_axis(const Eigen::Map<const Axes>& axes1, const Eigen::Map<const Axes>& axes2, int index)
+{
+    if (index < 3)
+        return axes1.row(index).transpose();
+    if (index < 6)
+        return axes2.row(index - 3).transpose();
+    index -= 6;
+    return axes1.row(index / 3).transpose().cross(axes2.row(index % 3).transpose());
+}
+
+int obb_separating_axis(const float* corners1_ptr, const float* axes1_ptr, const float* corners2_ptr,
+                        const float* axes2_ptr, int hint)
+{
+    Eigen::Map<const Corners> corners1(corners1_ptr), corners2(corners2_ptr);
+    Eigen::Map<const Axes> axes1(axes1_ptr), axes2(axes2_ptr);
+
+    for (int n = -1; n < 15; n++)
+    {
+        // try the hint first, then everything else in order
+        int index = n == -1 ? hint : n;
+        if (index < 0 || index >= 15 || (n != -1 && index == hint))
+            continue;
+        Eigen::Vector3f axis = sat_axis(axes1, axes2, index);
+        if (axis.isZero(0))  // a cross product of parallel vectors, so skip it
+            continue;
+        if (!intersects_on_projection(corners1, corners2, axis))
+            return index;
+    }
+    return -1;
+}
+
+void obb_separating_axis_batch(const float* corners1, const float* axes1, const float* corners2, const float* axes2,
+                               const signed char* hints, int count, signed char* results)
+{
+    for (int i = 0; i < count; i++)
+        results[i] = obb_separating_axis(corners1 + i*24, axes1 + i*9, corners2 + i*24, axes2 + i*9, hints[i]);
+}
+
+void spheres_intersect_batch(const float* centres1, const float* radii1, const float* centres2, const float* radii2,
+                             int count, unsigned char* results)
+{
+    for (int i = 0; i < count; i++)
+    {
+        Eigen::Map<const Eigen::Vector3f> centre1(centres1 + i*3), centre2(centres2 + i*3);
+        results[i] = (centre1 - centre2).norm() <= radii1[i] + radii2[i];
+    }
+}
+
+void aabb_intersect_batch(const float* min1, const float* max1, const float* min2, const float* max2,
+                          int count, unsigned char* results)
+{
+    for (int i = 0; i < count; i++)
+    {
+        Eigen::Map<const Eigen::Array3f> minimum1(min1 + i*3), maximum1(max1 + i*3);
+        Eigen::Map<const Eigen::Array3f> minimum2(min2 + i*3), maximum2(max2 + i*3);
+        results[i] = (minimum1 <= maximum2).all() && (maximum1 >= minimum2).all();
+    }
+}
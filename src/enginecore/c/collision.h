@@ -0,0 +1,31 @@
+#ifndef COLLISION_H_INCLUDED
+#define COLLISION_H_INCLUDED
+
+// the collision kernels used by enginelib.physics
+// everything works on plain contiguous float arrays so they can be called on numpy data without the GIL:
+//   corners: count * 8 * 3 floats (the world space corners of each box)
+//   axes:    count * 3 * 3 floats (the local x, y and z vectors of each box, one per row)
+//   results: count bytes, set to 1 where the pair intersects and 0 where it doesn't
+// touching counts as intersecting, to match the python version
+
+bool obb_intersect(const float* corners1, const float* axes1, const float* corners2, const float* axes2);
+
+void obb_intersect_batch(const float* corners1, const float* axes1, const float* corners2, const float* axes2,
+                         int count, unsigned char* results);
+
+// the axes are numbered 0-2 for the axes of box 1, 3-5 for the axes of box 2, and 6-14 for the cross products
+// (6 + 3*i + j being axes1[i] x axes2[j]). Returns the index of an axis that separates the boxes, or -1 if they intersect.
+// the hint is tried first, so passing the axis that separated them last time usually means only one axis gets tested
+int obb_separating_axis(const float* corners1, const float* axes1, const float* corners2, const float* axes2, int hint);
+
+// results: count signed chars, each set to the separating axis (or -1) of that pair
+void obb_separating_axis_batch(const float* corners1, const float* axes1, const float* corners2, const float* axes2,
+                               const signed char* hints, int count, signed char* results);
+
+void spheres_intersect_batch(const float* centres1, const float* radii1, const float* centres2, const float* radii2,
+                             int count, unsigned char* results);
+
+void aabb_intersect_batch(const float* min1, const float* max1, const float* min2, const float* max2,
+                          int count, unsigned char* results);
+
+#endif // COLLISION_H_INCLUDED
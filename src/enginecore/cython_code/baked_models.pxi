@@ -0,0 +1,128 @@
+"""
+a cache of imported models on disk, so assimp only has to import each model once (see load_model_data).
+
+each model is baked into one file, named after a hash of its path, modification time, size and the assimp
+post processing flags, so changing any of them just misses the cache. The file is everything in the model's MeshDatas:
+    header: magic, version, number of meshes
+    then for each mesh:
+        the number of widths in its data format, of floats, of indices and of textures,
+        its bounds (minimum, maximum, centre, radius),
+        the data format,
+        each texture path (its length then the path, padded to 4 bytes),
+        the vertex data (float32) and the indices (uint32)
+all little endian, and everything's aligned to 4 bytes, so the vertices and indices are used straight out of the
+memory mapped file, without being copied (or even read, until they're sent to the GPU)
+"""
+
+IF FALSE:
+    # this is a hack to get code inspection working
+    include "util.pxi"
+    include "model.pxi"
+
+import hashlib
+import mmap
+import struct
+
+BAKE_MAGIC = b'EMDL'
+BAKE_VERSION = 1
+bake_header = struct.Struct('<4sII')
+baked_mesh_header = struct.Struct('<IIII10f')
+
+model_cache_dir = None  # where baked models go, or None to not bake them
+
+cpdef set_model_cache_dir(path):
+    """sets where baked models are saved to and loaded from. None turns the cache off"""
+    global model_cache_dir
+    model_cache_dir = path
+
+cpdef str baked_model_path(path, post_process=None):
+    """where the baked version of a model would be, or None if the cache is turned off"""
+    if model_cache_dir is None:
+        return None
+    post_process = DEFAULT_POST_PROCESS if post_process is None else post_process
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{post_process}\0{BAKE_VERSION}'
+    return os.path.join(model_cache_dir, hashlib.sha256(key.encode()).hexdigest() + '.model')
+
+cdef int padding(int length):
+    return (4 - length % 4) % 4
+
+cpdef bytes bake_mesh_data(list meshes):
+    """the contents of a baked model file for the MeshDatas"""
+    parts = [bake_header.pack(BAKE_MAGIC, BAKE_VERSION, len(meshes))]
+    cdef MeshData mesh
+    for mesh in meshes:
+        data = memoryview(float_view(mesh.data))
+        indices = memoryview(uint_view(mesh.indices if mesh.indices is not None else ()))
+        minimum, maximum, centre, radius = mesh.bounds
+        parts.append(baked_mesh_header.pack(len(mesh.data_format), len(data), len(indices), len(mesh.texture_paths),
+                                            *minimum, *maximum, *centre, radius))
+        parts.append(struct.pack(f'<{len(mesh.data_format)}I', *mesh.data_format))
+        for texture_path in mesh.texture_paths:
+            texture_path = to_bytes(texture_path)
+            parts.append(struct.pack('<I', len(texture_path)) + texture_path + b'\0' * padding(len(texture_path)))
+        parts.append(data.tobytes())
+        parts.append(indices.tobytes())
+    return b''.join(parts)
+
+cpdef list read_baked_model(path):
+    """returns the MeshDatas in a baked model file, or None if it can't be read (or is from an old version)"""
+    try:
+        with open(path, 'rb') as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):  # ValueError is for empty files, which can't be mapped
+        return None
+
+    cdef Py_ssize_t offset = bake_header.size
+    cdef MeshData mesh
+    meshes = []
+    try:
+        magic, version, mesh_count = bake_header.unpack_from(view, 0)
+        if magic != BAKE_MAGIC or version != BAKE_VERSION:
+            return None
+        for _ in range(mesh_count):
+            format_length, float_count, index_count, texture_count, *bounds = baked_mesh_header.unpack_from(view, offset)
+            offset += baked_mesh_header.size
+            data_format = struct.unpack_from(f'<{format_length}I', view, offset)
+            offset += 4 * format_length
+            texture_paths = []
+            for _ in range(texture_count):
+                length, = struct.unpack_from('<I', view, offset)
+                texture_paths.append(bytes(view[offset + 4:offset + 4 + length]))
+                offset += 4 + length + padding(length)
+            data = view[offset:offset + 4 * float_count].cast('f')
+            offset += 4 * float_count
+            indices = view[offset:offset + 4 * index_count].cast('I')
+            offset += 4 * index_count
+            if offset > len(view):
+                return None  # it's been cut short
+            meshes.append(MeshData(data, data_format, indices, texture_paths,
+                                   (glm.vec3(bounds[0:3]), glm.vec3(bounds[3:6]), glm.vec3(bounds[6:9]), bounds[9])))
+    except (struct.error, ValueError, TypeError):  # it's broken somehow
+        return None
+    return meshes
+
+cpdef list load_model_data(path, post_process=None):
+    """
+    returns the MeshDatas of a model, from its baked version if there is one. If there isn't, it's imported (see
+    import_model_data) and then baked, so next time there will be
+    """
+    baked_path = baked_model_path(path, post_process)
+    if baked_path is not None:
+        meshes = read_baked_model(baked_path)
+        if meshes is not None:
+            return meshes
+
+    meshes = import_model_data(path, post_process)
+    if baked_path is not None:
+        try:
+            write_file_atomically(baked_path, bake_mesh_data(meshes))
+        except OSError:
+            pass  # the cache is only there to save time, so not being able to write to it isn't an error
+    return meshes
+
+cpdef int bake_model(path, post_process=None) except -1:
+    """makes sure the model is baked (importing it if it isn't), and returns how many meshes it has"""
+    if model_cache_dir is None:
+        raise RuntimeError("there's nowhere to bake models to, call set_model_cache_dir first")
+    return len(load_model_data(path, post_process))
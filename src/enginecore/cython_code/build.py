@@ -39,7 +39,7 @@ with open('config.pxi', 'w') as f:
 
 ext_modules = [Extension(name="engine",
                          language='c++',
-                         sources=['engine.pyx', '../c/engine.cpp'],
+                         sources=['engine.pyx', '../c/engine.cpp', '../c/collision.cpp'],
                          include_dirs=['.', '../ext/include', '../ext/include/nanovg/src'],
                          library_dirs=['../ext/lib'],
                          libraries=['glfw3', 'nanogui', 'assimp',
@@ -59,7 +59,7 @@ setup(
     # packages=['enginelib', 'enginelib.level'],
     # package_dir={'enginelib': '../../enginelib'},
     cmdclass={'build_ext': my_build_ext} if linux else {},
-    install_requires=['pyglm', 'pyopenal'],
+    install_requires=['pyglm', 'pyopenal', 'numpy'],
     zip_safe=False,
     ext_modules=cythonize(
         ext_modules,
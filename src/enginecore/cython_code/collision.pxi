@@ -0,0 +1,133 @@
+"""
+native collision kernels, used by enginelib.physics when they're available.
+These replace the old physics.pxi, which still called glm for every corner and so wasn't much faster than python.
+
+Every function takes contiguous float32 arrays (eg numpy arrays), and returns a bytearray with a 1 for each pair that
+intersects, and a 0 for each pair that doesn't (except obb_separating_axis_batch, which returns an axis per pair).
+The actual work is done without the GIL.
+"""
+
+cdef extern from "../c/collision.h" nogil:
+    void c_obb_intersect_batch "obb_intersect_batch"(const float* corners1, const float* axes1,
+                                                     const float* corners2, const float* axes2,
+                                                     int count, unsigned char* results)
+    void c_obb_separating_axis_batch "obb_separating_axis_batch"(const float* corners1, const float* axes1,
+                                                                 const float* corners2, const float* axes2,
+                                                                 const signed char* hints, int count,
+                                                                 signed char* results)
+    void c_spheres_intersect_batch "spheres_intersect_batch"(const float* centres1, const float* radii1,
+                                                             const float* centres2, const float* radii2,
+                                                             int count, unsigned char* results)
+    void c_aabb_intersect_batch "aabb_intersect_batch"(const float* min1, const float* max1,
+                                                       const float* min2, const float* max2,
+                                                       int count, unsigned char* results)
+
+
+cdef check_lengths(Py_ssize_t count, tuple lengths):
+    for length in lengths:
+        if length != count:
+            raise ValueError("all arrays must contain the same number of pairs")
+
+
+cdef check_boxes(const float[:, :, ::1] corners1, const float[:, :, ::1] axes1,
+                 const float[:, :, ::1] corners2, const float[:, :, ::1] axes2):
+    check_lengths(corners1.shape[0], (axes1.shape[0], corners2.shape[0], axes2.shape[0]))
+    if corners1.shape[1] != 8 or corners2.shape[1] != 8 or corners1.shape[2] != 3 or corners2.shape[2] != 3:
+        raise ValueError("corners must have shape (n, 8, 3)")
+    if axes1.shape[1] != 3 or axes2.shape[1] != 3 or axes1.shape[2] != 3 or axes2.shape[2] != 3:
+        raise ValueError("axes must have shape (n, 3, 3)")
+
+
+cpdef bytearray obb_intersect_batch(const float[:, :, ::1] corners1, const float[:, :, ::1] axes1,
+                                    const float[:, :, ::1] corners2, const float[:, :, ::1] axes2):
+    """
+    the separating axis test for a batch of oriented bounding boxes.
+    corners have shape (n, 8, 3), axes have shape (n, 3, 3) (one local axis per row)
+    """
+    cdef Py_ssize_t count = corners1.shape[0]
+    check_boxes(corners1, axes1, corners2, axes2)
+
+    results = bytearray(count)
+    if count == 0:
+        return results
+    cdef unsigned char[::1] results_view = results
+    # get the pointers while we still have the GIL (indexing can raise)
+    cdef const float* corners1_ptr = &corners1[0, 0, 0]
+    cdef const float* axes1_ptr = &axes1[0, 0, 0]
+    cdef const float* corners2_ptr = &corners2[0, 0, 0]
+    cdef const float* axes2_ptr = &axes2[0, 0, 0]
+    cdef unsigned char* results_ptr = &results_view[0]
+    with nogil:
+        c_obb_intersect_batch(corners1_ptr, axes1_ptr, corners2_ptr, axes2_ptr, count, results_ptr)
+    return results
+
+
+cpdef bytearray obb_separating_axis_batch(const float[:, :, ::1] corners1, const float[:, :, ::1] axes1,
+                                          const float[:, :, ::1] corners2, const float[:, :, ::1] axes2,
+                                          const signed char[::1] hints):
+    """
+    like obb_intersect_batch, but each result is the index of an axis separating the pair (as a signed byte),
+    or -1 if they intersect. hints has shape (n,), and is the axis to try first for each pair
+    (see obb_separating_axis in collision.h for how the axes are numbered)
+    """
+    cdef Py_ssize_t count = corners1.shape[0]
+    check_boxes(corners1, axes1, corners2, axes2)
+    check_lengths(count, (hints.shape[0],))
+
+    results = bytearray(count)
+    if count == 0:
+        return results
+    cdef unsigned char[::1] results_view = results
+    cdef const float* corners1_ptr = &corners1[0, 0, 0]
+    cdef const float* axes1_ptr = &axes1[0, 0, 0]
+    cdef const float* corners2_ptr = &corners2[0, 0, 0]
+    cdef const float* axes2_ptr = &axes2[0, 0, 0]
+    cdef const signed char* hints_ptr = &hints[0]
+    cdef signed char* results_ptr = <signed char*> &results_view[0]
+    with nogil:
+        c_obb_separating_axis_batch(corners1_ptr, axes1_ptr, corners2_ptr, axes2_ptr, hints_ptr, count, results_ptr)
+    return results
+
+
+cpdef bytearray spheres_intersect_batch(const float[:, ::1] centres1, const float[::1] radii1,
+                                        const float[:, ::1] centres2, const float[::1] radii2):
+    """centres have shape (n, 3), radii have shape (n,)"""
+    cdef Py_ssize_t count = centres1.shape[0]
+    check_lengths(count, (radii1.shape[0], centres2.shape[0], radii2.shape[0]))
+    if centres1.shape[1] != 3 or centres2.shape[1] != 3:
+        raise ValueError("centres must have shape (n, 3)")
+
+    results = bytearray(count)
+    if count == 0:
+        return results
+    cdef unsigned char[::1] results_view = results
+    cdef const float* centres1_ptr = &centres1[0, 0]
+    cdef const float* radii1_ptr = &radii1[0]
+    cdef const float* centres2_ptr = &centres2[0, 0]
+    cdef const float* radii2_ptr = &radii2[0]
+    cdef unsigned char* results_ptr = &results_view[0]
+    with nogil:
+        c_spheres_intersect_batch(centres1_ptr, radii1_ptr, centres2_ptr, radii2_ptr, count, results_ptr)
+    return results
+
+
+cpdef bytearray aabb_intersect_batch(const float[:, ::1] min1, const float[:, ::1] max1,
+                                     const float[:, ::1] min2, const float[:, ::1] max2):
+    """all arguments have shape (n, 3)"""
+    cdef Py_ssize_t count = min1.shape[0]
+    check_lengths(count, (max1.shape[0], min2.shape[0], max2.shape[0]))
+    if min1.shape[1] != 3 or max1.shape[1] != 3 or min2.shape[1] != 3 or max2.shape[1] != 3:
+        raise ValueError("bounds must have shape (n, 3)")
+
+    results = bytearray(count)
+    if count == 0:
+        return results
+    cdef unsigned char[::1] results_view = results
+    cdef const float* min1_ptr = &min1[0, 0]
+    cdef const float* max1_ptr = &max1[0, 0]
+    cdef const float* min2_ptr = &min2[0, 0]
+    cdef const float* max2_ptr = &max2[0, 0]
+    cdef unsigned char* results_ptr = &results_view[0]
+    with nogil:
+        c_aabb_intersect_batch(min1_ptr, max1_ptr, min2_ptr, max2_ptr, count, results_ptr)
+    return results
@@ -18,14 +18,16 @@ include "crash_handler.pxi"
 include "includes/gl_declarations.pxi"
 include "includes/glfw_declarations.pxd"
 include "util.pxi"
+include "gl_state.pxi"
+include "resources.pxi"
+include "program_cache.pxi"
 include "shader.pxi"
 include "model.pxi"
+include "baked_models.pxi"
 include "window.pxi"
 include "texture.pxi"
 include "nanogui.pxi"
-
-# the physics module is now pure python (the speedup was only around 20% so I'm not too fussed)
-# include "physics.pxi"
+include "collision.pxi"
 
 include "tests/test_window.pxi"
 
@@ -0,0 +1,110 @@
+"""
+keeps track of which program, vertex array and textures are bound, so binding something that's already bound doesn't
+cost a GL call. This is what makes drawing things sorted by program, mesh and texture (see enginelib.render_queue)
+cheaper than drawing them in any old order.
+
+anything that changes GL state without going through here (eg nanogui) makes this wrong, so reset_gl_state has to be
+called after it. Game.draw_entities does this before drawing anything
+"""
+
+IF FALSE:
+    # this is a hack to get code inspection working
+    include "includes/gl_declarations.pxi"
+
+DEF MAX_TEXTURE_UNITS = 32
+DEF UNKNOWN = 0xFFFFFFFF  # not a valid name for anything, so it never matches what's being bound
+
+cdef unsigned int current_program = UNKNOWN
+cdef unsigned int current_vertex_array = UNKNOWN
+cdef unsigned int current_texture_unit = UNKNOWN
+cdef unsigned int[MAX_TEXTURE_UNITS] bound_textures
+# GL objects can only be deleted while there's a context, which there isn't once the window's gone (eg when exiting)
+cdef bint gl_context_alive = False
+
+cpdef reset_gl_state():
+    """forgets what's bound, so the next bind of each thing is always done"""
+    global current_program, current_vertex_array, current_texture_unit
+    current_program = UNKNOWN
+    current_vertex_array = UNKNOWN
+    current_texture_unit = UNKNOWN
+    cdef int unit
+    for unit in range(MAX_TEXTURE_UNITS):
+        bound_textures[unit] = UNKNOWN
+
+reset_gl_state()
+
+cdef inline void use_program(unsigned int program):
+    global current_program
+    if program != current_program:
+        glUseProgram(program)
+        current_program = program
+
+cdef inline void bind_vertex_array(unsigned int vertex_array):
+    global current_vertex_array
+    if vertex_array != current_vertex_array:
+        glBindVertexArray(vertex_array)
+        current_vertex_array = vertex_array
+
+cdef inline void bind_texture(unsigned int texture):
+    """binds a 2d texture to whichever unit is active"""
+    if current_texture_unit < MAX_TEXTURE_UNITS:
+        if bound_textures[current_texture_unit] == texture:
+            return
+        bound_textures[current_texture_unit] = texture
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+cdef inline void bind_texture_to_unit(unsigned int texture, unsigned int unit):
+    global current_texture_unit
+    if unit < MAX_TEXTURE_UNITS and bound_textures[unit] == texture:
+        return
+    if unit != current_texture_unit:
+        glActiveTexture(GL_TEXTURE0 + unit)  # this works because, for example, GL_TEXTURE3 = GL_TEXTURE0 + 3
+        current_texture_unit = unit
+    bind_texture(texture)
+
+cdef inline void forget_texture(unsigned int texture):
+    """called when a texture's deleted, since its name might get reused"""
+    cdef int unit
+    for unit in range(MAX_TEXTURE_UNITS):
+        if bound_textures[unit] == texture:
+            bound_textures[unit] = UNKNOWN
+
+# GL objects can only be deleted on the main thread (the one with the context), but the things holding them can be
+# freed on any thread (eg by the garbage collector), so their __dealloc__s just queue up their names here, and
+# delete_pending_gl_objects actually deletes them, once a frame (see Game._run)
+cdef list pending_textures = []
+cdef list pending_buffers = []
+cdef list pending_vertex_arrays = []
+cdef list pending_shaders = []
+cdef list pending_programs = []
+
+cdef inline delete_later(list pending, unsigned int name):
+    if gl_context_alive and pending is not None:  # it's gone while the interpreter's shutting down
+        pending.append(name)
+
+cpdef delete_pending_gl_objects():
+    """deletes the GL objects that have been let go of since last time. This has to be called on the main thread"""
+    global pending_textures, pending_buffers, pending_vertex_arrays, pending_shaders, pending_programs
+    global current_program, current_vertex_array
+    # swapped out first, since more can be added while this is going (from other threads, or the garbage collector)
+    cdef list textures = pending_textures, buffers = pending_buffers, vertex_arrays = pending_vertex_arrays
+    cdef list shaders = pending_shaders, programs = pending_programs
+    pending_textures, pending_buffers, pending_vertex_arrays, pending_shaders, pending_programs = [], [], [], [], []
+    if not gl_context_alive:
+        return  # they went with the context
+    cdef unsigned int name
+    for name in textures:
+        forget_texture(name)  # the names might get reused
+        glDeleteTextures(1, &name)
+    for name in buffers:
+        glDeleteBuffers(1, &name)
+    for name in vertex_arrays:
+        if current_vertex_array == name:
+            current_vertex_array = UNKNOWN
+        glDeleteVertexArrays(1, &name)
+    for name in shaders:
+        glDeleteShader(name)
+    for name in programs:
+        if current_program == name:
+            current_program = UNKNOWN
+        glDeleteProgram(name)
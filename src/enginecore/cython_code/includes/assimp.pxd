@@ -1,7 +1,7 @@
 cdef extern from "assimp/Importer.hpp" namespace "Assimp":
     cpdef cppclass Importer:
         Importer() except +
-        const aiScene* ReadFile(const char* pFile, unsigned int pFlags) except +
+        const aiScene* ReadFile(const char* pFile, unsigned int pFlags) nogil except +
         const char* GetErrorString() except +
 
 cdef extern from "assimp/scene.h":
@@ -10,6 +10,7 @@ cdef extern from *:
     ctypedef float GLfloat
     ctypedef char GLchar
     ctypedef unsigned char GLboolean
+    ctypedef unsigned char GLubyte
     ctypedef void GLvoid
 
 
@@ -63,27 +64,46 @@ cdef extern from *:
     void glFinish()
     void glPixelStorei(GLenum pname, GLint param)
     void glReadPixels(GLint x, GLint y, GLsizei width, GLsizei height, GLenum format, GLenum type, GLvoid * data)
+    void glGetIntegerv(GLenum pname, GLint* data)
+    const GLubyte* glGetString(GLenum name)
 
 
     # shader functions
+    unsigned int glCreateShader(GLenum shader_type)
+    void glShaderSource(GLuint shader, GLsizei count, const GLchar** string, const GLint* length)
+    void glCompileShader(GLuint shader)
+    void glGetShaderiv(GLuint shader, GLenum pname, GLint* params)
+    void glGetShaderInfoLog(GLuint shader, GLsizei buffer_size, GLsizei* length, GLchar* info_log)
     unsigned int glCreateProgram()
     void glAttachShader(unsigned int program, unsigned int shader)
     void glLinkProgram(unsigned int program)
     void glDeleteShader(unsigned int shader)
+    void glDeleteProgram(unsigned int program)
+    void glGetProgramiv(GLuint program, GLenum pname, GLint* params)
+    void glGetProgramInfoLog(GLuint program, GLsizei buffer_size, GLsizei* length, GLchar* info_log)
+    void glBindAttribLocation(GLuint program, GLuint index, const GLchar* name)
+    GLint glGetAttribLocation(GLuint program, const GLchar* name)
+    void glGetActiveUniform(GLuint program, GLuint index, GLsizei buffer_size, GLsizei* length, GLint* size,
+                            GLenum* type, GLchar* name)
     
     # model functions
     void glGenVertexArrays(int, unsigned int*)
+    void glDeleteVertexArrays(int count, const unsigned int* arrays)
     void glGenBuffers(int count, unsigned int* buffer_array)
     void glBindVertexArray(unsigned int)
     void glBindBuffer(unsigned int, unsigned int)
 
     void glBufferData(unsigned int target, ptrdiff_t size, const void* data, unsigned int usage)
+    void glBufferSubData(unsigned int target, ptrdiff_t offset, ptrdiff_t size, const void* data)
+    void glDeleteBuffers(int count, const unsigned int* buffers)
+    void glVertexAttribDivisor(unsigned int index, unsigned int divisor)
     void glVertexAttribPointer(unsigned int index, int size, unsigned int type,
                                unsigned char normalized, int stride, const void* pointer)
     void glEnableVertexAttribArray(unsigned int)
 
     #  texture functions
     void glGenTextures(int n, unsigned int* textures)
+    void glDeleteTextures(int n, const unsigned int* textures)
     void glBindTexture(unsigned int target, unsigned int texture)  # eg glBindTexture(GL_TEXTURE_2D, texture)
     void glTexImage2D(unsigned int target, int mipmap_level, int internal_format, int width, int height,
                       int must_be_zero, unsigned int data_format, unsigned int data_type, const void* data)
@@ -99,6 +119,9 @@ cdef extern from *:
     # engine functions
     void glDrawArrays(unsigned int, int, int)
     void glDrawElements(unsigned int mode, int count, unsigned int data_type, void* indices)  # let indices = 0 if EBO
+    void glDrawArraysInstanced(unsigned int mode, int first, int count, int instance_count)
+    void glDrawElementsInstanced(unsigned int mode, int count, unsigned int data_type, void* indices,
+                                 int instance_count)
 
     # misc functions
     void glfwSwapInterval(int)
@@ -115,16 +138,40 @@ cdef extern from *:
     unsigned int GL_COLOR_BUFFER_BIT
     unsigned int GL_DEPTH_BUFFER_BIT
     unsigned int GL_UNPACK_ALIGNMENT
+    unsigned int GL_VENDOR
+    unsigned int GL_RENDERER
+    unsigned int GL_VERSION
     
     # model constants
     unsigned int GL_ARRAY_BUFFER
     unsigned int GL_STATIC_DRAW
+    unsigned int GL_DYNAMIC_DRAW
     unsigned int GL_ELEMENT_ARRAY_BUFFER
 
     # shader constants
     int GL_FRAGMENT_SHADER
     int GL_VERTEX_SHADER
     int GL_GEOMETRY_SHADER
+    unsigned int GL_COMPILE_STATUS
+    unsigned int GL_LINK_STATUS
+    unsigned int GL_ACTIVE_UNIFORMS
+    unsigned int GL_ACTIVE_UNIFORM_MAX_LENGTH
+
+    # uniform types
+    unsigned int GL_FLOAT_VEC2
+    unsigned int GL_FLOAT_VEC3
+    unsigned int GL_FLOAT_VEC4
+    unsigned int GL_INT
+    unsigned int GL_INT_VEC2
+    unsigned int GL_INT_VEC3
+    unsigned int GL_INT_VEC4
+    unsigned int GL_BOOL
+    unsigned int GL_FLOAT_MAT2
+    unsigned int GL_FLOAT_MAT3
+    unsigned int GL_FLOAT_MAT4
+    unsigned int GL_SAMPLER_2D
+    unsigned int GL_SAMPLER_3D
+    unsigned int GL_SAMPLER_CUBE
 
     # texture constants
     unsigned int GL_TEXTURE0
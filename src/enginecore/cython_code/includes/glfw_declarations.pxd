@@ -28,6 +28,7 @@ cdef extern from *:
     void glfwMakeContextCurrent(GLFWwindow* window)
 
     GLFWglproc glfwGetProcAddress(const char* procname)
+    int glfwExtensionSupported(const char* extension)
 
     int glfwGetKey(GLFWwindow* window, int key)
     void glfwGetCursorPos(GLFWwindow* window, double* xpos, double* ypos)
@@ -1,11 +1,15 @@
 from cpython cimport array
 cimport includes.assimp as assimp
+from libc.math cimport sqrt
 import os
 from itertools import zip_longest
 
+import numpy as np
+
 IF FALSE:
     # this is a hack to get code inspection working
     include "util.pxi"
+    include "gl_state.pxi"
 
 def grouper(iterable, n, fillvalue=None):
     """Collect data into fixed-length chunks or blocks"""
@@ -14,6 +18,102 @@ def grouper(iterable, n, fillvalue=None):
     return zip_longest(*args, fillvalue=fillvalue)
 
 
+cdef const float[::1] float_view(values):
+    """the values as floats. Anything that's already a contiguous float32 buffer (eg array.array('f')) isn't copied"""
+    try:
+        return values
+    except (TypeError, ValueError, BufferError):
+        return array.array('f', values)
+
+cdef const unsigned int[::1] uint_view(values):
+    """like float_view, but for uint32s"""
+    try:
+        return values
+    except (TypeError, ValueError, BufferError):
+        return array.array('I', values)
+
+cdef list box_corners(minimum, maximum):
+    corners = []
+    x = (minimum, maximum)
+    for a, b, c in itertools.product([0, 1], repeat=3):
+        corners.append(glm.vec3(x[a][0], x[b][1], x[c][2]))
+    return corners
+
+cdef object vertex_positions(values, int width):
+    """
+    a (n, 3) numpy view of the vertices in some packed data (the first 3 of every width floats). Nothing's copied if
+    the data is already a float32 buffer, so it's read only, and only valid while the data is
+    """
+    data = np.frombuffer(float_view(values), dtype=np.float32)
+    return data[:len(data) - len(data) % width].reshape(-1, width)[:, :3]
+
+cdef tuple mesh_bounds(values, int width):
+    """
+    returns (minimum, maximum, centre, radius) for the vertices in some packed data (the first 3 of every width floats).
+    The centre is the average of the vertices
+    """
+    vertices = vertex_positions(values, width)
+    if not len(vertices):
+        return glm.vec3(0), glm.vec3(0), glm.vec3(0), 0.0
+    centre = vertices.mean(axis=0, dtype=np.float64)
+    offsets = vertices - centre
+    radius = sqrt(np.einsum('ij,ij->i', offsets, offsets).max())
+    return (glm.vec3(*vertices.min(axis=0).tolist()), glm.vec3(*vertices.max(axis=0).tolist()),
+            glm.vec3(*centre.tolist()), radius)
+
+cdef tuple oriented_bounds(values, int width):
+    """
+    a box that's (usually) tighter than the axis aligned one, lined up with the principal components of the vertices.
+    Returns (centre, axes, half_extents), where axes is a (3, 3) array with one unit vector per row (right handed), so
+    the corners are centre + sum(+-half_extents[i] * axes[i])
+    """
+    vertices = vertex_positions(values, width)
+    if not len(vertices):
+        return np.zeros(3), np.eye(3), np.zeros(3)
+    mean = vertices.mean(axis=0, dtype=np.float64)
+    offsets = vertices - mean
+    _, eigenvectors = np.linalg.eigh(offsets.T @ offsets)
+    axes = eigenvectors.T
+    if np.linalg.det(axes) < 0:
+        axes[2] *= -1
+    projected = offsets @ axes.T
+    low, high = projected.min(axis=0), projected.max(axis=0)
+    return mean + (low + high) / 2 @ axes, axes, (high - low) / 2
+
+cdef class MeshData:
+    """
+    everything needed to make a Mesh, without anything being sent to the GPU yet. Unlike a Mesh, this can be made
+    without a window (eg to bake models, see baked_models.pxi)
+    """
+    cdef public object data  # the interleaved float32 vertex data
+    cdef public tuple data_format
+    cdef public object indices  # uint32
+    cdef public list texture_paths  # in unit order
+    cdef public tuple bounds  # see mesh_bounds
+
+    def __init__(self, data, data_format, indices, texture_paths, bounds=None):
+        self.data = data
+        self.data_format = tuple(data_format)
+        self.indices = indices
+        self.texture_paths = list(texture_paths)
+        self.bounds = bounds if bounds is not None else mesh_bounds(data, sum(data_format))
+
+    cpdef upload(self, flip_on_load=True, textures=None):
+        """makes the Mesh, loading its textures, unless the Textures to use instead (one per texture path) are given"""
+        if textures is None:
+            textures = [Texture(path, flip_on_load=flip_on_load, name=path) for path in self.texture_paths]
+        return Mesh(self.data, self.data_format, self.indices, textures=textures, bounds=self.bounds)
+
+keep_mesh_data = True  # whether meshes keep their vertices once they're on the GPU, unless told otherwise
+
+cpdef set_keep_mesh_data(bint keep):
+    """
+    sets whether new meshes keep a copy of their data after it's been uploaded (see Mesh.release_data). Without it,
+    the bounds still work, but get_vertices doesn't
+    """
+    global keep_mesh_data
+    keep_mesh_data = keep
+
 # noinspection PyAttributeOutsideInit
 cdef class Mesh:
     """
@@ -24,7 +124,8 @@ cdef class Mesh:
      - a hitbox (currently automatically approximated)
     """
     cdef unsigned int VAO, VBO, EBO
-    cdef public raw_data
+    cdef readonly raw_data  # the packed vertex data, as a float32 buffer. None once it's been released (see release_data)
+    cdef readonly indices
     cdef public data_format
     cdef public corners
     cdef readonly bounding_radius
@@ -32,74 +133,84 @@ cdef class Mesh:
     cdef public dict textures
     cdef int no_of_indices
     cdef bint indexed
+    cdef unsigned long long instance_buffer  # the id of the InstanceBuffer the VAO's instance matrix comes from
+    cdef readonly Py_ssize_t gpu_bytes  # the size of the vertex and index buffers
+    cdef readonly tuple oriented_box  # see calculate_oriented_bounds
 
-    def __cinit__(self, py_data, data_format, indices=None, textures=None, *args, **kwargs):
+    def __cinit__(self, py_data, data_format, indices=None, textures=None, bounds=None, keep_data=None,
+                  *args, **kwargs):
         self.VAO = 0
         self.VBO = 0
         self.EBO = 0
         self.textures = {}   # unit : texture
 
-        self.raw_data = py_data
+        # as typed buffers, so a list of floats is only converted once, and takes a quarter of the memory
+        self.raw_data = float_view(py_data).base
         self.data_format = data_format
-        self.calculate_bounding_box()
-        self.calculate_bounding_sphere()
+        self.indices = uint_view(indices).base if indices is not None else None
+        if bounds is None:
+            self.calculate_bounding_box()
+            self.calculate_bounding_sphere()
+        else:  # already worked out, eg by MeshData
+            minimum, maximum, self.centre, self.bounding_radius = bounds
+            self.corners = box_corners(minimum, maximum)
 
         if textures is not None:
             for unit, texture in enumerate(textures):
                 self.add_texture(texture, unit)
 
-        self.buffer_packed_data(py_data, data_format, indices)
+        self.buffer_packed_data(self.raw_data, data_format, self.indices)
+        if not (keep_mesh_data if keep_data is None else keep_data):
+            self.release_data()
 
     def __init__(self, py_data, data_format, indices=None, *args, **kwargs):
         pass
+
+    def __dealloc__(self):
+        delete_later(pending_vertex_arrays, self.VAO)
+        delete_later(pending_buffers, self.VBO)
+        if self.EBO:
+            delete_later(pending_buffers, self.EBO)
     
+    cdef object kept_data(self):
+        if self.raw_data is None:
+            raise ValueError("the mesh's data has been released")
+        return self.raw_data
+
     def get_vertices(self):
-        for data in grouper(self.raw_data, sum(self.data_format)):
-            yield data[:3]
+        """the vertices, as a (n, 3) numpy view of raw_data"""
+        return vertex_positions(self.kept_data(), sum(self.data_format))
+
+    cpdef release_data(self):
+        """
+        forgets the CPU copy of the vertices and indices, once they're on the GPU. The bounds are kept, but they can't
+        be calculated again (and neither can calculate_oriented_bounds, if it hasn't been already)
+        """
+        self.raw_data = None
+        self.indices = None
 
     cpdef calculate_bounding_box(self):
-        minimum = glm.vec3(float('inf'))
-        maximum = glm.vec3(float('-inf'))
-        for x, y, z in self.get_vertices():
-            if x > maximum.x:
-                maximum.x = x
-            elif x < minimum.x:
-                minimum.x = x
-            if y > maximum.y:
-                maximum.y = y
-            elif y < minimum.y:
-                minimum.y = y
-            if z > maximum.z:
-                maximum.z = z
-            elif z < minimum.z:
-                minimum.z = z
-
-        corners = []
-        x = (minimum, maximum)
-        for a, b, c in itertools.product([0, 1], repeat=3):
-            corners.append(glm.vec3(x[a][0], x[b][1], x[c][2]))
-
-        self.corners = corners
-        return corners
+        vertices = self.get_vertices()
+        if len(vertices):
+            minimum, maximum = glm.vec3(*vertices.min(axis=0).tolist()), glm.vec3(*vertices.max(axis=0).tolist())
+        else:
+            minimum = maximum = glm.vec3(0)
+        self.corners = box_corners(minimum, maximum)
+        return self.corners
 
     cpdef calculate_bounding_sphere(self):
         # set centre to average of all vertices   todo maybe it'd be better to use centre of aabb?
-        centre = glm.vec3(0)
-        vertices = list(self.get_vertices())
-        for vert in vertices:
-            centre += vert
-        centre /= len(vertices)
-
-        # calculate radius -- greatest distance from centre
-        cdef r = 0
-        for vert in vertices:
-            if glm.length(vert-centre) > r:
-                r = glm.length(vert-centre)
-
-        self.bounding_radius = r
-        self.centre = centre
-        return centre, r
+        # and the radius to the greatest distance from it
+        _, _, self.centre, self.bounding_radius = mesh_bounds(self.kept_data(), sum(self.data_format))
+        return self.centre, self.bounding_radius
 
+    cpdef calculate_oriented_bounds(self):
+        """
+        works out a tight box around the mesh, which isn't aligned to its axes (see oriented_bounds). This isn't done
+        unless it's asked for, since it's slower than the other bounds. The result is kept in oriented_box
+        """
+        self.oriented_box = oriented_bounds(self.kept_data(), sum(self.data_format))
+        return self.oriented_box
 
     cdef buffer_packed_data(self, py_data, data_format, indices=None):
         """
@@ -111,9 +222,8 @@ cdef class Mesh:
          ...
          ]
         """
-        # convert python list to array.array
-        cdef array.array data = array.array('f', py_data)
-        cdef array.array index_array
+        cdef const float[::1] data = float_view(py_data)
+        cdef const unsigned int[::1] index_data
         cdef int length = len(data)
         cdef int total_width = sum(data_format)
 
@@ -121,12 +231,12 @@ cdef class Mesh:
         glGenVertexArrays(1, &self.VAO)
         glGenBuffers(1, &self.VBO)
 
-        glBindVertexArray(self.VAO)
+        bind_vertex_array(self.VAO)
         glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
 
         # buffer data
         glBufferData(target=GL_ARRAY_BUFFER, size=sizeof(float)*length,
-                     data=data.data.as_floats, usage=GL_STATIC_DRAW)
+                     data=&data[0] if length else NULL, usage=GL_STATIC_DRAW)
 
         # add format info
         cdef int i, width, offset = 0
@@ -136,27 +246,54 @@ cdef class Mesh:
             glEnableVertexAttribArray(i)
             offset += width
 
-        if indices:
-            index_array = array.array('i', indices)
+        if indices is not None and len(indices):
+            index_data = uint_view(indices)
             glGenBuffers(1, &self.EBO)
             glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
-            glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(indices)*sizeof(int),
-                         index_array.data.as_ints, GL_STATIC_DRAW)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, len(index_data)*sizeof(unsigned int),
+                         &index_data[0], GL_STATIC_DRAW)
             self.indexed = True
-            self.no_of_indices = len(indices)
+            self.no_of_indices = len(index_data)
         else:
             self.indexed = False
-            self.no_of_indices = len(data) / sum(data_format)
+            self.no_of_indices = length // total_width
+        self.gpu_bytes = sizeof(float) * length + (sizeof(unsigned int) * self.no_of_indices if self.indexed else 0)
 
     cpdef void bind(self):
-        glBindVertexArray(self.VAO)
+        bind_vertex_array(self.VAO)
 
     cpdef bind_textures(self, ShaderProgram shader=None):
         for unit, texture in self.textures.items():
-            if shader is not None:
+            # the sampler uniforms always hold the same thing, so each program only needs them setting once
+            if shader is not None and unit not in shader.sampler_units:
                 shader.set_value("texture_" + str(unit), unit)
+                shader.sampler_units.add(unit)
             texture.bind_to_unit(unit)
 
+    cdef void use_instance_buffer(self, InstanceBuffer instances):
+        """points the instance matrix attribute at the buffer. The VAO remembers it, so this is usually a no-op"""
+        cdef int column
+        if self.instance_buffer == instances.id:
+            return
+        glBindBuffer(GL_ARRAY_BUFFER, instances.VBO)
+        for column in range(4):  # a mat4 attribute is really 4 vec4s, one per column
+            glVertexAttribPointer(INSTANCE_MATRIX_LOCATION + column, 4, GL_FLOAT, 0, 16 * sizeof(float),
+                                  <void*>(4 * column * sizeof(float)))
+            glEnableVertexAttribArray(INSTANCE_MATRIX_LOCATION + column)
+            glVertexAttribDivisor(INSTANCE_MATRIX_LOCATION + column, 1)  # ie move on once per instance, not per vertex
+        self.instance_buffer = instances.id
+
+    cpdef draw_instanced(self, ShaderProgram shader, InstanceBuffer instances, int count,
+                         unsigned int mode=GL_TRIANGLES):
+        """draws the first count instances in the buffer"""
+        self.bind()
+        self.use_instance_buffer(instances)
+        self.bind_textures(shader)
+        if self.indexed:
+            glDrawElementsInstanced(mode, self.no_of_indices, GL_UNSIGNED_INT, NULL, count)
+        else:
+            glDrawArraysInstanced(mode, 0, self.no_of_indices, count)
+
     cpdef add_texture(self, Texture texture, unit, overwrite=False):
         if not overwrite and unit in self.textures:
             raise ValueError("Unit {} already has associated texture".format(unit))
@@ -171,6 +308,56 @@ cdef class Mesh:
         else:
             glDrawArrays(mode, 0, self.no_of_indices)
 
+cdef unsigned long long instance_buffers_made = 0
+
+cdef class InstanceBuffer:
+    """
+    a buffer of model matrices, one per instance, for drawing lots of copies of the same meshes in one go (see
+    Mesh.draw_instanced). The vertex shader gets each one as `in mat4 instanceMatrix`.
+    Matrices are uploaded as (n, 4, 4) float32 arrays, where each [i] is the column major matrix, ie numpy's transpose
+    """
+    cdef readonly unsigned int VBO
+    cdef readonly int capacity  # how many matrices fit in the buffer as it is
+    cdef unsigned long long id  # unlike the VBO's name, this is never reused, so meshes can tell buffers apart
+
+    def __cinit__(self):
+        global instance_buffers_made
+        glGenBuffers(1, &self.VBO)
+        self.capacity = 0
+        instance_buffers_made += 1
+        self.id = instance_buffers_made
+
+    def __dealloc__(self):
+        delete_later(pending_buffers, self.VBO)
+
+    cpdef upload(self, const float[:, :, ::1] matrices, int start=0, int stop=-1):
+        """
+        uploads matrices[start:stop]. If the buffer's too small for all of the matrices, it's made bigger,
+        and they're all uploaded instead
+        """
+        if matrices.shape[1] != 4 or matrices.shape[2] != 4:
+            raise ValueError("instance matrices must have shape (n, 4, 4)")
+        cdef int count = matrices.shape[0]
+        if stop < 0 or stop > count:
+            stop = count
+        if count == 0 or start >= stop:
+            return
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
+        if count > self.capacity:
+            glBufferData(GL_ARRAY_BUFFER, count * 16 * sizeof(float), &matrices[0, 0, 0], GL_DYNAMIC_DRAW)
+            self.capacity = count
+        else:
+            glBufferSubData(GL_ARRAY_BUFFER, start * 16 * sizeof(float), (stop - start) * 16 * sizeof(float),
+                            &matrices[start, 0, 0])
+
+    cpdef draw(self, meshes, ShaderProgram shader, int count, unsigned int mode=GL_TRIANGLES):
+        """draws count instances of each of the meshes"""
+        cdef Mesh mesh
+        shader.use()
+        for mesh in meshes:
+            mesh.draw_instanced(shader, self, count, mode)
+
 # noinspection PyAttributeOutsideInit
 cdef class Model:
     """
@@ -178,8 +365,8 @@ cdef class Model:
      - a shader program
      - a list of meshes
     """
-    cdef public object meshes
-    cdef public ShaderProgram shader_program
+    cdef object _meshes
+    cdef ShaderProgram _shader_program
 
     cdef readonly bounding_radius
 
@@ -188,32 +375,58 @@ cdef class Model:
 
     def __init__(self, meshes, vert_path, frag_path, geo_path=None):
         self.meshes = meshes
-        self.shader_program = ShaderProgram(vert_path, frag_path, geo_path)
+        self.shader_program = get_shader_program(vert_path, frag_path, geo_path)
         self.calculate_bounding_sphere()
 
+    def __dealloc__(self):
+        release_resource(self._meshes)
+        release_resource(self._shader_program)
+
+    # models count as users of their meshes and shader program, so they're kept while they're being drawn
+    # (see resources.pxi)
+    @property
+    def meshes(self):
+        return self._meshes
+
+    @meshes.setter
+    def meshes(self, meshes):
+        acquire_resource(meshes)
+        release_resource(self._meshes)
+        self._meshes = meshes
+
+    @property
+    def shader_program(self):
+        return self._shader_program
+
+    @shader_program.setter
+    def shader_program(self, ShaderProgram shader_program):
+        acquire_resource(shader_program)
+        release_resource(self._shader_program)
+        self._shader_program = shader_program
+
     cpdef draw(self, unsigned int mode=GL_TRIANGLES):
-        if not self.meshes:
+        if not self._meshes:
             raise RuntimeError('Model was not properly init! Was super() called?')
 
-        for mesh in self.meshes:
-            mesh.draw(self.shader_program, mode=mode)
+        for mesh in self._meshes:
+            mesh.draw(self._shader_program, mode=mode)
 
     cpdef draw_with_shader(self, ShaderProgram shader_program, unsigned int mode=GL_TRIANGLES):
-        if not self.meshes:
+        if not self._meshes:
             raise RuntimeError('Model was not properly init! Was super() called?')
 
-        for mesh in self.meshes:
+        for mesh in self._meshes:
             mesh.draw(shader_program, mode=mode)
 
     cpdef recalculate_bounding_sphere(self):
-        for mesh in self.meshes:
+        for mesh in self._meshes:
             mesh.calculate_bounding_sphere()
         self.calculate_bounding_sphere()
 
     cpdef calculate_bounding_sphere(self):
         # centre is implicitly the origin
         cdef r = 0
-        for mesh in self.meshes:
+        for mesh in self._meshes:
             mesh_r = glm.length(mesh.centre) + mesh.bounding_radius
             if mesh_r > r:
                 r = mesh_r
@@ -222,25 +435,75 @@ cdef class Model:
         return r
 
 
-cpdef load_model(path_str, flip_on_load=True):
+DEFAULT_POST_PROCESS = assimp.aiProcess_Triangulate | assimp.aiProcess_FlipUVs
+
+class MeshList(list):
+    """the meshes of a model, as shared by everything using it (see load_model)"""
+
+cpdef cached_model(tuple key):
+    """the MeshList cached under the key (see model_cache_key), or None if there isn't one"""
+    return resources.get('model', key)
+
+cpdef cache_model(tuple key, meshes):
+    """caches a model's meshes (see resources.pxi), and returns them as a MeshList"""
+    meshes = MeshList(meshes)
+    cdef Mesh mesh
+    cdef Py_ssize_t size = 0
+    for mesh in meshes:
+        size += mesh.gpu_bytes
+    return resources.add('model', key, meshes, size)
+
+cpdef tuple model_cache_key(path_str, flip_on_load=True, post_process=None):
+    post_process = DEFAULT_POST_PROCESS if post_process is None else post_process
+    return os.path.abspath(path_str), os.path.getmtime(path_str), bool(flip_on_load), post_process
+
+cpdef load_model(path_str, flip_on_load=True, post_process=None):
     """
-    Given a path, attempt to load that model. 
+    Given a path, return the meshes of that model. The same list of meshes is shared between everything which loads
+    the same model (so it's only imported and sent to the GPU once), and is freed some time after none of them are
+    using it (see resources.pxi).
+    That means changing the meshes (eg adding textures) changes them for everything; use import_model for a copy of
+    your own.
     The flip_on_load is because most, but not all, texture are stored backwards.
     """
+    key = model_cache_key(path_str, flip_on_load, post_process)
+    meshes = cached_model(key)
+    if meshes is None:
+        # from the baked version if there is one, otherwise this imports it (and bakes it for next time)
+        mesh_data = load_model_data(path_str, post_process)
+        meshes = cache_model(key, [data.upload(flip_on_load) for data in mesh_data])
+    return meshes
+
+cpdef import_model(path_str, flip_on_load=True, post_process=None):
+    """
+    Given a path, attempt to import that model, and returns a new list of its meshes (see load_model).
+    post_process is the assimp post processing flags, which default to DEFAULT_POST_PROCESS
+    """
+    return MeshList([data.upload(flip_on_load) for data in import_model_data(path_str, post_process)])
 
+cpdef list import_model_data(path_str, post_process=None):
+    """
+    imports the model with assimp, and returns a MeshData for each of its meshes. This doesn't need a window, so it
+    can be done on another thread (see enginelib.assets)
+    """
     cdef bytes path = to_bytes(path_str)
+    cdef const char* c_path = path
     cdef assimp.Importer importer
+    cdef unsigned int flags = DEFAULT_POST_PROCESS if post_process is None else post_process
+    cdef const assimp.aiScene* scene
 
     # a scene contains (among other things) a tree of nodes, which contains some number of meshes
-    # here, we just flatten that tree to put all the meshes in a bag, since that's what Model expects
-    cdef const assimp.aiScene* scene = importer.ReadFile(path, assimp.aiProcess_Triangulate | assimp.aiProcess_FlipUVs)
+    # here, we just flatten that tree to put all the meshes in a bag, since that's what Model expects.
+    # reading and importing the file is the slow part, and doesn't touch python, so other threads can run meanwhile
+    with nogil:
+        scene = importer.ReadFile(c_path, flags)
 
     if scene is NULL or (scene.mFlags & assimp.AI_SCENE_FLAGS_INCOMPLETE) or not scene.mRootNode:
         raise RuntimeError("ERROR [MODEL]: " + importer.GetErrorString().decode())
 
-    return process_node(scene.mRootNode, scene, path, meshes=None, flip_on_load=flip_on_load)
+    return process_node(scene.mRootNode, scene, path, meshes=None)
 
-cdef process_node(assimp.aiNode* node, const assimp.aiScene* scene, path, meshes=None, flip_on_load=True):
+cdef process_node(assimp.aiNode* node, const assimp.aiScene* scene, path, meshes=None):
     """traverse the tree depth first (pre-order), adding all the meshes as we go"""
     cdef assimp.aiMesh* mesh
     cdef assimp.aiNode* child_node
@@ -248,58 +511,70 @@ cdef process_node(assimp.aiNode* node, const assimp.aiScene* scene, path, meshes
 
     for mesh_index in node.mMeshes[:node.mNumMeshes]:
         mesh = scene.mMeshes[mesh_index]
-        meshes.append(process_mesh(mesh, scene, path, flip_on_load))
+        meshes.append(process_mesh(mesh, scene, path))
     for child_node in node.mChildren[:node.mNumChildren]:
-        process_node(child_node, scene, path, meshes=meshes, flip_on_load=flip_on_load)
+        process_node(child_node, scene, path, meshes=meshes)
 
     return meshes
 
-cdef process_mesh(assimp.aiMesh* mesh, const assimp.aiScene* scene, path, flip_on_load=True):
-    """loads the data from the mesh and converts it into a Mesh object"""
-    cdef assimp.aiVector3D* ai_vector
-    cdef assimp.aiFace* face
+cdef array.array float_array_template = array.array('f')
+cdef array.array uint_array_template = array.array('I')
 
-    # vertices, normals and texture_coords
-    vertices = []
-    normals = []
-    texture_coords = []
-    for ai_vector in mesh.mVertices[:mesh.mNumVertices]:
-        vertices.append((ai_vector.x, ai_vector.y, ai_vector.z))
-    for ai_vector in mesh.mNormals[:mesh.mNumVertices]:
-        normals.append((ai_vector.x, ai_vector.y, ai_vector.z))
-    if mesh.mTextureCoords[0] is not NULL:
-        for ai_vector in mesh.mTextureCoords[0][:mesh.mNumVertices]:
-            texture_coords.append((ai_vector.x, ai_vector.y))
+cdef MeshData process_mesh(assimp.aiMesh* mesh, const assimp.aiScene* scene, path):
+    """copies the data out of the mesh into a MeshData"""
+    cdef unsigned int i, j, n = mesh.mNumVertices, index_count = 0
+    cdef bint has_texture_coords = mesh.mTextureCoords[0] is not NULL
+    cdef int width = 8 if has_texture_coords else 6
+    cdef assimp.aiFace* face
+    cdef bint non_triangles = False
+
+    # the vertices, normals and texture coords, interleaved straight out of assimp's arrays
+    cdef array.array data = array.clone(float_array_template, n * width, zero=False)
+    cdef float* out = data.data.as_floats
+    with nogil:
+        for i in range(n):
+            out[0] = mesh.mVertices[i].x
+            out[1] = mesh.mVertices[i].y
+            out[2] = mesh.mVertices[i].z
+            if mesh.mNormals is not NULL:
+                out[3] = mesh.mNormals[i].x
+                out[4] = mesh.mNormals[i].y
+                out[5] = mesh.mNormals[i].z
+            else:
+                out[3] = out[4] = out[5] = 0
+            if has_texture_coords:
+                out[6] = mesh.mTextureCoords[0][i].x
+                out[7] = mesh.mTextureCoords[0][i].y
+            out += width
+    data_format = (3, 3, 2)
+    if not has_texture_coords:
+        data_format = (3, 3)
 
     # indices
-    indices = []
-    for face in mesh.mFaces[:mesh.mNumFaces]:
-        if face.mNumIndices != 3:
-            print("WARNING: Non triangle detected. May mess up rendering")
-        for index in face.mIndices[:face.mNumIndices]:
-            indices.append(index)
-
-    data = []
-    if texture_coords:
-        data_zip = zip(vertices, normals, texture_coords)
-        data_format = (3, 3, 2)
-    else:
-        data_zip = zip(vertices, normals)
-        data_format = (3, 3)
-    for coords in data_zip:
-        data.extend(sum(coords, ()))  # flatten the tuple of tuples into a single tuple
+    for i in range(mesh.mNumFaces):
+        index_count += mesh.mFaces[i].mNumIndices
+    cdef array.array indices = array.clone(uint_array_template, index_count, zero=False)
+    cdef unsigned int* index_out = indices.data.as_uints
+    with nogil:
+        for i in range(mesh.mNumFaces):
+            face = &mesh.mFaces[i]
+            non_triangles |= face.mNumIndices != 3
+            for j in range(face.mNumIndices):
+                index_out[0] = face.mIndices[j]
+                index_out += 1
+    if non_triangles:
+        print("WARNING: Non triangle detected. May mess up rendering")
 
     cdef assimp.aiMaterial* material = scene.mMaterials[mesh.mMaterialIndex]
-    diff_textures = load_textures_from_material(material, assimp.aiTextureType_DIFFUSE, path, "diffuse", flip_on_load)
+    diff_textures = texture_paths_from_material(material, assimp.aiTextureType_DIFFUSE, path, "diffuse")
     # the following are being ignored until i sort out the shaders, since i dont have lighting yet
     # todo fix this once i've added lighting
-    #spec_textures = load_textures_from_material(material, assimp.aiTextureType_SPECULAR, path)
-    #ambient_textures =  load_textures_from_material(material, assimp.aiTextureType_AMBIENT, path)
+    #spec_textures = texture_paths_from_material(material, assimp.aiTextureType_SPECULAR, path)
+    #ambient_textures =  texture_paths_from_material(material, assimp.aiTextureType_AMBIENT, path)
 
-    return Mesh(data, data_format, indices, textures=diff_textures)  # + spec_textures + ambient_textures
+    return MeshData(data, data_format, indices, diff_textures)  # + spec_textures + ambient_textures
 
-cdef load_textures_from_material(assimp.aiMaterial* material, assimp.aiTextureType texture_type, path, type_name_str,
-                                 flip_on_load):
+cdef texture_paths_from_material(assimp.aiMaterial* material, assimp.aiTextureType texture_type, path, type_name_str):
     cdef bytes directory = os.path.dirname(path)
     cdef unsigned int texture_count = material.GetTextureCount(texture_type)
     cdef assimp.aiString ai_string
@@ -307,6 +582,4 @@ cdef load_textures_from_material(assimp.aiMaterial* material, assimp.aiTextureTy
     for i in range(texture_count):
         material.GetTexture(texture_type, i, &ai_string)
         texture_paths.append(os.path.join(directory, ai_string.C_Str()))
-
-    textures = [Texture(texture_path, flip_on_load=flip_on_load, name=texture_path) for texture_path in texture_paths]
-    return textures
+    return texture_paths
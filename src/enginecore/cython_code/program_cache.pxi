@@ -0,0 +1,162 @@
+"""
+the bits of building shader programs that are about not waiting for the driver:
+ - linked programs are saved to disk (with ARB_get_program_binary), so the next run can load them rather than compiling
+   them again. They're keyed by a hash of the shader sources and the driver, so changing either just misses the cache,
+   and if the driver refuses a binary anyway, the program is compiled as normal and the binary replaced
+ - with KHR_parallel_shader_compile the driver compiles on threads of its own, so starting lots of programs at once
+   (see compile_shader_programs) overlaps the work instead of doing it one program at a time
+
+both are extensions, so either can be missing, in which case everything still works, just slower
+"""
+
+IF FALSE:
+    # this is a hack to get code inspection working
+    include "includes/gl_declarations.pxi"
+    include "includes/glfw_declarations.pxd"
+
+import hashlib
+
+DEF GL_PROGRAM_BINARY_RETRIEVABLE_HINT = 0x8257
+DEF GL_PROGRAM_BINARY_LENGTH = 0x8741
+DEF GL_NUM_PROGRAM_BINARY_FORMATS = 0x87FE
+DEF GL_COMPLETION_STATUS = 0x91B1  # the same for the KHR and ARB versions
+DEF MAX_COMPILER_THREADS = 0xFFFFFFFF  # ie as many as the driver likes
+
+ctypedef void (*GetProgramBinaryFunc)(GLuint program, GLsizei buffer_size, GLsizei* length, GLenum* binary_format,
+                                      void* binary)
+ctypedef void (*ProgramBinaryFunc)(GLuint program, GLenum binary_format, const void* binary, GLsizei length)
+ctypedef void (*ProgramParameteriFunc)(GLuint program, GLenum pname, GLint value)
+ctypedef void (*MaxShaderCompilerThreadsFunc)(GLuint count)
+
+# these stay NULL/False if the extensions aren't there
+cdef GetProgramBinaryFunc get_program_binary = NULL
+cdef ProgramBinaryFunc program_binary = NULL
+cdef ProgramParameteriFunc program_parameteri = NULL
+cdef bint parallel_shader_compile = False
+cdef bytes driver_string = b''
+
+shader_cache_dir = None  # where program binaries go, or None to not save them
+
+cdef void load_program_extensions():
+    """finds the extension functions. This has to be done once there's a context, so create_window calls it"""
+    global get_program_binary, program_binary, program_parameteri, parallel_shader_compile, driver_string
+    cdef GLint formats = 0
+    cdef MaxShaderCompilerThreadsFunc max_shader_compiler_threads = NULL
+
+    if glfwExtensionSupported(b'GL_ARB_get_program_binary'):
+        glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS, &formats)
+    if formats > 0:  # some drivers have the extension but no formats, so can't actually save anything
+        get_program_binary = <GetProgramBinaryFunc>glfwGetProcAddress(b'glGetProgramBinary')
+        program_binary = <ProgramBinaryFunc>glfwGetProcAddress(b'glProgramBinary')
+        program_parameteri = <ProgramParameteriFunc>glfwGetProcAddress(b'glProgramParameteri')
+        if get_program_binary == NULL or program_binary == NULL or program_parameteri == NULL:
+            get_program_binary, program_binary, program_parameteri = NULL, NULL, NULL
+
+    if glfwExtensionSupported(b'GL_KHR_parallel_shader_compile'):
+        max_shader_compiler_threads = <MaxShaderCompilerThreadsFunc>glfwGetProcAddress(
+            b'glMaxShaderCompilerThreadsKHR')
+    elif glfwExtensionSupported(b'GL_ARB_parallel_shader_compile'):
+        max_shader_compiler_threads = <MaxShaderCompilerThreadsFunc>glfwGetProcAddress(
+            b'glMaxShaderCompilerThreadsARB')
+    parallel_shader_compile = max_shader_compiler_threads != NULL
+    if parallel_shader_compile:
+        max_shader_compiler_threads(MAX_COMPILER_THREADS)
+
+    # binaries only work with exactly the driver that made them
+    driver_string = b'\n'.join([<const char*>glGetString(name) for name in (GL_VENDOR, GL_RENDERER, GL_VERSION)])
+
+cpdef set_shader_cache_dir(path):
+    """sets where program binaries are saved to and loaded from. None turns the cache off"""
+    global shader_cache_dir
+    shader_cache_dir = path
+
+cpdef bint program_binaries_supported():
+    return get_program_binary != NULL
+
+cpdef bint parallel_shader_compile_supported():
+    return parallel_shader_compile
+
+cdef str program_cache_path(list sources):
+    """where the binary for a program made from the given sources (bytes, or None for unused stages) would be"""
+    if shader_cache_dir is None or get_program_binary == NULL:
+        return None
+    key = hashlib.sha256(driver_string)
+    for source in sources:
+        # each stage's hash is the same length, so the stages can't run into each other
+        key.update(b'-' if source is None else hashlib.sha256(source).digest())
+    return os.path.join(shader_cache_dir, key.hexdigest() + '.bin')
+
+cdef bint load_program_binary(unsigned int program, str path):
+    """tries to load a linked program from the cache, and returns whether it worked (the driver can refuse it)"""
+    cdef GLint linked = 0
+    cdef bytes data
+    cdef const unsigned char* binary
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False
+    if len(data) <= 4:
+        return False
+
+    binary = data
+    program_binary(program, int.from_bytes(data[:4], 'little'), binary + 4, len(data) - 4)
+    glGetProgramiv(program, GL_LINK_STATUS, &linked)
+    if not linked:
+        try:
+            os.remove(path)  # it's out of date, so it'll never work
+        except OSError:
+            pass
+    return linked
+
+cdef save_program_binary(unsigned int program, str path):
+    cdef GLint length = 0
+    cdef GLsizei written = 0
+    cdef GLenum binary_format = 0
+    glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH, &length)
+    if length <= 0:
+        return
+
+    cdef bytearray data = bytearray(4 + length)
+    cdef unsigned char* buffer = data
+    get_program_binary(program, length, &written, &binary_format, buffer + 4)
+    data[:4] = int(binary_format).to_bytes(4, 'little')
+    try:
+        write_file_atomically(path, data[:4 + written])
+    except OSError:
+        pass  # the cache is only there to save time, so not being able to write to it isn't an error
+
+cdef unsigned int start_compiling(bytes source, GLenum shader_type):
+    """starts compiling a shader, without waiting to see if it worked (see check_compiled)"""
+    cdef unsigned int shader = glCreateShader(shader_type)
+    cdef const char* source_ptr = source
+    glShaderSource(shader, 1, &source_ptr, NULL)
+    glCompileShader(shader)
+    return shader
+
+cdef bint check_compiled(unsigned int shader, path):
+    cdef GLint success = 0
+    cdef char[1024] log
+    glGetShaderiv(shader, GL_COMPILE_STATUS, &success)
+    if not success:
+        log[0] = 0
+        glGetShaderInfoLog(shader, 1024, NULL, log)
+        print(f"SHADER ERROR: FAILED TO COMPILE {path}: {(<char*>log).decode(errors='replace')}")
+    return success
+
+cdef bint check_linked(unsigned int program, paths):
+    cdef GLint success = 0
+    cdef char[1024] log
+    glGetProgramiv(program, GL_LINK_STATUS, &success)
+    if not success:
+        log[0] = 0
+        glGetProgramInfoLog(program, 1024, NULL, log)
+        print(f"SHADER ERROR: FAILED TO LINK {paths}: {(<char*>log).decode(errors='replace')}")
+    return success
+
+cdef bint finished_linking(unsigned int program):
+    """whether the driver is done with the program, so checking how it went won't have to wait"""
+    cdef GLint done = 1
+    if parallel_shader_compile:
+        glGetProgramiv(program, GL_COMPLETION_STATUS, &done)
+    return done
@@ -0,0 +1,163 @@
+"""
+keeps track of the things on the GPU that get shared: textures, models (the MeshLists from load_model) and shader
+programs (from get_shader_program). Each is cached under a key (its paths, their modification times and whatever
+options it was loaded with), along with roughly how much GPU memory it takes up, and how many things are using it:
+ - a texture's users are the Textures made from it
+ - a model's users are the Models drawing it, and so are a shader program's
+when nothing's using something it stays cached, so loading it again (eg after hard_reload_level) doesn't cost
+anything. Once everything cached adds up to more than the budget though, the unused things are dropped, least
+recently used first, which frees them on the GPU (as long as nothing else is still holding on to them)
+"""
+
+IF FALSE:
+    # this is a hack to get code inspection working
+    include "util.pxi"
+
+from collections import OrderedDict
+
+RESOURCE_KINDS = ('texture', 'model', 'program')
+
+cdef class Resource:
+    cdef readonly str kind
+    cdef readonly object key
+    cdef readonly object value
+    cdef readonly Py_ssize_t size  # in bytes
+    cdef readonly Py_ssize_t users
+
+    def __init__(self, kind, key, value, Py_ssize_t size):
+        self.kind = kind
+        self.key = key
+        self.value = value
+        self.size = size
+
+cdef dict empty_stats():
+    return {'count': 0, 'size': 0, 'unused': 0, 'unused_size': 0, 'users': 0}
+
+cdef class ResourceManager:
+    cdef dict resources  # {(kind, key): Resource}
+    cdef dict by_id  # {id(value): Resource}, which is safe since the values are kept alive while they're in here
+    cdef object unused  # {(kind, key): None} for the resources nothing's using, least recently used first
+    cdef public Py_ssize_t budget  # in bytes
+    cdef readonly Py_ssize_t total_size
+    cdef readonly Py_ssize_t evicted  # how many resources have been dropped to stay within the budget
+
+    def __init__(self, Py_ssize_t budget=256 * 1024 * 1024):
+        self.resources = {}
+        self.by_id = {}
+        self.unused = OrderedDict()
+        self.budget = budget
+
+    cpdef get(self, str kind, key):
+        """the cached resource, or None if it isn't"""
+        cdef Resource resource = self.resources.get((kind, key))
+        if resource is None:
+            return None
+        if not resource.users:
+            self.unused.move_to_end((kind, key))
+        return resource.value
+
+    cpdef add(self, str kind, key, value, Py_ssize_t size=0):
+        """caches a resource (replacing anything with the same key), and returns it"""
+        self.remove((kind, key))
+        # room is made for it first, since whatever's adding it is about to use it, so it shouldn't be the one to go
+        self.evict(extra=size)
+        cdef Resource resource = Resource(kind, key, value, size)
+        self.resources[kind, key] = resource
+        self.by_id[id(value)] = resource
+        self.unused[kind, key] = None  # until something acquires it
+        self.total_size += size
+        return value
+
+    cdef Resource find(self, value):
+        cdef Resource resource = self.by_id.get(id(value))
+        if resource is not None and resource.value is value:
+            return resource
+        return None
+
+    cpdef acquire(self, value):
+        """adds a user to a resource. Anything that isn't a cached resource is ignored"""
+        cdef Resource resource = self.find(value)
+        if resource is None:
+            return
+        resource.users += 1
+        if resource.users == 1:
+            del self.unused[resource.kind, resource.key]
+
+    cpdef release(self, value):
+        """removes a user from a resource. Once it has none left, it can be evicted"""
+        cdef Resource resource = self.find(value)
+        if resource is None or not resource.users:
+            return
+        resource.users -= 1
+        if not resource.users:
+            self.unused[resource.kind, resource.key] = None
+            self.evict()
+
+    cpdef resize(self, value, Py_ssize_t size):
+        """changes the size of a resource, for things that aren't known when it's added"""
+        cdef Resource resource = self.find(value)
+        if resource is None:
+            return
+        self.total_size += size - resource.size
+        resource.size = size
+        self.evict()
+
+    cpdef evict(self, bint everything=False, Py_ssize_t extra=0):
+        """
+        drops unused resources until everything (plus extra bytes) fits in the budget, or until they're all gone, with
+        everything
+        """
+        while self.unused and (everything or self.total_size + extra > self.budget):
+            key, _ = self.unused.popitem(last=False)
+            self.remove(key)
+            self.evicted += 1
+
+    cdef remove(self, tuple key):
+        cdef Resource resource = self.resources.pop(key, None)
+        if resource is None:
+            return
+        del self.by_id[id(resource.value)]
+        self.unused.pop(key, None)
+        self.total_size -= resource.size
+        # everything's up to date before the value is let go of, since freeing it can release other resources
+
+    cpdef dict stats(self):
+        """
+        {kind: {'count', 'size', 'unused', 'unused_size', 'users'}, ...} for each kind of resource, as well as the
+        'total_size', 'budget' and how many resources have been 'evicted' so far. Sizes are in bytes
+        """
+        cdef Resource resource
+        stats = {kind: empty_stats() for kind in RESOURCE_KINDS}
+        for resource in self.resources.values():
+            kind_stats = stats.setdefault(resource.kind, empty_stats())
+            kind_stats['count'] += 1
+            kind_stats['size'] += resource.size
+            kind_stats['users'] += resource.users
+            if not resource.users:
+                kind_stats['unused'] += 1
+                kind_stats['unused_size'] += resource.size
+        stats.update(total_size=self.total_size, budget=self.budget, evicted=self.evicted)
+        return stats
+
+cdef ResourceManager resources = ResourceManager()
+
+cpdef set_gpu_memory_budget(Py_ssize_t budget):
+    """sets how much (in bytes) cached textures, models and programs can add up to before unused ones are dropped"""
+    resources.budget = budget
+    resources.evict()
+
+cpdef dict resource_stats():
+    """how much of each kind of resource is cached, and how much of it is being used (see ResourceManager.stats)"""
+    return resources.stats()
+
+cpdef free_unused_resources():
+    """drops every cached resource that nothing's using, whatever the budget"""
+    resources.evict(everything=True)
+
+cdef inline acquire_resource(value):
+    if resources is not None:  # it's gone while the interpreter's shutting down
+        resources.acquire(value)
+
+cdef inline release_resource(value):
+    if resources is not None:
+        resources.release(value)
@@ -9,78 +9,342 @@ IF FALSE:
     include "util.pxi"
     include "includes/gl_declarations.pxi"
     include "texture.pxi"
+    include "gl_state.pxi"
+    include "program_cache.pxi"
 
 
 from includes.cengine cimport load_shader as c_load_shader
-import ctypes
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBuffer_IsContiguous, \
+    PyBUF_ANY_CONTIGUOUS, PyBUF_FORMAT
+from libc.string cimport memcmp, memcpy
+import os
 
 
 FRAGMENT_SHADER = GL_FRAGMENT_SHADER
 VERTEX_SHADER = GL_VERTEX_SHADER
 GEOMETRY_SHADER = GL_GEOMETRY_SHADER
 
-cpdef unsigned int load_shader_from_file(path, unsigned int shader_type):
-    shader_source = open(path, 'rb').read()
-    return c_load_shader(shader_source, shader_type)
+DEF MAX_TRACKED_BYTES = 64  # the size of a mat4. Anything bigger than this (ie arrays) is always uploaded
+# where a vertex shader's `in mat4 instanceMatrix` goes (it takes up this and the next 3), see InstanceBuffer
+DEF INSTANCE_MATRIX_LOCATION = 12
 
-cdef float* value_ptr(thing):
-    """gets a raw pointer to a vector or matrix"""
-    return <float*>(<uintptr_t>ctypes.addressof(glm.value_ptr(thing).contents))
+cdef bytes add_defines(bytes source, defines):
+    """adds a #define for each of the defines ({name: value}), just after the #version line (which has to be first)"""
+    if not defines:
+        return source
+    define_lines = b''.join([b'#define ' + to_bytes(name) + b' ' + to_bytes(value) + b'\n'
+                             for name, value in defines.items()])
+    if source.lstrip().startswith(b'#version'):
+        version_line, _, rest = source.partition(b'\n')
+        return version_line + b'\n' + define_lines + rest
+    return define_lines + source
 
-cpdef load_shader_program(vert_path, frag_path, geometry_path=None):
-    cdef unsigned int vert_shader, frag_shader, geometry_shader
-    vert_shader = load_shader_from_file(vert_path, GL_VERTEX_SHADER)
-    frag_shader = load_shader_from_file(frag_path, GL_FRAGMENT_SHADER)
-    geometry_shader = load_shader_from_file(geometry_path, GL_GEOMETRY_SHADER) if geometry_path else 0
+cdef bytes read_shader_source(path, defines):
+    with open(path, 'rb') as f:
+        return add_defines(f.read(), defines)
 
-    cdef unsigned int program = glCreateProgram()
-    glAttachShader(program, vert_shader)
-    glAttachShader(program, frag_shader)
-    if geometry_shader:
-        glAttachShader(program, geometry_shader)
+cpdef unsigned int load_shader_from_file(path, unsigned int shader_type, defines=None):
+    return c_load_shader(read_shader_source(path, defines), shader_type)
 
-    glLinkProgram(program)
+cdef int uniform_components(unsigned int gl_type, bint* is_float):
+    """how many numbers make up one of a uniform type (and whether they're floats), or 0 if it isn't supported"""
+    is_float[0] = True
+    if gl_type == GL_FLOAT:
+        return 1
+    if gl_type == GL_FLOAT_VEC2:
+        return 2
+    if gl_type == GL_FLOAT_VEC3:
+        return 3
+    if gl_type == GL_FLOAT_VEC4 or gl_type == GL_FLOAT_MAT2:
+        return 4
+    if gl_type == GL_FLOAT_MAT3:
+        return 9
+    if gl_type == GL_FLOAT_MAT4:
+        return 16
+    is_float[0] = False
+    if gl_type == GL_INT or gl_type == GL_BOOL or gl_type == GL_SAMPLER_2D or gl_type == GL_SAMPLER_3D \
+            or gl_type == GL_SAMPLER_CUBE:
+        return 1
+    if gl_type == GL_INT_VEC2:
+        return 2
+    if gl_type == GL_INT_VEC3:
+        return 3
+    if gl_type == GL_INT_VEC4:
+        return 4
+    return 0
 
-    glDeleteShader(vert_shader)
-    glDeleteShader(frag_shader)
-    if geometry_shader:
-        glDeleteShader(geometry_shader)
+cdef class Uniform:
+    """
+    one of a program's active uniforms (found when it's linked), along with the last value uploaded to it,
+    so setting it to the same thing again doesn't cost a GL call
+    """
+    cdef readonly str name
+    cdef readonly int location
+    cdef readonly unsigned int gl_type
+    cdef readonly int size  # the length, if it's an array
+    cdef unsigned int program
+    cdef int components
+    cdef bint is_float
+    cdef char[MAX_TRACKED_BYTES] last_value
+    cdef int last_size  # how many bytes of last_value are in use, or 0 if it's not known
+    cdef bint last_transposed
 
-    return program
+    def __init__(self, unsigned int program, str name, int location, unsigned int gl_type, int size):
+        self.program = program
+        self.name = name
+        self.location = location
+        self.gl_type = gl_type
+        self.size = size
+        self.components = uniform_components(gl_type, &self.is_float)
+        self.last_size = 0
+
+    cdef bint changed(self, const void* data, int size, bint transposed):
+        """returns whether the data is different to what was uploaded last time, and remembers it if it is"""
+        if size == self.last_size and transposed == self.last_transposed and memcmp(data, self.last_value, size) == 0:
+            return False
+        if size <= MAX_TRACKED_BYTES:
+            memcpy(self.last_value, data, size)
+            self.last_size = size
+            self.last_transposed = transposed
+        else:
+            self.last_size = 0
+        return True
+
+    cpdef forget(self):
+        """makes the next set always upload, for when something else might have changed the uniform"""
+        self.last_size = 0
+
+    cpdef bint set(self, value) except False:
+        """
+        uploads the value, if it's changed. Single numbers can be python ints or floats, everything else is read
+        straight out of its buffer (so glm types and numpy arrays both work). 2d arrays in row major order,
+        like numpy's, are transposed for you, since glm's matrices are column major
+        """
+        cdef float float_value
+        cdef int int_value
+        cdef Py_buffer view
+        cdef int count
+        cdef bint transposed
+        if self.components == 0:
+            raise TypeError(f"uniform '{self.name}' has a type that isn't supported yet ({self.gl_type})")
+
+        if self.components == 1 and not hasattr(value, '__len__'):
+            if self.is_float:
+                float_value = value
+                if self.changed(&float_value, sizeof(float), False):
+                    use_program(self.program)
+                    glUniform1f(self.location, float_value)
+            else:
+                int_value = value  # also works for bools
+                if self.changed(&int_value, sizeof(int), False):
+                    use_program(self.program)
+                    glUniform1i(self.location, int_value)
+            return True
+
+        PyObject_GetBuffer(value, &view, PyBUF_ANY_CONTIGUOUS | PyBUF_FORMAT)
+        try:
+            if view.itemsize != 4 or view.format[0] != (b'f' if self.is_float else b'i')[0]:
+                raise TypeError(f"uniform '{self.name}' needs {'float32' if self.is_float else 'int32'} values, "
+                                f"not '{view.format.decode()}'")
+            count = view.len // (4 * self.components)
+            if count < 1 or count > self.size or view.len != count * 4 * self.components:
+                raise ValueError(f"wrong number of values for uniform '{self.name}' ({view.len // 4})")
+            transposed = view.ndim == 2 and not PyBuffer_IsContiguous(&view, b'F')
+            if not self.changed(view.buf, view.len, transposed):
+                return True
+
+            use_program(self.program)
+            if self.gl_type == GL_FLOAT_MAT4:
+                glUniformMatrix4fv(self.location, count, transposed, <float*>view.buf)
+            elif self.gl_type == GL_FLOAT_MAT3:
+                glUniformMatrix3fv(self.location, count, transposed, <float*>view.buf)
+            elif self.gl_type == GL_FLOAT_MAT2:
+                glUniformMatrix2fv(self.location, count, transposed, <float*>view.buf)
+            elif self.is_float:
+                if self.components == 1:
+                    glUniform1fv(self.location, count, <float*>view.buf)
+                elif self.components == 2:
+                    glUniform2fv(self.location, count, <float*>view.buf)
+                elif self.components == 3:
+                    glUniform3fv(self.location, count, <float*>view.buf)
+                else:
+                    glUniform4fv(self.location, count, <float*>view.buf)
+            else:
+                if self.components == 1:
+                    glUniform1iv(self.location, count, <int*>view.buf)
+                elif self.components == 2:
+                    glUniform2iv(self.location, count, <int*>view.buf)
+                elif self.components == 3:
+                    glUniform3iv(self.location, count, <int*>view.buf)
+                else:
+                    glUniform4iv(self.location, count, <int*>view.buf)
+        finally:
+            PyBuffer_Release(&view)
+        return True
+
+cdef dict active_uniforms(unsigned int program):
+    """finds every uniform the program actually uses, returns {name: Uniform}"""
+    cdef int count = 0, max_length = 0, size, i
+    cdef GLsizei length
+    cdef unsigned int gl_type
+    glGetProgramiv(program, GL_ACTIVE_UNIFORMS, &count)
+    glGetProgramiv(program, GL_ACTIVE_UNIFORM_MAX_LENGTH, &max_length)
+    cdef bytearray name_buffer = bytearray(max_length + 1)
+
+    uniforms = {}
+    for i in range(count):
+        glGetActiveUniform(program, i, max_length + 1, &length, &size, &gl_type, name_buffer)
+        name = bytes(name_buffer[:length])
+        uniform = Uniform(program, name.decode(), glGetUniformLocation(program, name), gl_type, size)
+        uniforms[uniform.name] = uniform
+        if uniform.name.endswith('[0]'):  # arrays can be set with or without the [0]
+            uniforms[uniform.name[:-3]] = uniform
+    return uniforms
 
 cdef class ShaderProgram:
+    """
+    a linked shader program. These are usually shared between everything using the same shaders
+    (see get_shader_program), and the GL program is deleted once nothing is using it any more (see resources.pxi).
+
+    Making one only starts the driver compiling it (or loads it from the program cache, see program_cache.pxi),
+    and it isn't waited for until it's first used, so lots of programs can compile at the same time
+    """
     cdef unsigned int program
     cdef public list paths
-    cdef int trans_mat_location
+    cdef readonly object defines
+    cdef dict _uniforms
+    cdef readonly object trans_mat_name
+    cdef Uniform trans_mat
+    cdef set sampler_units  # units whose texture_N uniform has already been set (see Mesh.bind_textures)
+    cdef list compiling  # [(shader, path), ...] for shaders that haven't been checked yet
+    cdef str cache_path  # where to save the program once it's linked, or None if it doesn't need saving
+    cdef bint linked  # whether the program is finished and checked (even if it didn't work)
+    cdef readonly Py_ssize_t gpu_bytes  # roughly, once it's linked (see finish)
 
-    def __init__(self, vert_path, frag_path, geo_path=None, trans_mat_name=None):
-        self.program = load_shader_program(vert_path, frag_path, geo_path)
+    def __init__(self, vert_path, frag_path, geo_path=None, trans_mat_name=None, defines=None):
         self.paths = [vert_path, frag_path, geo_path]
+        self.defines = defines
+        self.trans_mat_name = trans_mat_name if trans_mat_name is not None else 'transformMat'
+        self.sampler_units = set()
+        self.compiling = []
 
-        trans_mat_name = to_bytes(trans_mat_name) if trans_mat_name is not None else b'transformMat'
-        self.trans_mat_location = glGetUniformLocation(self.program, trans_mat_name)
+        sources = [read_shader_source(path, defines) if path else None for path in self.paths]
+        self.cache_path = program_cache_path(sources)
+        self.program = glCreateProgram()
+        if self.cache_path is not None:
+            if load_program_binary(self.program, self.cache_path):
+                self.cache_path = None  # it's already saved
+                self.finish()
+                return
+            # start again, since it's not clear what state the failed load left the program in
+            glDeleteProgram(self.program)
+            self.program = glCreateProgram()
+            program_parameteri(self.program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, True)
+
+        for source, path, shader_type in zip(sources, self.paths,
+                                             (GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, GL_GEOMETRY_SHADER)):
+            if source is not None:
+                shader = start_compiling(source, shader_type)
+                glAttachShader(self.program, shader)
+                self.compiling.append((shader, path))
+        # so shaders that can be drawn instanced don't each have to say where their instance matrix goes
+        glBindAttribLocation(self.program, INSTANCE_MATRIX_LOCATION, b'instanceMatrix')
+        glLinkProgram(self.program)
+
+    cdef int finish(self) except -1:
+        """waits for the program to link, then checks it worked and finds its uniforms"""
+        if self.linked:
+            return 0
+        self.linked = True
+        cdef bint success = True
+        cdef GLint binary_length = 0
+        for shader, path in self.compiling:
+            success &= check_compiled(shader, path)
+            glDeleteShader(shader)  # it's only actually deleted once the program is
+        self.compiling = None
+        success &= check_linked(self.program, self.paths)
+
+        if success and self.cache_path is not None:
+            save_program_binary(self.program, self.cache_path)
+        if success and get_program_binary != NULL:
+            # the closest thing to how much space it takes up that GL will say
+            glGetProgramiv(self.program, GL_PROGRAM_BINARY_LENGTH, &binary_length)
+            self.gpu_bytes = binary_length
+            # this does nothing if it's being finished in __init__ (eg loaded from the program cache), since it isn't
+            # in resources yet, so get_shader_program adds it with this size instead
+            resources.resize(self, self.gpu_bytes)
+        self._uniforms = active_uniforms(self.program)
+        self.trans_mat = self._uniforms.get(self.trans_mat_name)
+        return 0
+
+    cpdef bint ready(self):
+        """whether the program can be used without waiting for it to finish compiling"""
+        return self.linked or finished_linking(self.program)
+
+    @property
+    def instanced(self):
+        """whether the program reads its model matrix from an instanceMatrix attribute (see InstanceBuffer)"""
+        self.finish()
+        return glGetAttribLocation(self.program, b'instanceMatrix') == INSTANCE_MATRIX_LOCATION
+
+    @property
+    def uniforms(self):
+        """{name: Uniform}, for every uniform the program uses"""
+        self.finish()
+        return self._uniforms
+
+    def __dealloc__(self):
+        if self.program:
+            for shader, _path in self.compiling or ():
+                delete_later(pending_shaders, shader)
+            delete_later(pending_programs, self.program)
 
     cpdef use(self):
-        glUseProgram(self.program)
+        self.finish()
+        use_program(self.program)
 
-    cpdef bint set_trans_mat(self, value):
+    cpdef bint set_trans_mat(self, value) except False:
         self.use()
-        glUniformMatrix4fv(self.trans_mat_location, 1, False, value_ptr(value))
+        if self.trans_mat is not None:
+            self.trans_mat.set(value)
+        return True
+
+    cpdef bint set_trans_mat_array(self, const float[:, ::1] value) except False:
+        """set_trans_mat, but for a (4, 4) float32 array in row major order (eg from enginelib.transforms)"""
+        if value.shape[0] != 4 or value.shape[1] != 4:
+            raise ValueError("the transformation matrix must have shape (4, 4)")
+        return self.set_trans_mat(value.base)
 
     cpdef bint set_value(self, name, value) except False:  # i _think_ this means on error return false
         self.use()
-        cdef bytes c_name = to_bytes(name)
-        cdef int location = glGetUniformLocation(self.program, c_name)
-
-        if isinstance(value, int):  # also returns true for bools, but that's fine here
-            glUniform1i(location, value)
-        elif isinstance(value, float):
-            glUniform1f(location, value)
-        elif isinstance(value, glm.mat4):
-            glUniformMatrix4fv(location, 1, False, value_ptr(value))
-        elif isinstance(value, glm.vec4):
-            glUniform4fv(location, 1, value_ptr(value))
-        else:
-            raise TypeError("invalid type and/or type not yet implemented")
-
+        cdef Uniform uniform = self._uniforms.get(name)
+        if uniform is not None:  # if it's not used, the shader compiler will have removed it
+            uniform.set(value)
         return True
+
+cpdef ShaderProgram get_shader_program(vert_path, frag_path, geo_path=None, trans_mat_name=None, defines=None):
+    """
+    returns a ShaderProgram for the given shaders, which is shared with anything else that asked for the same ones.
+    They're only compiled if they aren't cached already (see resources.pxi), or if one of the files has changed since
+    they were.
+    Since the program is shared, don't set uniforms on it that only apply to one thing, unless they're set again before
+    every draw (or use ShaderProgram(...) directly to get a program of your own)
+    """
+    paths = [vert_path, frag_path, geo_path]
+    key = (tuple([os.path.abspath(path) if path else None for path in paths]),
+           tuple([os.path.getmtime(path) if path else None for path in paths]),
+           trans_mat_name, tuple(sorted(defines.items())) if defines else ())
+    program = resources.get('program', key)
+    if program is None:
+        program = ShaderProgram(vert_path, frag_path, geo_path, trans_mat_name, defines)
+        resources.add('program', key, program, program.gpu_bytes)
+    return program
+
+cpdef list compile_shader_programs(shaders):
+    """
+    starts compiling all of the given programs at once, without waiting for any of them to finish, and returns them.
+    shaders is a list of argument tuples for get_shader_program, eg [(vert_path, frag_path), ...].
+    Keep hold of the returned list until whatever uses the programs has got them from get_shader_program,
+    or they might be dropped from the cache again (see resources.pxi)
+    """
+    return [get_shader_program(*paths) for paths in shaders]
@@ -1,66 +1,132 @@
 IF FALSE:
     # this is a hack to get code inspection working
     include "util.pxi"
+    include "gl_state.pxi"
 
-cdef extern from "stb_image.h":
+from libc.string cimport memcpy
+
+cdef extern from "stb_image.h" nogil:
     # i dont have to #define STB_IMAGE_IMPLEMENTATION because nanogui contains a copy of it already
-    unsigned char* stbi_load(char* filename, int* x, int* y, int* channels_in_file, int desired_channels)
+    unsigned char* stbi_load(const char* filename, int* x, int* y, int* channels_in_file, int desired_channels)
     # note that if desired_channels = 0, it chooses for you (probably for the best)
     void stbi_image_free(void* data)
-    void stbi_set_flip_vertically_on_load(bint flag)
+    # there's also stbi_set_flip_vertically_on_load, but it's global, so images are flipped in decode_image instead,
+    # which means they can be decoded on more than one thread at once
 
-cpdef unsigned int load_texture_from_file(filename_str, data_format=None, flip_on_load=True) except 0:
-    """loads a texture from a file, returns 0 on failure"""
-
-    cdef bytes filename = to_bytes(filename_str)
+cdef class ImageData:
+    """a decoded image, which hasn't been sent to the GPU yet (see upload_image)"""
+    cdef readonly int width, height, channels
+    # width * height * channels bytes, a row at a time. The first row is the bottom of the image if it was decoded with
+    # flip_on_load (which is what GL expects), otherwise it's the top
+    cdef readonly object pixels
 
-    cdef int width, height, no_of_channels
-    stbi_set_flip_vertically_on_load(flip_on_load)
-    cdef unsigned char* data = stbi_load(filename, &width, &height, &no_of_channels, 0)
+    def __init__(self, int width, int height, int channels, pixels):
+        if len(pixels) != width * height * channels:
+            raise ValueError(f"expected {width * height * channels} bytes of pixels, got {len(pixels)}")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.pixels = pixels
 
+cpdef ImageData decode_image(filename_str, bint flip_on_load=True):
+    """
+    reads and decodes an image file. This doesn't need a window (or the GIL, for the slow part), so it can be done on
+    another thread (see enginelib.assets)
+    """
+    cdef bytes filename = to_bytes(filename_str)
+    cdef const char* c_filename = filename
+    cdef int width, height, no_of_channels, y
+    cdef unsigned char* data
+    with nogil:
+        data = stbi_load(c_filename, &width, &height, &no_of_channels, 0)
     if not data:
         raise FileNotFoundError("failed to load texture: " + filename.decode())
 
+    cdef size_t row = width * no_of_channels
+    cdef bytearray pixels = bytearray(row * height)
+    cdef unsigned char* out = pixels
+    with nogil:
+        # it has to be copied out of stb's memory anyway, so it's flipped while it's being copied
+        for y in range(height):
+            memcpy(out + y * row, data + (height - 1 - y if flip_on_load else y) * row, row)
+        stbi_image_free(data)
+    return ImageData(width, height, no_of_channels, pixels)
+
+cpdef unsigned int upload_image(ImageData image, data_format=None) except 0:
+    """sends a decoded image to the GPU, and returns the new texture"""
     if data_format is None:  # figure out format based on number of channels
-        data_format = {3:GL_RGB, 4:GL_RGBA}[no_of_channels]
+        data_format = {3:GL_RGB, 4:GL_RGBA}[image.channels]
+    cdef const unsigned char[::1] pixels = image.pixels
 
     cdef unsigned int texture
     glGenTextures(1, &texture)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    glTexImage2D(GL_TEXTURE_2D, mipmap_level=0, internal_format=data_format, width=width, height=height,
-                 must_be_zero=0, data_format=data_format, data_type=GL_UNSIGNED_BYTE, data=data)
+    bind_texture(texture)
+    glTexImage2D(GL_TEXTURE_2D, mipmap_level=0, internal_format=data_format, width=image.width, height=image.height,
+                 must_be_zero=0, data_format=data_format, data_type=GL_UNSIGNED_BYTE, data=&pixels[0])
     glGenerateMipmap(GL_TEXTURE_2D)
 
-    stbi_image_free(data)
-
     if texture == 0:
         raise RuntimeError("failed to create texture; reason unknown")
 
     return texture
 
-texture_cache = {}
+cpdef unsigned int load_texture_from_file(filename_str, data_format=None, flip_on_load=True) except 0:
+    """loads a texture from a file, returns 0 on failure"""
+    return upload_image(decode_image(filename_str, flip_on_load), data_format)
+
+cdef class TextureObject:
+    """a texture on the GPU, which is deleted once nothing's using it (see resources.pxi)"""
+    cdef readonly unsigned int texture
+
+    def __init__(self, unsigned int texture):
+        self.texture = texture
+
+    def __dealloc__(self):
+        if self.texture:
+            delete_later(pending_textures, self.texture)
+
+cpdef tuple texture_cache_key(texture_path, flip_on_load=True, data_format=None):
+    try:
+        modified = os.path.getmtime(texture_path)
+    except OSError:
+        modified = None  # eg it was made in memory, rather than loaded from a file
+    return os.path.abspath(texture_path), modified, bool(flip_on_load), data_format
+
+cpdef bint texture_loaded(texture_path, flip_on_load=True, data_format=None):
+    """whether making a Texture from that file would use one that's already on the GPU"""
+    return resources.get('texture', texture_cache_key(texture_path, flip_on_load, data_format)) is not None
 
 cdef class Texture:
     """
-    a super thin wrapper around texture objects
+    a super thin wrapper around texture objects. Textures made from the same file (with the same options) share the
+    same one on the GPU, which is kept (see resources.pxi) while any of them are around
     """
-    cdef unsigned int texture
+    cdef readonly unsigned int texture
+    cdef TextureObject texture_object
     cdef public object name
     cdef public object texture_type
 
-    def __init__(self, texture_path, data_format=None, flip_on_load=True, name="", texture_type=None):
-        if texture_path in texture_cache:
-            self.texture = texture_cache[texture_path]
-        else:
-            self.texture = load_texture_from_file(texture_path, data_format, flip_on_load)
-            texture_cache[texture_path] = self.texture
+    def __init__(self, texture_path, data_format=None, flip_on_load=True, name="", texture_type=None, image=None):
+        """image is the already decoded file (see decode_image), if it's been loaded ahead of time"""
+        key = texture_cache_key(texture_path, flip_on_load, data_format)
+        texture_object = resources.get('texture', key)
+        if texture_object is None:
+            if image is None:
+                image = decode_image(texture_path, flip_on_load)
+            # the mipmaps take up another third
+            size = image.width * image.height * image.channels * 4 // 3
+            texture_object = resources.add('texture', key, TextureObject(upload_image(image, data_format)), size)
+        acquire_resource(texture_object)
+        self.texture_object = texture_object
+        self.texture = self.texture_object.texture
         self.name = name
         self.texture_type = texture_type
 
+    def __dealloc__(self):
+        if self.texture_object is not None:
+            release_resource(self.texture_object)
     cpdef bind(self):
-        glBindTexture(GL_TEXTURE_2D, self.texture)
+        bind_texture(self.texture)
 
     cpdef bind_to_unit(self, int unit):
-        target_unit = GL_TEXTURE0 + unit  # this works because, for example, GL_TEXTURE3 = GL_TEXTURE0 + 3
-        glActiveTexture(unit=target_unit)
-        self.bind()
\ No newline at end of file
+        bind_texture_to_unit(self.texture, unit)
\ No newline at end of file
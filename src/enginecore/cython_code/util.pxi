@@ -3,6 +3,8 @@ from libc.string cimport strcpy, strlen
 from cpython.string cimport PyString_AsString
 import glm
 import itertools
+import os
+import threading
 
 cdef bytes to_bytes(some_string):
     if isinstance(some_string, bytes):
@@ -31,3 +33,16 @@ cdef const char** to_c_array(in_list):
         in_list[i] = to_bytes(value)
         c_array[i] = in_list[i]
     return <const char**>c_array
+
+cdef write_file_atomically(path, data):
+    """
+    writes to a temporary file first, then moves it into place, so nothing (eg another instance of the game) ever
+    reads half a file (or another thread writes the same file at the same time). Creates the directory if it needs to
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
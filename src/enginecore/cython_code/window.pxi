@@ -20,6 +20,9 @@ cdef GLFWwindow* create_window(int width, int height, const char* name):
 
     if not gladLoadGLLoader(<GLADloadproc>glfwGetProcAddress):
         print("ERROR: FAILED TO INIT GLAD")
+    global gl_context_alive
+    gl_context_alive = True
+    load_program_extensions()
 
     glEnable(GL_MULTISAMPLE)
     glEnable(GL_BLEND)
@@ -79,6 +82,9 @@ cdef class Window:
         pass
 
     def __dealloc__(self):
+        global gl_context_alive
+        delete_pending_gl_objects()
+        gl_context_alive = False
         cengine.glfwDestroyWindow(self.window)
 
     cpdef void swap_buffers(self):
@@ -0,0 +1,239 @@
+"""
+Loads models in the background, so the game keeps running while they come in (turned on with
+`Game(async_loading=True)`, otherwise models are loaded straight away, like they always were).
+
+Reading the files, importing them with assimp and decoding their textures happens on a pool of worker threads (the
+engine lets go of the GIL for the slow parts, see engine.load_model_data and engine.decode_image). Anything that
+touches GL has to happen on the main thread though, so the finished data is queued up, and once a frame (see
+Game._run) some of it is sent to the GPU, a mesh or a texture at a time, until that frame's upload_budget is used up.
+
+Until an entity's model is ready, it's drawn with a placeholder (a cube, unless placeholder_model says otherwise), and
+the real meshes are swapped in once they're all on the GPU. Textures are the same: each one is a plain white
+placeholder until it's been uploaded
+"""
+import collections
+import concurrent.futures
+import functools
+import itertools
+import queue
+import sys
+import time
+import traceback
+
+try:
+    import engine
+except ImportError:  # the engine isn't built, which is only the case when testing
+    engine = None
+
+
+def cube_data():
+    """a cube from -0.5 to 0.5, as (3, 3, 2) packed data (positions, normals, texture coords) and indices"""
+    data, indices = [], []
+    for axis, sign in itertools.product(range(3), (-1, 1)):
+        normal = [0, 0, 0]
+        normal[axis] = sign
+        first = len(data) // 8
+        for u, v in ((0, 0), (1, 0), (1, 1), (0, 1)):
+            position = [0, 0, 0]
+            position[axis] = sign / 2
+            position[(axis + 1) % 3] = u - 0.5
+            position[(axis + 2) % 3] = v - 0.5
+            data.extend(position + normal + [u, v])
+        face = [first, first + 1, first + 2, first, first + 2, first + 3]
+        indices.extend(face if sign > 0 else face[::-1])  # so every face is anticlockwise from the outside
+    return data, indices
+
+
+class ModelRequest:
+    """a model that's being loaded, and everything waiting for it"""
+
+    def __init__(self, path, flip_on_load, key):
+        self.path = path
+        self.flip_on_load = flip_on_load
+        self.key = key
+        self.callbacks = []
+        self.meshes = []  # filled in as they're uploaded
+        self.remaining = 0  # how many meshes haven't been uploaded yet
+
+
+class AssetLoader:
+    upload_budget = 0.004  # how long (in seconds) each frame can spend sending things to the GPU
+    placeholder_model = None  # the path of the model to draw until the real one is loaded, or None for a cube
+
+    def __init__(self, workers=None, upload_budget=None, placeholder_model=None):
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='asset-loader')
+        if upload_budget is not None:
+            self.upload_budget = upload_budget
+        if placeholder_model is not None:
+            self.placeholder_model = placeholder_model
+        # (handler, request, future) for work the threads have finished, which the main thread hasn't looked at yet
+        self.finished = queue.SimpleQueue()
+        self.uploads = collections.deque()  # things to do on the main thread, each uploading (at most) one thing
+        self.models = {}  # {model cache key: ModelRequest}, for models that aren't ready yet
+        # {(path, flip_on_load): [(mesh, unit), ...]}, for textures that aren't ready yet, and where they're going
+        self.textures = {}
+        self.failed_textures = set()  # which stay as placeholders
+        self._placeholder = None
+        self._placeholder_texture = None
+        self.uploaded = 0  # how many things were uploaded last frame, for stats
+
+    # everything which needs the engine, so the tests can do without it
+    load_model_data = staticmethod(lambda path, post_process: engine.load_model_data(path, post_process))
+    decode_image = staticmethod(lambda path, flip_on_load: engine.decode_image(path, flip_on_load))
+    model_cache_key = staticmethod(lambda *args: engine.model_cache_key(*args))
+    cached_model = staticmethod(lambda key: engine.cached_model(key))
+    cache_model = staticmethod(lambda key, meshes: engine.cache_model(key, meshes))
+    texture_loaded = staticmethod(lambda path, flip_on_load: engine.texture_loaded(path, flip_on_load))
+
+    @staticmethod
+    def upload_mesh(mesh_data, flip_on_load, textures):
+        return mesh_data.upload(flip_on_load, textures)
+
+    @staticmethod
+    def make_texture(path, flip_on_load, image):
+        return engine.Texture(path, flip_on_load=flip_on_load, name=path, image=image)
+
+    def placeholder(self):
+        """the meshes entities are drawn with while their model is loading"""
+        if self._placeholder is None:
+            if self.placeholder_model is not None:
+                self._placeholder = engine.load_model(self.placeholder_model)
+            else:
+                data, indices = cube_data()
+                self._placeholder = engine.MeshList(
+                    [engine.Mesh(data, (3, 3, 2), indices, textures=[self.placeholder_texture()])])
+        return self._placeholder
+
+    def placeholder_texture(self):
+        if self._placeholder_texture is None:
+            white = engine.ImageData(1, 1, 4, b'\xff' * 4)
+            self._placeholder_texture = engine.Texture('<placeholder>', name='placeholder', image=white)
+        return self._placeholder_texture
+
+    def load_model(self, path, callback, flip_on_load=True, post_process=None):
+        """
+        starts loading a model, and returns what to draw in the meantime. If it's already loaded, that's its meshes
+        (and callback is never called). Otherwise it's the placeholder, and callback(meshes) is called from update
+        once the real meshes are ready (if it can't be loaded, the error's printed, and the placeholder stays)
+        """
+        key = self.model_cache_key(path, flip_on_load, post_process)
+        meshes = self.cached_model(key)
+        if meshes is not None:
+            return meshes
+        request = self.models.get(key)
+        if request is None:
+            request = self.models[key] = ModelRequest(path, flip_on_load, key)
+            self.start(self.model_loaded, request, self.load_model_data, path, post_process)
+        request.callbacks.append(callback)
+        return self.placeholder()
+
+    def start(self, handler, request, function, *args):
+        """runs function(*args) on a worker thread, and then handler(request, result) on the main thread"""
+        future = self.pool.submit(function, *args)
+        future.add_done_callback(lambda _: self.finished.put((handler, request, future)))
+
+    def busy(self):
+        """whether anything is still loading"""
+        return bool(self.models or self.textures or self.uploads)
+
+    def update(self):
+        """uploads whatever's ready, until this frame's budget runs out. This has to be called on the main thread"""
+        self.handle_finished()
+        self.upload(self.upload_budget)
+
+    def finish(self):
+        """waits for everything that's loading, and uploads all of it"""
+        while self.busy():
+            # if there's nothing else to do, wait for the threads to finish something
+            self.handle_finished(block=not self.uploads)
+            self.upload(float('inf'))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def handle_finished(self, block=False):
+        while True:
+            try:
+                handler, request, future = self.finished.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            try:
+                result = future.result()
+            except Exception as e:
+                path = request.path if isinstance(request, ModelRequest) else request[0]
+                print(f"failed to load {path}:", file=sys.stderr)
+                traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
+                self.failed(request)
+            else:
+                handler(request, result)
+
+    def upload(self, budget):
+        """does the queued uploads until budget (seconds) is used up. At least one is done, so it always gets there"""
+        deadline = time.perf_counter() + budget
+        self.uploaded = 0
+        while self.uploads:
+            self.uploads.popleft()()
+            self.uploaded += 1
+            if time.perf_counter() >= deadline:
+                break
+
+    def failed(self, request):
+        if isinstance(request, ModelRequest):
+            del self.models[request.key]
+        else:
+            self.failed_textures.add(request)
+            self.textures.pop(request, None)
+
+    def model_loaded(self, request, mesh_data):
+        request.meshes = [None] * len(mesh_data)
+        request.remaining = len(mesh_data)
+        for data in mesh_data:
+            for path in data.texture_paths:
+                self.load_texture(path, request.flip_on_load)
+        for i, data in enumerate(mesh_data):
+            self.uploads.append(functools.partial(self.upload_model_mesh, request, i, data))
+        if not mesh_data:
+            self.uploads.append(functools.partial(self.model_ready, request))
+
+    def upload_model_mesh(self, request, i, mesh_data):
+        flip_on_load = request.flip_on_load
+        mesh = self.upload_mesh(mesh_data, flip_on_load,
+                                [self.texture(path, flip_on_load) for path in mesh_data.texture_paths])
+        for unit, path in enumerate(mesh_data.texture_paths):
+            waiting = self.textures.get((path, flip_on_load))
+            if waiting is not None:
+                waiting.append((mesh, unit))
+        request.meshes[i] = mesh
+        request.remaining -= 1
+        if not request.remaining:
+            self.model_ready(request)
+
+    def model_ready(self, request):
+        del self.models[request.key]
+        meshes = self.cache_model(request.key, request.meshes)
+        for callback in request.callbacks:
+            callback(meshes)
+
+    def load_texture(self, path, flip_on_load):
+        key = (path, flip_on_load)
+        if key in self.textures or key in self.failed_textures or self.texture_loaded(path, flip_on_load):
+            return
+        self.textures[key] = []
+        self.start(self.texture_decoded, key, self.decode_image, path, flip_on_load)
+
+    def texture(self, path, flip_on_load):
+        """the texture, if it's been loaded, otherwise the placeholder"""
+        key = (path, flip_on_load)
+        if key in self.textures or key in self.failed_textures:
+            return self.placeholder_texture()
+        return self.make_texture(path, flip_on_load, None)
+
+    def texture_decoded(self, key, image):
+        self.uploads.append(functools.partial(self.upload_texture, key, image))
+
+    def upload_texture(self, key, image):
+        path, flip_on_load = key
+        texture = self.make_texture(path, flip_on_load, image)
+        for mesh, unit in self.textures.pop(key):
+            mesh.add_texture(texture, unit, overwrite=True)
@@ -0,0 +1,46 @@
+"""
+Bakes every model in a directory ahead of time, so even the first load of each one skips importing it with assimp.
+Run it from the project's directory, so the cache ends up where the game looks for it:
+    python -m enginelib.bake_models [directory (default: resources)] [--cache-dir .model_cache]
+This is only any use if the game's made with the same Game(model_cache_dir=...), and if it is, models are baked the
+first time they're loaded anyway, this just gets it over with
+"""
+import argparse
+import os
+import sys
+
+import engine
+
+# the formats we actually use. assimp can do a lot more, and anything else can be passed with --extensions
+model_extensions = ['.obj', '.fbx', '.dae', '.gltf', '.glb', '.3ds', '.ply', '.stl', '.blend']
+
+
+def find_models(directory, extensions):
+    for root, _dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.join(root, name)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="bake models so they load without going through assimp")
+    parser.add_argument('directory', nargs='?', default='resources')
+    parser.add_argument('--cache-dir', default='.model_cache', help="the same as Game's model_cache_dir")
+    parser.add_argument('--extensions', nargs='+', default=model_extensions)
+    options = parser.parse_args(args)
+
+    engine.set_model_cache_dir(options.cache_dir)
+    failed = 0
+    for path in find_models(options.directory, {extension.lower() for extension in options.extensions}):
+        try:
+            mesh_count = engine.bake_model(path)
+        except (RuntimeError, OSError) as e:  # assimp couldn't import it, or the file's gone (or can't be read)
+            print(f"couldn't bake {path}: {e}")
+            failed += 1
+        else:
+            print(f"baked {path} ({mesh_count} meshes)")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+A sweep and prune broad phase, used to cut down the number of pairs the (slow) narrow phase has to look at.
+
+Every body has an axis aligned bounding box, and the min and max of that box on each axis are kept in a sorted list
+of endpoints, one list per axis. When a body moves, its endpoints are bubbled up or down their lists
+(basically an insertion sort), and every time two endpoints swap we know that the boxes either just started or just
+stopped overlapping on that axis. Pairs that overlap on all 3 axes are potential contacts.
+
+Since things don't usually move very far between ticks, the lists stay almost sorted, so updating is roughly linear in
+the number of bodies (rather than quadratic, like checking every pair).
+"""
+from itertools import combinations
+
+
+class Endpoint:
+    __slots__ = ('proxy', 'value', 'is_min', 'index')
+
+    def __init__(self, proxy, is_min):
+        self.proxy = proxy
+        self.value = float('inf')  # new endpoints get added at the end of the list, then sorted into place
+        self.is_min = is_min
+        self.index = 0
+
+
+class Proxy:
+    """the broad phase's representation of a body (usually an entity)"""
+    __slots__ = ('body', 'serial', 'mins', 'maxes', 'overlaps')
+
+    def __init__(self, body, serial):
+        self.body = body
+        self.serial = serial
+        self.mins = [Endpoint(self, is_min=True) for _ in range(3)]
+        self.maxes = [Endpoint(self, is_min=False) for _ in range(3)]
+        self.overlaps = set()  # proxies which overlap this one on every axis
+
+
+def comes_before(endpoint1, endpoint2):
+    """the order endpoints are sorted in. Maxes go before mins with the same value, so boxes that are just touching
+    don't count as overlapping"""
+    if endpoint1.value == endpoint2.value:
+        return endpoint2.is_min and not endpoint1.is_min
+    return endpoint1.value < endpoint2.value
+
+
+def entity_bounds(entity):
+    """returns the aabb of an entity's bounding sphere, as (min, max).
+    This is a bit bigger than it needs to be, but it doesn't depend on orientation, so spinning things are cheap"""
+    radius = entity.bounding_radius * max(entity.scalar)
+    position = entity.position
+    return (position.x - radius, position.y - radius, position.z - radius), \
+           (position.x + radius, position.y + radius, position.z + radius)
+
+
+class SweepAndPrune:
+    # if more than this fraction of the bodies are updated at once, the lists are re-sorted in one go, rather than each
+    # body being bubbled into place on its own
+    resort_fraction = 0.25
+
+    def __init__(self, get_bounds=entity_bounds, on_pair_removed=None):
+        self.get_bounds = get_bounds
+        # called with (body1, body2) whenever a pair stops overlapping (including when one of them is removed)
+        self.on_pair_removed = on_pair_removed
+        self.axes = ([], [], [])
+        self.proxies = {}  # {body: proxy}
+        self.overlap_counts = {}  # {(serial, serial): number of axes the pair overlaps on}
+        self._next_serial = 0
+
+    def __contains__(self, body):
+        return body in self.proxies
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def add(self, body):
+        """start tracking a body. Does nothing if it's already being tracked"""
+        if body in self.proxies:
+            return
+        proxy = Proxy(body, self._next_serial)
+        self._next_serial += 1
+        self.proxies[body] = proxy
+
+        # add both endpoints to the end of each list (at infinity), then move them down to where they belong.
+        # The swaps on the way down count up the overlaps, so the new body doesn't need any special handling
+        for axis, endpoints in enumerate(self.axes):
+            for endpoint in (proxy.mins[axis], proxy.maxes[axis]):
+                endpoint.index = len(endpoints)
+                endpoints.append(endpoint)
+        self._move(proxy, *self.get_bounds(body))
+
+    def remove(self, body):
+        proxy = self.proxies.pop(body, None)
+        if proxy is None:
+            return
+        for other in proxy.overlaps:
+            other.overlaps.discard(proxy)
+            if self.on_pair_removed is not None:
+                self.on_pair_removed(body, other.body)
+        proxy.overlaps.clear()
+        self.overlap_counts = {key: count for key, count in self.overlap_counts.items()
+                               if proxy.serial not in key}
+
+        for axis, endpoints in enumerate(self.axes):
+            endpoints[:] = [endpoint for endpoint in endpoints if endpoint.proxy is not proxy]
+            for i, endpoint in enumerate(endpoints):
+                endpoint.index = i
+
+    def update(self, body=None):
+        """re-reads the bounds of a body (or every body, if none is given) and re-sorts the endpoints"""
+        if body is not None:
+            proxy = self.proxies.get(body)
+            if proxy is not None:
+                self._move(proxy, *self.get_bounds(body))
+            return
+
+        self.update_bodies(self.proxies)
+
+    def update_bodies(self, bodies):
+        """
+        re-reads the bounds of some bodies (any that aren't being tracked are ignored). Nothing else is looked at,
+        unless lots of them have moved, in which case the endpoints are all re-sorted at once
+        """
+        proxies = [(body, self.proxies[body]) for body in bodies if body in self.proxies]
+        if len(proxies) <= self.resort_fraction * len(self.proxies):
+            for body, proxy in proxies:
+                self._move(proxy, *self.get_bounds(body))
+            return
+
+        # update every value first, then do a single insertion sort over each axis.
+        # This is cheaper than bubbling each body individually when lots of things have moved
+        changed = False
+        for body, proxy in proxies:
+            minimum, maximum = self.get_bounds(body)
+            for axis in range(3):
+                if proxy.mins[axis].value != minimum[axis] or proxy.maxes[axis].value != maximum[axis]:
+                    proxy.mins[axis].value = minimum[axis]
+                    proxy.maxes[axis].value = maximum[axis]
+                    changed = True
+        if changed:
+            for endpoints in self.axes:
+                self._sort(endpoints)
+
+    def potential_contacts(self, body):
+        """returns the bodies whose boxes overlap with this body's box"""
+        proxy = self.proxies.get(body)
+        if proxy is None:
+            return []
+        return [other.body for other in proxy.overlaps]
+
+    def pairs(self):
+        """yields every pair of bodies whose boxes overlap (each pair only once)"""
+        for proxy in self.proxies.values():
+            for other in proxy.overlaps:
+                if proxy.serial < other.serial:
+                    yield proxy.body, other.body
+
+    def _move(self, proxy, minimum, maximum):
+        for axis, endpoints in enumerate(self.axes):
+            low, high = proxy.mins[axis], proxy.maxes[axis]
+            growing_upwards = maximum[axis] > high.value
+            low.value = minimum[axis]
+            high.value = maximum[axis]
+            # the order matters: if the box is moving up, the max has to move out of the way of the min first
+            # (and vice versa), otherwise the min would get stuck behind its own max
+            for endpoint in ((high, low) if growing_upwards else (low, high)):
+                self._bubble(endpoints, endpoint.index)
+
+    def _bubble(self, endpoints, i):
+        """moves the endpoint at index i to where it should be, assuming the rest of the list is sorted"""
+        endpoint = endpoints[i]
+        while i > 0 and comes_before(endpoint, endpoints[i - 1]):
+            self._swap(endpoints, i - 1)
+            i -= 1
+        while i < len(endpoints) - 1 and comes_before(endpoints[i + 1], endpoint):
+            self._swap(endpoints, i)
+            i += 1
+
+    def _sort(self, endpoints):
+        for i in range(1, len(endpoints)):
+            j = i
+            while j > 0 and comes_before(endpoints[j], endpoints[j - 1]):
+                self._swap(endpoints, j - 1)
+                j -= 1
+
+    def _swap(self, endpoints, i):
+        """swaps endpoints[i] and endpoints[i+1], updating the overlaps as needed"""
+        passed, moving = endpoints[i], endpoints[i + 1]  # `moving` moves down the list, past `passed`
+        endpoints[i], endpoints[i + 1] = moving, passed
+        moving.index, passed.index = i, i + 1
+
+        if moving.proxy is passed.proxy or moving.is_min == passed.is_min:
+            return  # two mins (or two maxes) swapping doesn't change anything
+        if moving.is_min:
+            # a min moved below a max, so they've just started overlapping on this axis
+            self._change_overlap(moving.proxy, passed.proxy, 1)
+        else:
+            # a max moved below a min, so they've just stopped overlapping on this axis
+            self._change_overlap(moving.proxy, passed.proxy, -1)
+
+    def _change_overlap(self, proxy1, proxy2, change):
+        key = (proxy1.serial, proxy2.serial) if proxy1.serial < proxy2.serial else (proxy2.serial, proxy1.serial)
+        old_count = self.overlap_counts.get(key, 0)
+        count = old_count + change
+        if count:
+            self.overlap_counts[key] = count
+        else:
+            del self.overlap_counts[key]
+
+        if count == 3:
+            proxy1.overlaps.add(proxy2)
+            proxy2.overlaps.add(proxy1)
+        elif old_count == 3:
+            proxy1.overlaps.discard(proxy2)
+            proxy2.overlaps.discard(proxy1)
+            if self.on_pair_removed is not None:
+                self.on_pair_removed(proxy1.body, proxy2.body)
+
+
+def brute_force_pairs(bodies, get_bounds=entity_bounds):
+    """the slow way of doing it. Useful for checking the broad phase is working"""
+    bounds = {body: get_bounds(body) for body in bodies}
+    for body1, body2 in combinations(bodies, 2):
+        (min1, max1), (min2, max2) = bounds[body1], bounds[body2]
+        if all(min1[i] < max2[i] and min2[i] < max1[i] for i in range(3)):
+            yield body1, body2
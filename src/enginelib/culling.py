@@ -0,0 +1,127 @@
+"""
+View frustum culling, so entities that are off screen don't cost a matrix multiply, a uniform upload and a draw call.
+
+Each entity's bounding sphere is tested against the six planes of the camera's frustum (taken from
+projection * view). So this doesn't have to look at every entity every frame, the spheres are kept in a
+picking.SphereTree, and whole branches of it are thrown away (or accepted) with a single test.
+Entities that move are taken out of the tree and tested one by one (all at once with numpy) until there are enough of
+them that it's worth rebuilding the tree, which means a handful of moving things don't cause a rebuild every frame
+"""
+import glm
+import numpy as np
+
+from enginelib.picking import SphereTree
+
+
+def frustum_planes(matrix):
+    """
+    returns the 6 planes (left, right, bottom, top, near, far) of the frustum of a projection * view matrix,
+    as an array of (a, b, c, d) rows with normalised normals pointing inwards, so a point p is inside if
+    a*p.x + b*p.y + c*p.z + d >= 0 for all of them
+    """
+    rows = np.array(matrix, dtype=np.float64)  # the normal (maths) way round, so these really are the rows
+    planes = np.array([rows[3] + rows[0], rows[3] - rows[0],
+                       rows[3] + rows[1], rows[3] - rows[1],
+                       rows[3] + rows[2], rows[3] - rows[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def spheres_in_frustum(planes, centres, radii):
+    """returns whether each sphere is at least partly inside the frustum (as a boolean array)"""
+    distances = np.asarray(centres, dtype=np.float64).reshape(-1, 3) @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.asarray(radii, dtype=np.float64)[:, None], axis=1)
+
+
+def tree_items_in_frustum(tree, planes):
+    """
+    returns (the items of a SphereTree that are at least partly inside the frustum, how many spheres were tested).
+    Any node that's entirely inside or outside the frustum has all its items accepted or rejected without testing them
+    """
+    items, tested = [], 0
+    stack = [tree.root] if tree.root is not None else []
+    while stack:
+        node = stack.pop()
+        tested += 1
+        distances = planes[:, :3] @ node.centre + planes[:, 3]
+        if np.any(distances < -node.radius):
+            continue  # entirely outside one of the planes
+        if np.all(distances >= node.radius):
+            # entirely inside, so everything under it is too
+            inside = [node]
+            while inside:
+                node = inside.pop()
+                items.extend(node.items)
+                inside.extend(node.children)
+            continue
+        if len(node.items):
+            tested += len(node.items)
+            visible = spheres_in_frustum(planes, tree.centres[node.items], tree.radii[node.items])
+            items.extend(node.items[visible])
+        stack.extend(node.children)
+    return items, tested
+
+
+def bounding_sphere(entity):
+    """the (world space) centre and radius of an entity's bounding sphere"""
+    model_mat = entity.generate_model_mat()
+    scale = max(glm.length(model_mat[0].xyz), glm.length(model_mat[1].xyz), glm.length(model_mat[2].xyz))
+    return model_mat[3].xyz, entity.bounding_radius * scale
+
+
+class FrustumCuller:
+    """
+    keeps track of a set of entities, and works out which of them are (partly) inside a frustum.
+    The game owns one of these for each list of entities it draws, and tells it when entities are added, removed or moved
+    """
+    # the tree is rebuilt once this many entities have moved since it was last built (or this fraction of them)
+    min_rebuild_count = 32
+    rebuild_fraction = 1 / 8
+
+    def __init__(self):
+        self.tree_entities = []  # the entities in the tree, in the order the tree's items refer to them
+        self.in_tree = {}  # {entity: its item in the tree}, for entities that haven't moved since it was built
+        self.loose = {}  # entities which have moved since the tree was built (a dict so the order is stable)
+        self.tree = SphereTree([], [])
+        # stats for the last call to visible_entities
+        self.tested = 0
+        self.culled = 0
+
+    def __len__(self):
+        return len(self.in_tree) + len(self.loose)
+
+    def add(self, entity):
+        self.loose[entity] = None
+
+    def remove(self, entity):
+        self.in_tree.pop(entity, None)
+        self.loose.pop(entity, None)
+
+    def moved(self, entity):
+        """called when an entity (that might not be one of these) moves, since its sphere in the tree is out of date"""
+        if self.in_tree.pop(entity, None) is not None:
+            self.loose[entity] = None
+
+    def rebuild(self):
+        self.tree_entities = list(self.in_tree) + list(self.loose)
+        self.in_tree = {entity: item for item, entity in enumerate(self.tree_entities)}
+        self.loose = {}
+        spheres = [bounding_sphere(entity) for entity in self.tree_entities]
+        self.tree = SphereTree([centre for centre, _ in spheres], [radius for _, radius in spheres])
+
+    def visible_entities(self, planes):
+        """returns the entities whose bounding spheres are at least partly inside the frustum (see frustum_planes)"""
+        if len(self.loose) > max(self.min_rebuild_count, len(self) * self.rebuild_fraction):
+            self.rebuild()
+
+        items, self.tested = tree_items_in_frustum(self.tree, planes)
+        # entities which moved (or were removed) since the tree was built are still in it, so skip them here
+        visible = [entity for entity in map(self.tree_entities.__getitem__, items) if entity in self.in_tree]
+        if self.loose:
+            loose = list(self.loose)
+            spheres = [bounding_sphere(entity) for entity in loose]
+            inside = spheres_in_frustum(planes, [centre for centre, _ in spheres], [radius for _, radius in spheres])
+            self.tested += len(loose)
+            visible.extend(entity for entity, is_inside in zip(loose, inside) if is_inside)
+        self.culled = len(self) - len(visible)
+        return visible
+
@@ -6,7 +6,7 @@ from warnings import warn
 import engine
 import openal
 
-from enginelib import util
+from enginelib import picking, util
 from enginelib.level import save, load
 from enginelib.entity import Entity
 from enginelib.game import Game
@@ -17,13 +17,15 @@ class Click(Game):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.add_callback('on_click', self.dispatch_click_entity, always_fire=True)
+        # bounding volume hierarchies for picking, for the overlay entities and the normal ones
+        self.picking_trees = (picking.EntityTree(), picking.EntityTree())
 
     def dispatch_click_entity(self, button, action, *_args, **_kwargs):
         if not (button == engine.MOUSE_LEFT and action == engine.MOUSE_PRESS):
             return
 
-        entity = util.get_entity_at_pos(self, *self.cursor_location)
-        self.dispatch('on_click_entity', entity)
+        hit = util.cast_ray_from_cursor(self, *self.cursor_location, trees=self.picking_trees)
+        self.dispatch('on_click_entity', hit.entity if hit is not None else None)
 
 
 class Drag(Game):
@@ -105,6 +107,8 @@ class Editor(Click, Drag):
             return hasattr(func, 'hook_args') and (func.hook_args.get('editor') or func.hook_args.get('always_fire'))
 
     def hard_reload_level(self):
+        # hold on to the shader programs, so the ones which haven't changed aren't compiled all over again
+        shader_programs = [entity.shader_program for entity in self.all_entities]
         while self.entities:
             self.remove_entity(self.entities[0])
         while self.overlay_entities:
@@ -114,6 +118,7 @@ class Editor(Click, Drag):
         self.entity_classes = {}
 
         load.load_level(self.save_name, game=self)
+        del shader_programs
 
     def soft_reload_level(self):
         load.loader.reload()
@@ -158,12 +163,29 @@ class Editor(Click, Drag):
         self.change_highlighted_object(target_entity)
         self.create_object_gui(target_entity)
 
+    @staticmethod
+    def highlight_program(program, highlighted):
+        """
+        returns the (cached) version of a shader program with or without the highlight, which is the same program
+        with a HIGHLIGHTED define, so it's cached separately to the one everything else uses
+        """
+        defines = {name: value for name, value in (program.defines or {}).items() if name != 'HIGHLIGHTED'}
+        if highlighted:
+            defines['HIGHLIGHTED'] = 1
+        return engine.get_shader_program(*program.paths, trans_mat_name=program.trans_mat_name,
+                                         defines=defines or None)
+
     def change_highlighted_object(self, entity: Entity):
+        # shader programs are shared between everything using the same shaders, so the highlighted entity gets the
+        # highlighted version of its program while it's selected (compiled the first time, and reused after), and
+        # goes back to the shared one after
         if self.selected_object is not None:
-            self.selected_object.shader_program.set_value('highlightAmount', 0.0)
+            self.selected_object.shader_program = self.highlight_program(self.selected_object.shader_program, False)
         if entity is not None:
+            entity.shader_program = self.highlight_program(entity.shader_program, True)
             entity.shader_program.set_value('highlightAmount', 0.3)
         self.selected_object = entity
+        self.dispatch('on_select_entity', entity)
 
     # @@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@
     # all code below this point is GUI creation code
@@ -180,7 +202,11 @@ class Editor(Click, Drag):
 
             for i, value in enumerate(vector):
                 def setter(new_val, i=i, key=key, entity=entity):  # the keyword args save the value (otherwise all
-                    entity.__dict__[key][i] = new_val              # functions would use the last value in the loop)
+                    # functions would use the last value in the loop)
+                    # set a copy rather than changing it in place, so __setattr__ knows the entity has moved
+                    new_vector = type(entity.__dict__[key])(entity.__dict__[key])
+                    new_vector[i] = new_val
+                    setattr(entity, key, new_vector)
 
                 def getter(i=i, key=key, entity=entity):
                     return entity.__dict__[key][i]
@@ -454,7 +480,7 @@ class Editor(Click, Drag):
             if path == '':
                 return None
             path = os.path.relpath(path)  # get relative path
-            entity.meshes = engine.load_model(path)
+            entity.set_meshes(engine.load_model(path))
             entity.model_path = path
             if path not in self.models:
                 self.models[path] = name
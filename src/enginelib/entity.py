@@ -3,7 +3,7 @@ import itertools
 
 import engine
 
-from enginelib import script
+from enginelib import hierarchy, script
 from enginelib.level import load
 
 
@@ -12,6 +12,22 @@ def savable_args(*args):
 
 
 class Entity(engine.Model):
+    # attributes which game.physics needs to know about when they change
+    physics_attributes = frozenset(('do_gravity', 'do_collisions'))
+    # changing any of these moves the entity (and anything attached to it), so its cached model matrix and collider
+    # (see physics.get_collider) have to be rebuilt. This only works if they're set, so change them with
+    # eg `entity.position = new_position`, rather than in place (`entity.position.x += 1`)
+    transform_attributes = frozenset(('position', 'orientation', 'scalar'))
+    # changing any of these wakes the entity up if the physics has put it to sleep
+    wake_attributes = frozenset(('position', 'orientation', 'scalar', 'velocity'))
+    # if this is false, a parent's scale isn't applied to this entity (only its position and orientation are)
+    inherit_scale = True
+    # entities are drawn in order of layer, so anything with a higher layer is drawn after everything with a lower one
+    render_layer = 0
+    # for entities whose vertex shader draws them the same size on screen however far away they are (like axes.vert),
+    # how big they're drawn, as a fraction of their distance from the camera. Clicking on them uses this too
+    screen_scale = None
+
     def __new__(cls, *args, **kwargs):
         """Called when creating a new entity instance. If the class has been reloaded, use the newer version instead"""
         # note: without this, calling super with a reloaded class always raises an error
@@ -25,17 +41,24 @@ class Entity(engine.Model):
 
     def __init__(self, game, vert_path, frag_path, geo_path=None, meshes=None, model_path=None, position=None,
                  orientation=None, scalar=None, velocity=None, do_gravity=False, do_collisions=False,
-                 should_render=True, scripts=None, id='', flip_textures=True, **kwargs):
+                 should_render=True, scripts=None, id='', flip_textures=True, parent_id=None, **kwargs):
 
         if not (meshes is None) ^ (model_path is None):
             raise RuntimeError("exactly one of 'meshes' and 'model_path' must be passed to Entity")
-        if meshes is None:
+        if meshes is None and game.assets is not None:
+            # the placeholder, until the model's loaded in the background (see enginelib.assets)
+            meshes = game.assets.load_model(model_path, self.set_meshes, flip_on_load=flip_textures)
+        elif meshes is None:
             meshes = engine.load_model(model_path, flip_on_load=flip_textures)
 
         super().__init__(meshes, vert_path, frag_path, geo_path)
 
         self.game = game
         self._id = id
+        # the position, orientation and scalar are relative to the parent (see enginelib.hierarchy)
+        self.parent = None
+        self.children = []
+        self._waiting_for_parent = None  # the id of the parent, if it hasn't been created yet
         self.position = position if position is not None else glm.vec3(0, 0, 0)
         self.orientation = orientation if orientation is not None else glm.quat(1, 0, 0, 0)
         self.scalar = scalar or glm.vec3(1, 1, 1)
@@ -46,26 +69,48 @@ class Entity(engine.Model):
         self.model_mat = None
         self.bounding_sphere_radius = float('inf')
         self.should_render = should_render
+        if parent_id is not None:
+            game.attach_when_created(self, parent_id)
 
         # add savable attributes (that is, attributes that i expect to change while editing is being done)
         self.savable_attributes = savable_args('position', 'orientation', 'scalar', 'velocity', 'do_gravity',
-                                               'do_collisions', 'should_render', 'id', 'scripts', 'model_path')
+                                               'do_collisions', 'should_render', 'id', 'scripts', 'model_path',
+                                               'parent_id')
         # arguments not on this list: shader paths, meshes, model_path, scripts
 
         # set the property blacklist, which lists the things that dont show up in the property window
-        self.property_blacklist = ['game', 'savable_attributes', 'property_blacklist', 'scripts', 'model_path']
+        self.property_blacklist = ['game', 'savable_attributes', 'property_blacklist', 'scripts', 'model_path',
+                                   'parent', 'children']
 
         self.scripts = []
         if scripts is not None:
             for add_script in scripts:  # scripts is a list of partials of game.add_script
                 add_script(entity=self)
 
-        self._click_shader = engine.ShaderProgram(vert_path, 'shaders/clickHack.frag')
+        self._click_shader = engine.get_shader_program(vert_path, 'shaders/clickHack.frag')
         self.save_overrides = {}
 
         # if anything was added as a hook, set the callback for it automatically
         script.add_hook_callbacks(self, self.game, add_everything=False)
 
+    def __setattr__(self, name, value):
+        engine.Model.__setattr__(self, name, value)
+        if name in self.transform_attributes:
+            self.mark_transform_dirty()
+            if self.game.transforms is not None:
+                self.game.transforms.set(self, name, value)
+        if name in self.wake_attributes:
+            self.game.physics.wake(self)
+        elif name in self.physics_attributes:
+            self.game.physics.update_body(self)
+
+    def set_meshes(self, meshes):
+        """swaps the entity's meshes for some others (eg once its model has loaded), and updates its bounds to match"""
+        self.meshes = meshes
+        self.calculate_bounding_sphere()
+        self.mark_transform_dirty()  # which rebuilds its collider, and its sphere in the culler
+        self.game.physics.wake(self)
+
     def on_save(self):
         self.save_overrides.update(self.get_shaders())
 
@@ -99,7 +144,27 @@ class Entity(engine.Model):
         """changes the shader of a given type"""
         paths = self.get_shaders()
         paths[shader_type] = shader_path
-        self.shader_program = engine.ShaderProgram(**paths)
+        self.shader_program = engine.get_shader_program(**paths)
+
+    @property
+    def parent_id(self):
+        if self.parent is not None:
+            return self.parent.id
+        return self._waiting_for_parent
+
+    def set_parent(self, parent, keep_world_transform=False):
+        """
+        attaches this entity to another one, so it moves (and rotates and scales) with it, or detaches it if parent is
+        None. Its position, orientation and scalar are relative to the parent from then on, and by default they
+        aren't changed, so it'll jump to be relative to the new parent. With keep_world_transform, it stays where it is
+        """
+        self._waiting_for_parent = None
+        hierarchy.set_parent(self, parent, keep_world_transform)
+
+    def mark_transform_dirty(self):
+        """called when the entity moves, to get its matrix (and everything attached to it) rebuilt"""
+        hierarchy.mark_dirty(self)
+        self.game.dirty_transforms.add(self)
 
     @property
     def id(self):
@@ -112,16 +177,29 @@ class Entity(engine.Model):
         self.game.entities_by_id[value] = self
 
     def generate_model_mat(self, ignore_orientation=False, store_model_mat=True):
-        """generates and returns the model matrix for this entity, and by default caches it (for the physics engine)"""
-        model_mat = glm.translate(glm.mat4(1), self.position)
-        if not (self.orientation == glm.quat(1, 0, 0, 0) or ignore_orientation):
-            model_mat = model_mat * glm.mat4_cast(self.orientation)  # rotate by orientation
-        if self.scalar != glm.vec3(1, 1, 1):
-            model_mat = glm.scale(model_mat, self.scalar)
-        if store_model_mat:
+        """
+        returns the (world space) model matrix for this entity, and by default stores it as model_mat
+        (for the physics engine). It's cached, and only rebuilt after the position, orientation or scalar of this entity
+        or one of its parents have been set, so static entities don't cost anything
+        """
+        if ignore_orientation:
+            # not cached, since it isn't the real model matrix
+            model_mat = glm.translate(glm.mat4(1), self.position)
+            if self.scalar != glm.vec3(1, 1, 1):
+                model_mat = glm.scale(model_mat, self.scalar)
+        else:
+            model_mat = hierarchy.world_matrix(self)
+        if store_model_mat and self.model_mat is not model_mat:
             self.model_mat = model_mat
         return model_mat
 
+    def local_model_mat(self):
+        """the model matrix relative to the parent (or the world, if there isn't one)"""
+        transforms = self.game.transforms
+        if transforms is not None and self in transforms:
+            return transforms.model_mat(self)
+        return hierarchy.local_matrix(self)
+
     def set_transform_matrix(self, shader_program=None):
         """this is essentially the "prepare your shaders" function, so if the vertex shaders change,
         (eg the transformMat is renamed to mvp, etc) then this function can be updated accordingly.
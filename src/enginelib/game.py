@@ -9,20 +9,58 @@ import engine
 import glm
 import openal
 
+from enginelib import culling, hierarchy
+from enginelib.assets import AssetLoader
 from enginelib.camera import Camera
 from enginelib.entity import Entity
+from enginelib.instancing import Instancer
 from enginelib.level import load, reload
+from enginelib.physics_world import PhysicsWorld
+from enginelib.render_queue import RenderQueue
+from enginelib.transforms import TransformStore
 
 
 class Game(engine.Window):
     def __init__(self, *args, camera=None, save_name=None, background_colour=None, projection=None, fov=75, near=0.1, far=100,
-                 everything_is_reloadable=False, **kwargs):
+                 everything_is_reloadable=False, use_transform_store=False, frustum_culling=True,
+                 instancing=True, shader_cache_dir=None, model_cache_dir=None,
+                 keep_mesh_data=True, async_loading=False, upload_budget=0.004, gpu_memory_budget=256 * 1024 * 1024,
+                 **kwargs):
         super().__init__(*args, **kwargs)
+        # if this is set, linked shader programs are saved there, so they don't have to be compiled again next time
+        # (eg '.shader_cache'). It's off by default, so nothing's written next to the game unless it's asked for
+        engine.set_shader_cache_dir(shader_cache_dir)
+        # and the same for imported models, which are baked there so they don't go through assimp again (see
+        # bake_models)
+        engine.set_model_cache_dir(model_cache_dir)
+        # meshes keep a copy of their vertices once they're on the GPU, for get_vertices. False saves the memory
+        engine.set_keep_mesh_data(keep_mesh_data)
+        # textures, models and shader programs nothing's using are kept around (so reloading them is free) until
+        # everything cached adds up to this many bytes, then the least recently used ones are freed. See
+        # engine.resource_stats() for how much there is
+        engine.set_gpu_memory_budget(gpu_memory_budget)
+        # if this is set, models are loaded on other threads, and sent to the GPU a bit at a time (upload_budget
+        # seconds per frame), so the game doesn't freeze while they load. Entities are drawn as placeholders until then
+        self.assets = AssetLoader(upload_budget=upload_budget) if async_loading else None
         self.entities = []
         self.entities_by_id = {}
         self.overlay_entities = []
         self.entity_lists = [self.entities, self.overlay_entities]
         self.dispatches = defaultdict(list)
+        self.physics = PhysicsWorld(self)
+        # if this is set, every entity's transform is also kept in one set of arrays (see enginelib.transforms),
+        # so all the matrices can be calculated at once
+        self.transforms = TransformStore() if use_transform_store else None
+        # entities which have moved since their world matrices were last rebuilt (see enginelib.hierarchy)
+        self.dirty_transforms = set()
+        self.orphans = {}  # {id: [entities created with that parent_id, before the parent itself was created]}
+        # skips drawing entities that are off screen (overlay entities are always drawn)
+        self.culler = culling.FrustumCuller() if frustum_culling else None
+        self.culling_stats = {'tested': 0, 'culled': 0, 'drawn': 0}  # from the last frame
+        # sorts entities so ones with the same shader, textures and meshes are drawn together
+        self.render_queue = RenderQueue()
+        # draws runs of entities with the same shader and meshes in one go, if the shader supports it
+        self.instancer = Instancer() if instancing else None
         self.global_scripts = []
         self.make_everything_reloadable = everything_is_reloadable
         if self.make_everything_reloadable:
@@ -60,9 +98,25 @@ class Game(engine.Window):
 
     def add_entity(self, entity):
         self.entities.append(entity)
+        self.physics.add_entity(entity)
+        if self.culler is not None:
+            self.culler.add(entity)
+        if self.transforms is not None:
+            self.transforms.add(entity)
 
     def remove_entity(self, entity):
         del self.entities_by_id[entity.id]
+        # anything attached to it stays where it is
+        for child in list(entity.children):
+            child.set_parent(None, keep_world_transform=True)
+        if entity.parent is not None:
+            entity.set_parent(None)
+        self.dirty_transforms.discard(entity)
+        if self.culler is not None:
+            self.culler.remove(entity)
+        self.physics.remove_entity(entity)
+        if self.transforms is not None:
+            self.transforms.remove(entity)
         try:
             self.entities.remove(entity)
         except ValueError:  # entity not in list
@@ -75,12 +129,44 @@ class Game(engine.Window):
         assert id not in self.entities_by_id, 'entities must be unique'
         new_entity = entity_class(game=self, id=id, *args, **kwargs)
         self.entities_by_id[id] = new_entity
+        for child in self.orphans.pop(id, ()):
+            if child.parent_id == id:  # it might've been given a different parent since
+                child.set_parent(new_entity)
         if overlay:
             self.overlay_entities.append(new_entity)
         else:
             self.entities.append(new_entity)
+            self.physics.add_entity(new_entity)
+            if self.culler is not None:
+                self.culler.add(new_entity)
+        if self.transforms is not None:
+            self.transforms.add(new_entity)
         return new_entity
 
+    def attach_when_created(self, entity, parent_id):
+        """attaches the entity to the entity with the given id, or if that hasn't been created yet (eg when loading a
+        level), as soon as it is"""
+        parent = self.entities_by_id.get(parent_id)
+        if parent is not None:
+            entity.set_parent(parent)
+        else:
+            entity._waiting_for_parent = parent_id
+            self.orphans.setdefault(parent_id, []).append(entity)
+
+    def update_transforms(self):
+        """rebuilds the world matrices of everything that's moved since last time (and everything attached to it)"""
+        if self.dirty_transforms:
+            if self.culler is not None:
+                for entity in hierarchy.subtrees(self.dirty_transforms):
+                    self.culler.moved(entity)
+            hierarchy.update_world_matrices(self.dirty_transforms)
+            self.dirty_transforms.clear()
+
+    def potential_contacts(self, entity):
+        """returns the entities that might be touching the given entity (ie their bounding boxes overlap).
+        Anything not in this list definitely isn't touching it"""
+        return self.physics.potential_contacts(entity)
+
     def create_script(self, entity, script_class, *args, **kwargs):
         new_script = script_class(parent=entity, game=self, *args, **kwargs)
         entity.scripts.append(new_script)
@@ -90,11 +176,45 @@ class Game(engine.Window):
         self.global_scripts.append(script(parent=None, game=self))
 
     def draw_entities(self, entity_list):
+        self.update_transforms()
+        engine.reset_gl_state()  # the gui (or anything else) might have changed what's bound since last time
         proj_times_view = self.projection * self.camera.view_matrix()
+        if entity_list is self.entities and self.culler is not None:
+            # only look at the entities that are (at least partly) on screen
+            visible = self.culler.visible_entities(culling.frustum_planes(proj_times_view))
+            entities = [entity for entity in visible if entity.should_render]
+            self.culling_stats = {'tested': self.culler.tested, 'culled': self.culler.culled, 'drawn': len(entities)}
+        else:
+            entities = [entity for entity in entity_list if entity.should_render]
+        if entity_list is not self.entities:
+            # overlay entities are left in the order they were added, since they're often drawn on top of each other
+            self.draw_one_at_a_time(entities, proj_times_view)
+            return
+
+        entities = self.render_queue.sort(entities, self.camera.position, self.far)
+        if self.instancer is None:
+            self.draw_one_at_a_time(entities, proj_times_view)
+            return
+        for batch, run in self.instancer.runs(entities):
+            if batch is not None:
+                batch.draw(run, proj_times_view)
+            else:
+                self.draw_one_at_a_time(run, proj_times_view)
+
+    def draw_one_at_a_time(self, entities, proj_times_view):
+        if self.transforms is not None:
+            # every matrix is worked out at once, then each entity just uploads its row
+            for entity, transformation_matrix in zip(entities,
+                                                     self.transforms.transformation_matrices(proj_times_view, entities)):
+                if entity.parent is None:
+                    entity.shader_program.set_trans_mat_array(transformation_matrix)
+                else:  # the store only has local matrices
+                    entity.shader_program.set_trans_mat(proj_times_view * entity.generate_model_mat())
+                entity.draw()
+            return
+
         # transformation_matrix = projection * view * model
-        for entity in entity_list:
-            if not entity.should_render:
-                continue
+        for entity in entities:
             transformation_matrix = proj_times_view * entity.generate_model_mat()
             entity.shader_program.set_trans_mat(transformation_matrix)
             entity.draw()
@@ -161,6 +281,8 @@ class Game(engine.Window):
                 raise TypeError("You reloaded a class which uses super() outside of __init__ - "
                                 "try self.super(CLASS_NAME) instead")
         finally:
+            if self.assets is not None:
+                self.assets.close()
             openal.oalQuit()
 
     def _run(self, print_fps=False):
@@ -175,6 +297,12 @@ class Game(engine.Window):
             delta_t = (time_time - last_frame_time) % 0.1  # if the game freezes, just ignore it
             last_frame_time = time_time
 
+            # send whatever's finished loading to the GPU, as long as there's time this frame, and free whatever's
+            # been let go of since last frame (which can happen on any thread, so it's left until now)
+            if self.assets is not None:
+                self.assets.update()
+            engine.delete_pending_gl_objects()
+
             # draw everything
             self.clear_colour(*self.background_colour)
             self.dispatch('before_frame', delta_t)
@@ -0,0 +1,133 @@
+"""
+Parent/child transforms for entities.
+
+An entity with a parent has its position, orientation and scalar relative to the parent, so its world (model) matrix is
+the parent's world matrix * its own local matrix, and it follows the parent around without any scripts having to move it.
+
+World matrices are cached on each entity (as `_model_mat`). Moving an entity throws away the cached matrices of it and
+everything under it (mark_dirty), and game.update_transforms then rebuilds them before drawing, a level of the tree at
+a time, with one vectorised call per level rather than a glm call per entity.
+Anything that needs a matrix before then (eg the physics) just gets it built on demand by world_matrix.
+
+Since an entity's matrix is always built after its parent's, a dirty entity never has a clean child,
+which is what lets mark_dirty stop as soon as it reaches something that's already dirty
+"""
+import glm
+import numpy as np
+
+from enginelib.transforms import model_matrices
+
+
+def local_matrix(entity):
+    """translate * rotate * scale, from the entity's own position, orientation and scalar"""
+    model_mat = glm.translate(glm.mat4(1), entity.position)
+    if entity.orientation != glm.quat(1, 0, 0, 0):
+        model_mat = model_mat * glm.mat4_cast(entity.orientation)
+    if entity.scalar != glm.vec3(1, 1, 1):
+        model_mat = glm.scale(model_mat, entity.scalar)
+    return model_mat
+
+
+def parent_matrix(entity, parent):
+    """the matrix the entity's local matrix is relative to when it's attached to parent
+    (the parent's world matrix, without the scale if the entity doesn't inherit it)"""
+    matrix = world_matrix(parent)
+    if not entity.inherit_scale:
+        matrix = glm.mat4(glm.normalize(matrix[0]), glm.normalize(matrix[1]), glm.normalize(matrix[2]), matrix[3])
+    return matrix
+
+
+def world_matrix(entity):
+    """returns the entity's (cached) world matrix, building it (and its parents') if it's been moved"""
+    matrix = entity._model_mat
+    if matrix is None:
+        matrix = entity.local_model_mat()
+        if entity.parent is not None:
+            matrix = parent_matrix(entity, entity.parent) * matrix
+        entity._model_mat = matrix
+    return matrix
+
+
+def mark_dirty(entity):
+    """throws away the cached world matrix and collider of the entity, and of everything attached to it"""
+    entity._model_mat = None
+    entity._collider = None
+    stack = list(entity.children)
+    while stack:
+        child = stack.pop()
+        if child._model_mat is None:
+            continue  # so everything under it is too
+        child._model_mat = None
+        child._collider = None
+        stack.extend(child.children)
+
+
+def subtrees(entities):
+    """yields the given entities and everything attached to them"""
+    stack = list(entities)
+    while stack:
+        entity = stack.pop()
+        yield entity
+        stack.extend(entity.children)
+
+
+def set_parent(entity, parent, keep_world_transform=False):
+    """
+    attaches the entity to parent (or detaches it, if parent is None).
+    With keep_world_transform, the entity's position, orientation and scalar are changed so it stays where it is,
+    otherwise they're kept as they are, so it moves to be relative to its new parent.
+    Keeping the world transform isn't exact if the entity would end up sheared (eg rotated inside something that's
+    scaled differently on each axis), since a position, orientation and scalar can't describe that
+    """
+    ancestor = parent
+    while ancestor is not None:
+        if ancestor is entity:
+            raise ValueError(f"can't attach {entity} to {parent}, since {parent} is attached to it")
+        ancestor = ancestor.parent
+
+    if keep_world_transform:
+        matrix = world_matrix(entity)
+        if parent is not None:
+            matrix = glm.inverse(parent_matrix(entity, parent)) * matrix
+        scalar, orientation, position = glm.vec3(), glm.quat(), glm.vec3()
+        glm.decompose(matrix, scalar, orientation, position, glm.vec3(), glm.vec4())
+
+    if entity.parent is not None:
+        entity.parent.children.remove(entity)
+    entity.parent = parent
+    if parent is not None:
+        parent.children.append(entity)
+
+    if keep_world_transform:
+        entity.position, entity.orientation, entity.scalar = position, orientation, scalar
+    entity.mark_transform_dirty()
+
+
+def update_world_matrices(entities):
+    """
+    rebuilds the world matrices of every dirty entity in or under the given entities (the ones that have been moved).
+    This goes down the tree a level at a time, building the whole level in one go
+    """
+    identity = np.eye(4, dtype=np.float32)
+    built = {}  # {entity: world matrix} for everything built so far, so children don't have to convert them back
+    # start at the top of each dirty subtree, since anything with a dirty parent is done along with its parent
+    level = [entity for entity in entities if entity.parent is None or entity.parent._model_mat is not None]
+    while level:
+        dirty = [entity for entity in level if entity._model_mat is None]
+        if dirty:
+            positions = np.array([entity.position for entity in dirty], dtype=np.float32)
+            orientations = np.array([(entity.orientation.w, entity.orientation.x, entity.orientation.y,
+                                      entity.orientation.z) for entity in dirty], dtype=np.float32)
+            scales = np.array([entity.scalar for entity in dirty], dtype=np.float32)
+            parents = np.array([identity if entity.parent is None else
+                                built[entity.parent] if entity.parent in built else
+                                np.array(world_matrix(entity.parent), dtype=np.float32) for entity in dirty])
+            ignore_scale = np.array([entity.parent is not None and not entity.inherit_scale for entity in dirty])
+            if ignore_scale.any():
+                rotations = parents[ignore_scale, :3, :3]
+                parents[ignore_scale, :3, :3] = rotations / np.linalg.norm(rotations, axis=1, keepdims=True)
+
+            for entity, matrix in zip(dirty, np.matmul(parents, model_matrices(positions, orientations, scales))):
+                entity._model_mat = glm.mat4(matrix)
+                built[entity] = matrix
+        level = [child for entity in level for child in entity.children]
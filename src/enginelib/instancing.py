@@ -0,0 +1,134 @@
+"""
+Draws entities that share a shader program and meshes with one instanced draw call per mesh, rather than one per
+entity (turned on with `Game(instancing=True)`, which is the default).
+
+It's opt-in for each vertex shader. When a run of entities can be drawn together, their shaders are compiled again
+with INSTANCED defined, and if that version has an `instanceMatrix` attribute, it's used instead, eg
+    #ifdef INSTANCED
+    in mat4 instanceMatrix;  // the model matrix
+    #endif
+    uniform mat4 transformMat;  // with INSTANCED defined, this is only projection * view
+    ...
+    #ifdef INSTANCED
+        gl_Position = transformMat * instanceMatrix * vec4(aPos, 1.0);
+    #else
+        gl_Position = transformMat * vec4(aPos, 1.0);
+    #endif
+Shaders that don't do this are drawn one entity at a time, like always.
+
+Each batch keeps its model matrices in a buffer on the GPU, and only the ones that have changed since the last frame
+are uploaded again. Entities' model matrices are cached (see enginelib.hierarchy) and replaced rather than changed
+when they move, so a matrix that's the same object as last time is known to be the same
+"""
+import itertools
+
+import numpy as np
+
+try:
+    import engine
+except ImportError:  # the engine isn't built, which is only the case when testing
+    engine = None
+
+
+class InstanceBatch:
+    """the instanced version of a shader program and a list of meshes, along with the matrices of its instances"""
+
+    def __init__(self, program, meshes):
+        self.source_program = program
+        self.meshes = meshes
+        self.program = self.instanced_program(program)
+        self.buffer = self.make_buffer() if self.program is not None else None
+        self.matrices = np.zeros((0, 4, 4), dtype=np.float32)  # each one is transposed, since GL wants column major
+        self.sources = []  # the glm matrix each of the rows was filled in from
+        self.uploaded = 0  # how many matrices were uploaded last frame, for stats
+
+    @staticmethod
+    def instanced_program(program):
+        """the INSTANCED version of the program, or None if its shaders don't support it"""
+        defines = dict(program.defines or {}, INSTANCED=1)
+        instanced = engine.get_shader_program(*program.paths, trans_mat_name=program.trans_mat_name, defines=defines)
+        return instanced if instanced.instanced else None
+
+    @staticmethod
+    def make_buffer():
+        return engine.InstanceBuffer()
+
+    def matches(self, entity):
+        return entity.shader_program is self.source_program and entity.meshes is self.meshes
+
+    def update(self, entities):
+        """fills in the entities' model matrices, and uploads the ones that have changed"""
+        count = len(entities)
+        if count > len(self.matrices):
+            matrices = np.zeros((max(count, 2 * len(self.matrices)), 4, 4), dtype=np.float32)
+            matrices[:len(self.matrices)] = self.matrices
+            self.matrices = matrices
+            self.sources.extend([None] * (len(matrices) - len(self.sources)))
+
+        first, last = count, -1
+        for i, entity in enumerate(entities):
+            model_mat = entity.generate_model_mat()
+            if self.sources[i] is not model_mat:
+                self.sources[i] = model_mat
+                self.matrices[i] = np.asarray(model_mat).T
+                first, last = min(first, i), i
+        # anything after the end isn't drawn, so forget it (otherwise it'd keep old entities' matrices alive)
+        self.sources[count:] = [None] * (len(self.sources) - count)
+
+        self.uploaded = max(last + 1 - first, 0)
+        if self.uploaded:
+            # if the array has grown, the buffer will be too small for it, so it uploads all of it instead
+            self.buffer.upload(self.matrices, first, last + 1)
+
+    def draw(self, entities, projection_times_view):
+        self.update(entities)
+        self.program.set_trans_mat(projection_times_view)
+        self.buffer.draw(self.meshes, self.program, len(entities))
+
+
+class Instancer:
+    min_instances = 2  # runs of entities shorter than this are drawn one at a time
+    batch_class = InstanceBatch
+
+    def __init__(self):
+        self.batches = {}  # {(layer, program id, meshes id): InstanceBatch}, for the ones drawn last frame
+        # entities whose class overrides draw() have to be drawn one at a time
+        self.plain_draw = engine.Model.draw if engine is not None else None
+        # stats for the last frame
+        self.instanced_entities = 0
+        self.instanced_draws = 0
+
+    def group_key(self, entity):
+        if getattr(type(entity), 'draw', None) is not self.plain_draw:
+            return None
+        return entity.render_layer, id(entity.shader_program), id(entity.meshes)
+
+    def runs(self, entities):
+        """
+        splits the entities, which should already be sorted (see enginelib.render_queue), into
+        [(batch, entities), ...], in the same order, where batch is None for entities that are drawn one at a time
+        """
+        batches = {}
+        runs = []
+        self.instanced_entities = self.instanced_draws = 0
+        for key, group in itertools.groupby(entities, self.group_key):
+            group = list(group)
+            batch = None
+            if key is not None and len(group) >= self.min_instances:
+                batch = self.batches.get(key)
+                if batch is None or not batch.matches(group[0]):
+                    batch = self.batch_class(group[0].shader_program, group[0].meshes)
+                # the batch is kept even if the shader can't be instanced, so it isn't checked again every frame
+                batches[key] = batch
+                if batch.program is None:
+                    batch = None
+
+            if batch is None and runs and runs[-1][0] is None:
+                runs[-1][1].extend(group)
+            else:
+                runs.append((batch, group))
+            if batch is not None:
+                self.instanced_entities += len(group)
+                self.instanced_draws += len(batch.meshes)
+        self.batches = batches
+        return runs
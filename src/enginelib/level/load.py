@@ -2,6 +2,7 @@ import functools
 import importlib
 
 import json
+import engine
 import glm
 from warnings import warn
 
@@ -89,6 +90,13 @@ handlers = {
 }
 
 
+def level_shaders(entity_dict):
+    """the (vert_path, frag_path, geo_path) of every entity in the (still serialised) entity dict"""
+    return {(data['vert_path'], data['frag_path'], data.get('geo_path'))
+            for data in entity_dict.values()
+            if data.get('@type') == 'entity' and data.get('vert_path') and data.get('frag_path')}
+
+
 def load_level(location, game):
     with open(location, 'r') as f:
         save_obj = json.load(f)
@@ -99,6 +107,9 @@ def load_level(location, game):
 
     # load entities
     entity_dict = save_obj['entities']
+    # start compiling every shader up front, so the driver can work on them all while the entities are being made.
+    # the entities pick these up from engine.get_shader_program, which is why they're kept until the end
+    shader_programs = engine.compile_shader_programs(level_shaders(entity_dict))
     # since the dict is full of (hopefully) entities, we call handle_item to call the relevant handler
     for entity in entity_dict.values():
         handle_item(entity, game)
@@ -111,3 +122,4 @@ def load_level(location, game):
             print(f"warning: expected asset {asset} in save file")
             continue
         setattr(game, asset, handle_item(save_obj[asset], game))
+    del shader_programs
@@ -0,0 +1,183 @@
+"""
+An optional parallel narrow phase, for scenes with so many candidate pairs that a single core can't keep up.
+
+Every box that's in at least one candidate pair goes into shared memory once (corners and axes), along with the pair
+list (as indices into the boxes) and the cached separating axes. The pairs are then split into chunks, and each process
+in the pool tests its own chunk (with the native kernels if the engine has them, or numpy if not) and writes the
+results straight back into shared memory, so nothing big gets pickled.
+
+Usage is just:
+    game.physics.narrow_phase = ParallelNarrowPhase()
+after which PhysicsWorld passes it to physics.entity_pairs_intersect, which works the same as before.
+
+Run this file (python -m enginelib.parallel_physics) for a benchmark of how it scales with the number of processes
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from enginelib import physics
+
+
+class SharedBuffer:
+    """a block of shared memory that grows (by replacing itself with a bigger one) when it needs to"""
+    def __init__(self, dtype, item_shape=()):
+        self.dtype = np.dtype(dtype)
+        self.item_shape = item_shape
+        self.item_size = self.dtype.itemsize * int(np.prod(item_shape))
+        self.memory = None
+
+    def write(self, array):
+        """copies the array into shared memory, and returns the (name, dtype, shape) a worker needs to find it"""
+        array = np.asarray(array, dtype=self.dtype)
+        self.reserve(len(array))
+        self.view(len(array))[:] = array
+        return self.spec(len(array))
+
+    def reserve(self, count):
+        size = max(count * self.item_size, 1)
+        if self.memory is None or self.memory.size < size:
+            self.close()
+            self.memory = shared_memory.SharedMemory(create=True, size=size * 2)  # leave some room to grow
+
+    def view(self, count):
+        return np.ndarray((count, *self.item_shape), dtype=self.dtype, buffer=self.memory.buf)
+
+    def spec(self, count):
+        return self.memory.name, self.dtype.str, (count, *self.item_shape)
+
+    def close(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+# only used in the worker processes: {name: SharedMemory}, so each block is only opened once
+_attached = {}
+
+
+def attach(name, dtype, shape):
+    memory = _attached.get(name)
+    if memory is None:
+        memory = _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def forget_old_buffers(names):
+    """closes any blocks the main process has since replaced"""
+    for name in set(_attached) - set(names):
+        _attached.pop(name).close()
+
+
+def separating_axes_worker(args):
+    """runs in the pool: tests the pairs from start to stop, and writes the results into shared memory"""
+    specs, start, stop = args
+    forget_old_buffers([name for name, _, _ in specs])
+    corners, axes, first, second, hints, results = (attach(*spec) for spec in specs)
+    first, second = first[start:stop], second[start:stop]
+    results[start:stop] = physics.batch_separating_axes(corners[first], axes[first], corners[second], axes[second],
+                                                        hints[start:stop])
+    del corners, axes, first, second, hints, results  # the blocks can't be closed while anything still points at them
+
+
+class ParallelNarrowPhase:
+    """
+    a narrow phase backend that splits the separating axis tests across a process pool.
+    Batches too small to be worth it (less than min_pairs_per_process pairs per process) are just done on this process
+    """
+    def __init__(self, processes=None, min_pairs_per_process=2000):
+        self.processes = processes or os.cpu_count() or 1
+        self.min_pairs_per_process = min_pairs_per_process
+        # the workers need to share this process's resource tracker, otherwise they each start their own,
+        # which tries to clean up the shared memory again when they exit
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(self.processes)
+        self.buffers = [SharedBuffer(np.float64, (8, 3)),  # corners
+                        SharedBuffer(np.float64, (3, 3)),  # axes
+                        SharedBuffer(np.intp),  # index of the first box of each pair
+                        SharedBuffer(np.intp),  # index of the second box
+                        SharedBuffer(np.int8),  # hints
+                        SharedBuffer(np.int8)]  # results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.close()
+
+    def separating_axes(self, corners, axes, first, second, hints):
+        """
+        the same as physics.batch_separating_axes(corners[first], axes[first], corners[second], axes[second], hints),
+        where corners and axes hold every box (once), and first and second are the indices of the boxes in each pair
+        """
+        count = len(first)
+        chunks = min(self.processes, count // self.min_pairs_per_process)
+        if chunks <= 1:
+            return physics.batch_separating_axes(corners[first], axes[first], corners[second], axes[second], hints)
+
+        *input_buffers, results = self.buffers
+        specs = [buffer.write(array) for buffer, array in zip(input_buffers, (corners, axes, first, second, hints))]
+        results.reserve(count)
+        specs.append(results.spec(count))
+
+        bounds = np.linspace(0, count, chunks + 1).astype(int)
+        self.pool.map(separating_axes_worker, [(specs, start, stop) for start, stop in zip(bounds, bounds[1:])])
+        return results.view(count).copy()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        for buffer in self.buffers:
+            buffer.close()
+
+
+def random_boxes(count, rng):
+    """a load of unit cubes with random positions and orientations, for benchmarking"""
+    angles = rng.uniform(0, 2 * np.pi, count)
+    directions = rng.normal(size=(count, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    # rodrigues' formula, to turn each axis-angle into a rotation matrix
+    cross = np.zeros((count, 3, 3))
+    cross[:, 0, 1], cross[:, 0, 2], cross[:, 1, 2] = -directions[:, 2], directions[:, 1], -directions[:, 0]
+    cross -= cross.transpose(0, 2, 1)
+    rotations = np.eye(3) + np.sin(angles)[:, None, None] * cross \
+        + (1 - np.cos(angles))[:, None, None] * (cross @ cross)
+
+    unit_cube = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)])
+    positions = rng.uniform(0, count ** (1 / 3) * 1.5, (count, 3))
+    corners = unit_cube @ rotations.transpose(0, 2, 1) + positions[:, None]
+    return corners, rotations.transpose(0, 2, 1)
+
+
+def benchmark(boxes=20000, pairs=200000, repeats=5):
+    rng = np.random.RandomState(0)
+    corners, axes = random_boxes(boxes, rng)
+    first, second = rng.randint(0, boxes, pairs), rng.randint(0, boxes, pairs)
+    hints = np.full(pairs, -1, dtype=np.int8)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        expected = physics.batch_separating_axes(corners[first], axes[first], corners[second], axes[second], hints)
+    serial = (time.perf_counter() - start) / repeats
+    print(f'{pairs} pairs, {"native" if physics.native else "numpy"} kernels')
+    print(f'serial: {serial * 1000:.1f}ms')
+
+    processes = 1
+    while processes <= (os.cpu_count() or 1):
+        with ParallelNarrowPhase(processes, min_pairs_per_process=1) as narrow_phase:
+            narrow_phase.separating_axes(corners, axes, first, second, hints)  # warm up the pool
+            start = time.perf_counter()
+            for _ in range(repeats):
+                results = narrow_phase.separating_axes(corners, axes, first, second, hints)
+            taken = (time.perf_counter() - start) / repeats
+        assert np.array_equal(results, expected)
+        print(f'{processes} processes: {taken * 1000:.1f}ms ({serial / taken:.2f}x)')
+        processes *= 2
+
+
+if __name__ == '__main__':
+    benchmark()
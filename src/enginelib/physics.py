@@ -1,7 +1,16 @@
 import glm
 import itertools
+import numpy as np
 from math import inf
-from enginelib.entity import Entity
+
+try:
+    import engine
+except ImportError:  # the engine isn't built, so only the python versions are available
+    engine = None
+
+# the compiled collision kernels (see enginecore/cython_code/collision.pxi), or None if they aren't available.
+# if they are, the batch_* functions use them instead of numpy
+native = engine if hasattr(engine, 'obb_intersect_batch') else None
 
 
 # def generate_aabb(entity: Entity):
@@ -18,31 +27,311 @@ def aabb_intersect(min1, max1, min2, max2):
 
 
 def two_entities_intersect(entity1, entity2):
-    if not all(entity.do_collisions for entity in (entity1, entity2)):
-        return False
+    return entity_pairs_intersect([(entity1, entity2)])[0]
+
+
+class Collider:
+    """
+    an entity's collision shapes in world space: its bounding sphere, each mesh's bounding sphere,
+    and each mesh's box (as corners and axes, in the format batch_unaligned_intersect takes).
+    These are cached on the entity by get_collider, and thrown away whenever its position, orientation or scalar change,
+    so something that's tested against lots of neighbours (or isn't moving at all) only gets transformed once
+    """
+    __slots__ = ('centre', 'radius', 'mesh_centres', 'mesh_radii', 'corners', 'axes')
+
+    def __init__(self, entity, model_mat=None):
+        if model_mat is None:
+            model_mat = entity.generate_model_mat()
+        # taken from the (world space) model matrix, rather than the position and scalar, which are relative to the
+        # entity's parent if it has one
+        scale = max(glm.length(model_mat[0].xyz), glm.length(model_mat[1].xyz), glm.length(model_mat[2].xyz))
+        self.centre = np.array(model_mat[3].xyz, dtype=np.float64)
+        self.radius = entity.bounding_radius * scale
+        meshes = entity.meshes
+        self.mesh_centres = np.array([mesh.centre for mesh in meshes], dtype=np.float64).reshape(-1, 3) + self.centre
+        self.mesh_radii = np.array([mesh.bounding_radius * scale for mesh in meshes], dtype=np.float64)
+        if meshes:
+            self.corners, self.axes = mesh_boxes([(mesh, model_mat) for mesh in meshes])
+        else:
+            self.corners, self.axes = np.empty((0, 8, 3)), np.empty((0, 3, 3))
+
+
+def get_collider(entity):
+    """returns the entity's (cached) collider, building a new one if the entity has moved since the last one was built"""
+    collider = getattr(entity, '_collider', None)
+    if collider is None:
+        collider = entity._collider = Collider(entity)
+    return collider
+
+
+def candidate_mesh_pairs(collider1, collider2):
+    """yields the (index1, index2) pairs of meshes whose bounding spheres intersect (ie the ones the narrow phase needs
+    to check). Assumes the entities' bounding spheres have already been checked"""
+    # the meshes whose sphere intersects with the other entity's sphere
+    close_to_entity = np.linalg.norm(collider1.mesh_centres - collider2.centre, axis=1) \
+        <= collider1.mesh_radii + collider2.radius
+    for i in np.flatnonzero(close_to_entity):
+        close_to_mesh = np.linalg.norm(collider2.mesh_centres - collider1.mesh_centres[i], axis=1) \
+            <= collider2.mesh_radii + collider1.mesh_radii[i]
+        for j in np.flatnonzero(close_to_mesh):
+            yield i, j
+
+
+class PairCache:
+    """
+    remembers how each pair of meshes came out of the narrow phase last time: either the axis that separated them,
+    or -1 if they were touching. Things don't move much between ticks, so the axis that separated a pair last tick
+    almost always still does, and trying it first means the separating axis test usually stops after one axis.
+    Entries are keyed by entity, and should be evicted (see SweepAndPrune's on_pair_removed) once the broad phase
+    stops reporting the pair
+    """
+    def __init__(self):
+        self.entries = {}  # {(id(entity1), id(entity2)): {(mesh1 index, mesh2 index): separating axis or -1}}
+        # how many separated mesh pairs have been tested, and how many of those were separated by the cached axis
+        self.separated_pairs = 0
+        self.hint_hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, entity1, entity2, mesh1, mesh2):
+        entry = self.entries.get((id(entity1), id(entity2)))
+        if entry is None:
+            return -1
+        return entry.get((mesh1, mesh2), -1)
+
+    def set(self, entity1, entity2, mesh1, mesh2, axis):
+        self.entries.setdefault((id(entity1), id(entity2)), {})[mesh1, mesh2] = axis
+
+    def evict(self, entity1, entity2):
+        """forgets about a pair (in both orders, since the axes depend on which entity is first)"""
+        self.entries.pop((id(entity1), id(entity2)), None)
+        self.entries.pop((id(entity2), id(entity1)), None)
+
+    def hit_rate(self):
+        """the fraction of separated pairs which the cached axis was enough for"""
+        return self.hint_hits / self.separated_pairs if self.separated_pairs else 0
+
+
+def entity_pairs_intersect(pairs, cache=None, backend=None):
+    """
+    checks a list of (entity1, entity2) pairs all at once, and returns a list of bools, one per pair.
+    Every mesh pair that survives the bounding sphere checks goes through a single call to batch_unaligned_intersect,
+    and the boxes come from each entity's cached collider, so they're only transformed into world space when it moves.
+    If a PairCache is given, the axis that separated each pair last time is tested first (and the cache is updated).
+    If a backend is given (eg a parallel_physics.ParallelNarrowPhase), the separating axis tests are done by it instead
+    """
+    results = [False] * len(pairs)
+    colliding_pairs = [(i, get_collider(entity1), get_collider(entity2)) for i, (entity1, entity2) in enumerate(pairs)
+                       if entity1.do_collisions and entity2.do_collisions]
+    if not colliding_pairs:
+        return results
+
+    # do the entity level bounding sphere checks all at once
+    centres1 = np.array([collider1.centre for _, collider1, _ in colliding_pairs])
+    centres2 = np.array([collider2.centre for _, _, collider2 in colliding_pairs])
+    radii1 = np.array([collider1.radius for _, collider1, _ in colliding_pairs])
+    radii2 = np.array([collider2.radius for _, _, collider2 in colliding_pairs])
+    close_enough = batch_spheres_intersect(centres1, radii1, centres2, radii2)
+
+    # every collider's boxes go into one big list (once each, however many pairs they're in),
+    # and the mesh pairs are stored as indices into it
+    first_boxes = {}  # {id(collider): index of its first box}
+    box_corners, box_axes = [], []
+    box_count = 0
+
+    def first_box(collider):
+        nonlocal box_count
+        index = first_boxes.get(id(collider))
+        if index is None:
+            index = first_boxes[id(collider)] = box_count
+            box_corners.append(collider.corners)
+            box_axes.append(collider.axes)
+            box_count += len(collider.corners)
+        return index
+
+    pair_indices = []
+    mesh_indices = []
+    first, second = [], []
+    for (i, collider1, collider2), is_close in zip(colliding_pairs, close_enough):
+        if not is_close:
+            continue
+        for mesh1, mesh2 in candidate_mesh_pairs(collider1, collider2):
+            pair_indices.append(i)
+            mesh_indices.append((int(mesh1), int(mesh2)))
+            first.append(first_box(collider1) + mesh1)
+            second.append(first_box(collider2) + mesh2)
+
+    if not pair_indices:
+        return results
+
+    corners, axes = np.concatenate(box_corners), np.concatenate(box_axes)
+    first, second = np.array(first, dtype=np.intp), np.array(second, dtype=np.intp)
+    if cache is None and backend is None:
+        intersects = batch_unaligned_intersect(corners[first], axes[first], corners[second], axes[second])
+    else:
+        if cache is None:
+            hints = np.full(len(first), -1, dtype=np.int8)
+        else:
+            hints = np.array([cache.get(*pairs[i], *meshes) for i, meshes in zip(pair_indices, mesh_indices)],
+                             dtype=np.int8)
+        if backend is None:
+            separating_axes = batch_separating_axes(corners[first], axes[first], corners[second], axes[second], hints)
+        else:
+            separating_axes = backend.separating_axes(corners, axes, first, second, hints)
+        separated = separating_axes != -1
+        intersects = ~separated
+
+        if cache is not None:
+            for i, meshes, axis in zip(pair_indices, mesh_indices, separating_axes):
+                cache.set(*pairs[i], *meshes, int(axis))
+            cache.separated_pairs += int(np.count_nonzero(separated))
+            cache.hint_hits += int(np.count_nonzero(separated & (separating_axes == hints)))
+
+    for i, hit in zip(pair_indices, intersects):
+        if hit:
+            results[i] = True
+    return results
 
-    if glm.length(entity1.position - entity2.position) \
-            > (entity1.bounding_radius * max(entity1.scalar)) + (entity2.bounding_radius * max(entity2.scalar)):
-        return False  # bounding spheres dont intersect
 
-    for mesh1 in entity1.meshes:
-        if glm.length(entity1.position + mesh1.centre - entity2.position) \
-                > (mesh1.bounding_radius * max(entity1.scalar)) + (entity2.bounding_radius * max(entity2.scalar)):
-            continue  # the meshes sphere doesnt intersect with entity2's
+def mesh_boxes(meshes_and_matrices):
+    """
+    given a list of (mesh, model_mat), returns the world space corners (shape (n, 8, 3))
+    and local axes (shape (n, 3, 3)) of each mesh's bounding box
+    """
+    local_corners = np.array([mesh.corners for mesh, _ in meshes_and_matrices], dtype=np.float64)
+    matrices = np.array([model_mat for _, model_mat in meshes_and_matrices], dtype=np.float64)
+    # the local axes are model_mat * (1, 0, 0, 0) etc., ie the first 3 columns of the model matrix
+    axes = matrices[:, :3, :3].transpose(0, 2, 1)
+    corners = local_corners @ matrices[:, :3, :3].transpose(0, 2, 1) + matrices[:, None, :3, 3]
+    return corners, axes
+
+
+def batch_unaligned_intersect(corners1, axes1, corners2, axes2):
+    """
+    the same test as unaligned_intersect, but done for n pairs of boxes at once
+    corners1 and corners2 have shape (n, 8, 3), and axes1 and axes2 have shape (n, 3, 3)
+    (each row being one of the box's local x, y or z vectors). Returns a boolean array of shape (n,)
+    """
+    if native is not None:
+        return as_mask(native.obb_intersect_batch(*as_floats(corners1, axes1, corners2, axes2)))
+    return numpy_unaligned_intersect(corners1, axes1, corners2, axes2)
+
+
+def batch_separating_axes(corners1, axes1, corners2, axes2, hints):
+    """
+    like batch_unaligned_intersect, but returns the index of an axis that separates each pair, or -1 where they
+    intersect (as an int8 array of shape (n,)). hints (shape (n,)) are the axes to try first, or -1 for no hint.
+    The axes are numbered 0-2 for axes1, 3-5 for axes2 and 6-14 for the cross products (6 + 3*i + j is axes1[i] x axes2[j])
+    """
+    if native is not None:
+        hints = np.ascontiguousarray(hints, dtype=np.int8)
+        return np.frombuffer(native.obb_separating_axis_batch(*as_floats(corners1, axes1, corners2, axes2), hints),
+                             dtype=np.int8)
+    return numpy_separating_axes(corners1, axes1, corners2, axes2, hints)
+
+
+def batch_time_of_impact(corners1, axes1, motions, corners2, axes2):
+    """
+    sweeps each box 1 along its motion (relative to box 2, with shape (n, 3)), and returns the fraction of the motion
+    (from 0 to 1) at which they'd first touch, or inf if they don't. Boxes that already overlap also give inf,
+    since the normal intersection test deals with those.
+    Only box 2's face axes are used, which is exact for faces, but near edges and corners it can give a hit slightly
+    early (never late), so nothing can tunnel through anything
+    """
+    normals = axes2 / np.linalg.norm(axes2, axis=2, keepdims=True)
+    projections1 = np.einsum('nac,nkc->nak', normals, corners1)  # shape (n, 3, 8)
+    projections2 = np.einsum('nac,nkc->nak', normals, corners2)
+    min1, max1 = projections1.min(axis=2), projections1.max(axis=2)
+    min2, max2 = projections2.min(axis=2), projections2.max(axis=2)
+    speeds = np.einsum('nac,nc->na', normals, motions)
+
+    # on each axis, box 1 overlaps box 2 from the time min1 reaches max2 until max1 reaches min2 (or the other way round)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time1 = (max2 - min1) / speeds
+        time2 = (min2 - max1) / speeds
+    overlapping = (min1 <= max2) & (max1 >= min2)
+    still = speeds == 0  # if it isn't moving on this axis, it either always overlaps or never does
+    enter = np.where(still, np.where(overlapping, -np.inf, np.inf), np.minimum(time1, time2))
+    leave = np.where(still, np.where(overlapping, np.inf, -np.inf), np.maximum(time1, time2))
+
+    # they touch once they're overlapping on every axis
+    first_touch = enter.max(axis=1)
+    hit = (first_touch <= leave.min(axis=1)) & (first_touch >= 0) & (first_touch <= 1)
+    return np.where(hit, first_touch, np.inf)
+
 
-        for mesh2 in entity2.meshes:
-            if glm.length(entity1.position + mesh1.centre - entity2.position - mesh2.centre) \
-                    > (mesh1.bounding_radius * max(entity1.scalar)) + (mesh2.bounding_radius * max(entity2.scalar)):
-                continue
-            # both bounding spheres intersect -- the two meshes need to be checked to each other
-            if two_meshes_intersect(mesh1, mesh2, entity1, entity2):
-                return True
+def batch_spheres_intersect(centres1, radii1, centres2, radii2):
+    """centres have shape (n, 3) and radii have shape (n,). Returns a boolean array of shape (n,)"""
+    if native is not None:
+        return as_mask(native.spheres_intersect_batch(*as_floats(centres1, radii1, centres2, radii2)))
+    return np.linalg.norm(np.asarray(centres1) - np.asarray(centres2), axis=1) \
+        <= np.asarray(radii1) + np.asarray(radii2)
 
 
-def two_meshes_intersect(mesh1, mesh2, entity1, entity2):
-    corners1 = [glm.vec3(entity1.model_mat * glm.vec4(corner, 1)) for corner in mesh1.corners]
-    corners2 = [glm.vec3(entity2.model_mat * glm.vec4(corner, 1)) for corner in mesh2.corners]
-    return unaligned_intersect(corners1, entity1.model_mat, corners2, entity2.model_mat)
+def batch_aabb_intersect(min1, max1, min2, max2):
+    """every argument has shape (n, 3). Returns a boolean array of shape (n,)"""
+    if native is not None:
+        return as_mask(native.aabb_intersect_batch(*as_floats(min1, max1, min2, max2)))
+    return np.all((np.asarray(min1) <= max2) & (np.asarray(max1) >= min2), axis=1)
+
+
+def as_floats(*arrays):
+    """the native kernels only take contiguous float32 arrays"""
+    return [np.ascontiguousarray(array, dtype=np.float32) for array in arrays]
+
+
+def as_mask(results):
+    return np.frombuffer(results, dtype=np.bool_)
+
+
+def numpy_unaligned_intersect(corners1, axes1, corners2, axes2):
+    """the numpy version of batch_unaligned_intersect, used when the native kernels aren't available"""
+    return np.all(overlaps_on_axes(separating_axis_candidates(axes1, axes2), corners1, corners2), axis=1)
+
+
+def numpy_separating_axes(corners1, axes1, corners2, axes2, hints):
+    """the numpy version of batch_separating_axes"""
+    n = len(corners1)
+    all_axes = separating_axis_candidates(axes1, axes2)
+    hints = np.asarray(hints, dtype=np.int8)
+    results = np.full(n, -1, dtype=np.int8)
+
+    # try the hinted axes first, and only do the full test on the pairs that they didn't separate
+    has_hint = np.flatnonzero(hints >= 0)
+    hint_axes = all_axes[has_hint, hints[has_hint].astype(np.intp)][:, None]
+    separated = ~overlaps_on_axes(hint_axes, corners1[has_hint], corners2[has_hint])[:, 0]
+    results[has_hint[separated]] = hints[has_hint[separated]]
+
+    remaining = np.flatnonzero(results == -1)
+    if remaining.size:
+        overlaps = overlaps_on_axes(all_axes[remaining], corners1[remaining], corners2[remaining])
+        # the first axis they don't overlap on, if there is one
+        results[remaining] = np.where(overlaps.all(axis=1), -1, np.argmin(overlaps, axis=1))
+    return results
+
+
+def separating_axis_candidates(axes1, axes2):
+    """returns the 15 axes the separating axis test needs for each pair of boxes, with shape (n, 15, 3)"""
+    n = len(axes1)
+    # the 15 axes are the 3 local axes of each box, and the 9 cross products between them.
+    # if two axes are parallel, the cross product is zero, so everything projects onto 0 and
+    # that axis always "overlaps" -- which is the same as skipping it
+    cross_products = np.cross(axes1[:, :, None, :], axes2[:, None, :, :]).reshape(n, 9, 3)
+    return np.concatenate((axes1, axes2, cross_products), axis=1)
+
+
+def overlaps_on_axes(axes, corners1, corners2):
+    """axes has shape (n, k, 3). Returns a boolean array of shape (n, k), which is True where the pair overlaps"""
+    projections1 = np.einsum('nac,nkc->nak', axes, corners1)  # shape (n, k, 8)
+    projections2 = np.einsum('nac,nkc->nak', axes, corners2)
+    min1, max1 = projections1.min(axis=2), projections1.max(axis=2)
+    min2, max2 = projections2.min(axis=2), projections2.max(axis=2)
+
+    # same test as intersects_on_projection, just on every axis of every pair at once
+    total_length = np.maximum(max1, max2) - np.minimum(min1, min2)
+    sum_of_both = (max1 - min1) + (max2 - min2)
+    return total_length <= sum_of_both
 
 
 def unaligned_intersect(corners1, model_mat1, corners2, model_mat2):
@@ -92,6 +381,6 @@ def get_min_and_max(corners, axis):
         dist = glm.dot(corner, axis)
         if dist < min_val:
             min_val = dist
-        elif dist > max_val:
+        if dist > max_val:  # not elif, since the first corner needs to set both
             max_val = dist
     return min_val, max_val
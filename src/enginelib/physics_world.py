@@ -0,0 +1,284 @@
+import itertools
+
+import glm
+import numpy as np
+
+from enginelib import hierarchy
+from enginelib.broadphase import SweepAndPrune
+from enginelib.physics import PairCache, batch_time_of_impact, entity_pairs_intersect, get_collider
+
+
+class PhysicsWorld:
+    """
+    Simulates every entity with `do_gravity` set, all at once, on a fixed timestep.
+
+    Every tick, the velocities and positions of all the moving bodies are integrated together as arrays, then
+    collision detection is run once for the whole world (broad phase, then a single batched narrow phase).
+    Anything that ended up intersecting something with `do_collisions` set is moved back to where it was, and stopped.
+
+    The game owns one of these (as `game.physics`), and entities tell it when their physics flags change,
+    so there are no per-body callbacks.
+
+    Bodies that have been resting on something (ie touching it, and barely moving) for `time_to_sleep` seconds are put
+    to sleep, and stop being simulated until something wakes them up. Bodies resting on each other are grouped into
+    islands, which fall asleep (and wake up) together, so a stack only sleeps once the whole thing has settled.
+    Sleeping bodies are woken when a script changes their position, orientation, scale or velocity,
+    when something hits them, or when whatever they're resting on is moved or removed.
+
+    With `continuous` set, each body's box is swept along its motion before it's moved, and it's stopped at the first
+    thing it would hit (see physics.batch_time_of_impact). Without it, anything moving more than its own size in one
+    tick can go straight through thin things, so this lets the physics tick at a lower rate (eg 20-30 times a second)
+    """
+    gravity = glm.vec3(0, -1, 0)
+
+    def __init__(self, game, tick_length=1/60, max_ticks_per_frame=5, sleep_velocity=0.1, time_to_sleep=0.5,
+                 continuous=False):
+        self.game = game
+        self.tick_length = tick_length
+        # if the game falls behind by more than this many ticks, just drop them rather than trying to catch up
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.time_since_last_tick = 0
+        # the speed has to stay below this for time_to_sleep seconds for a body to fall asleep.
+        # it needs to be more than gravity * tick_length, since resting things still fall a bit every tick
+        self.sleep_velocity = sleep_velocity
+        self.time_to_sleep = time_to_sleep
+        self.continuous = continuous
+        # when sweeping, bodies are stopped this far before whatever they hit, so they aren't touching it afterwards
+        # (touching counts as intersecting, so otherwise they'd be moved back to where they started)
+        self.skin = 1e-3
+        self.sweeps = {}  # {body: motion this tick}, only filled in while sweeping
+        # something to do the narrow phase with instead of this process (eg a parallel_physics.ParallelNarrowPhase)
+        self.narrow_phase = None
+
+        self.entities = set()  # every entity in the world, whether it's simulated or not
+        self.moving_bodies = {}  # entities with do_gravity set. A dict (rather than a set) so the order is stable
+        # the narrow phase's results from last tick, which are forgotten once the broad phase stops reporting the pair
+        self.pair_cache = PairCache()
+        self.broadphase = SweepAndPrune(get_bounds=self.swept_bounds, on_pair_removed=self.pair_cache.evict)
+        # entities which have moved since the broad phase was last updated. Only these are updated, so static and
+        # sleeping things don't cost anything
+        self.moved = set()
+        self.sleep_timers = {}  # {body: how long it's been resting for}
+        self.sleeping = {}  # {body: the island it fell asleep with}
+
+        # physics only runs in game mode, like every other callback without hook args
+        game.add_callback('on_frame', self.on_frame)
+
+    def add_entity(self, entity):
+        self.entities.add(entity)
+        self.broadphase.add(entity)
+        self.update_body(entity)
+
+    def remove_entity(self, entity):
+        if entity not in self.entities:
+            return
+        self.wake(entity)
+        self.wake_contacts(entity)  # anything resting on it is going to fall
+        self.entities.discard(entity)
+        self.broadphase.remove(entity)
+        self.moved.discard(entity)
+        self.moving_bodies.pop(entity, None)
+        self.sleep_timers.pop(entity, None)
+
+    def update_body(self, entity):
+        """called when an entity's physics flags change"""
+        if entity not in self.entities:
+            return  # probably still in __init__, so it'll be added properly later
+        self.wake(entity)
+        if entity.do_gravity:
+            self.moving_bodies[entity] = None
+        else:
+            self.moving_bodies.pop(entity, None)
+            self.sleep_timers.pop(entity, None)
+            self.wake_contacts(entity)
+
+    def wake(self, entity):
+        """
+        wakes up a sleeping body, along with the rest of its island.
+        Entities call this whenever their transform or velocity is changed. If a static entity is moved,
+        anything that was resting on it is woken up instead
+        """
+        if entity in self.entities:
+            # and anything attached to it has moved too
+            self.moved.update(hierarchy.subtrees([entity]))
+        island = self.sleeping.get(entity)
+        if island is not None:
+            for body in island:
+                del self.sleeping[body]
+                self.sleep_timers[body] = 0
+        elif entity in self.entities and entity not in self.moving_bodies:
+            self.wake_contacts(entity)
+
+    def wake_contacts(self, entity):
+        for other in self.broadphase.potential_contacts(entity):
+            if other in self.sleeping:
+                self.wake(other)
+
+    def potential_contacts(self, entity):
+        """returns the entities that might be touching the given entity (ie their bounding boxes overlap).
+        Anything not in this list definitely isn't touching it"""
+        self.update_broadphase()
+        return self.broadphase.potential_contacts(entity)
+
+    def update_broadphase(self):
+        """updates the bounds of whatever's moved since last time"""
+        if self.moved:
+            moved, self.moved = self.moved, set()
+            self.broadphase.update_bodies(moved)
+
+    def swept_bounds(self, entity):
+        """the entity's bounds, stretched to cover everywhere it's moving through this tick when sweeping"""
+        collider = get_collider(entity)  # rather than broadphase.entity_bounds, since this is in world space
+        minimum, maximum = tuple(collider.centre - collider.radius), tuple(collider.centre + collider.radius)
+        motion = self.sweeps.get(entity)
+        if motion is None:
+            return minimum, maximum
+        return tuple(min(x, x + dx) for x, dx in zip(minimum, motion)), \
+            tuple(max(x, x + dx) for x, dx in zip(maximum, motion))
+
+    def sweep(self, bodies, motions):
+        """
+        works out how far each body can move before hitting something. Returns an array with the fraction of its motion
+        each body can make, and the (body, other) pairs that hit each other on the way
+        """
+        self.sweeps = dict(zip(bodies, motions))
+        self.moved.update(bodies)
+        self.update_broadphase()
+
+        # sweep every pair of meshes between each body and everything it could reach
+        mesh_pairs = []  # (index of the body, the entity it might hit)
+        corners1, axes1, relative_motions, corners2, axes2 = [], [], [], [], []
+        for i, body in enumerate(bodies):
+            if not body.do_collisions:
+                continue
+            collider = get_collider(body)
+            for other in self.broadphase.potential_contacts(body):
+                if not other.do_collisions:
+                    continue
+                other_collider = get_collider(other)
+                motion = motions[i] - self.sweeps.get(other, 0)  # everything is swept relative to the other body
+                for mesh1, mesh2 in itertools.product(range(len(collider.corners)), range(len(other_collider.corners))):
+                    mesh_pairs.append((i, other))
+                    corners1.append(collider.corners[mesh1])
+                    axes1.append(collider.axes[mesh1])
+                    relative_motions.append(motion)
+                    corners2.append(other_collider.corners[mesh2])
+                    axes2.append(other_collider.axes[mesh2])
+        self.sweeps = {}
+
+        fractions = np.ones(len(bodies))
+        first_hits = {}  # {index of the body: what it hit first}
+        if not mesh_pairs:
+            return fractions, []
+        times = batch_time_of_impact(np.array(corners1), np.array(axes1), np.array(relative_motions),
+                                     np.array(corners2), np.array(axes2))
+        for (i, other), time in zip(mesh_pairs, times):
+            if time <= 1 and (i not in first_hits or time < fractions[i]):
+                fractions[i] = time
+                first_hits[i] = other
+
+        # stop just short of whatever they hit
+        for i in first_hits:
+            length = np.linalg.norm(motions[i])
+            if length > 0:
+                fractions[i] = max(0, fractions[i] - self.skin / length)
+        return fractions, [(bodies[i], other) for i, other in first_hits.items()]
+
+    def on_frame(self, delta_t):
+        self.time_since_last_tick += delta_t
+        ticks = 0
+        while self.time_since_last_tick >= self.tick_length:
+            if ticks == self.max_ticks_per_frame:
+                self.time_since_last_tick = 0
+                break
+            self.tick(self.tick_length)
+            self.time_since_last_tick -= self.tick_length
+            ticks += 1
+
+    def tick(self, delta_t):
+        bodies = [body for body in self.moving_bodies if body not in self.sleeping]
+        if not bodies:
+            self.update_broadphase()  # keep potential_contacts up to date for any scripts using it
+            return
+
+        # integrate everything at once. Velocities (and gravity) are in world space, but a body's position is relative
+        # to its parent if it has one, so those are moved in world space and then put back relative to the parent
+        parent_matrices = [None if body.parent is None else hierarchy.parent_matrix(body, body.parent)
+                           for body in bodies]
+        old_positions = [body.position for body in bodies]
+        world_positions = np.array([position if matrix is None else (matrix * glm.vec4(position, 1)).xyz
+                                    for position, matrix in zip(old_positions, parent_matrices)])
+        velocities = np.array([body.velocity for body in bodies]) + np.array(self.gravity) * delta_t
+        motions = velocities * delta_t
+        contacts = []  # (body, other) pairs that hit each other this tick
+        if self.continuous:
+            # only move things as far as they can go without hitting anything
+            fractions, contacts = self.sweep(bodies, motions)
+            motions *= fractions[:, None]
+        new_positions = world_positions + motions
+
+        for body, position, velocity, matrix in zip(bodies, new_positions, velocities, parent_matrices):
+            position = glm.vec3(position)
+            if matrix is not None:
+                position = (glm.inverse(matrix) * glm.vec4(position, 1)).xyz
+            body.velocity = glm.vec3(velocity)
+            body.position = position  # this also throws away the body's collider, since it's moved
+
+        # then check everything that moved against everything it might be touching, all in one go
+        self.moved.update(bodies)
+        self.update_broadphase()
+        pairs = [(body, other) for body in bodies for other in self.broadphase.potential_contacts(body)]
+        hits = entity_pairs_intersect(pairs, self.pair_cache, self.narrow_phase)
+        overlapping = {body for (body, _), hit in zip(pairs, hits) if hit}
+        contacts.extend(pair for pair, hit in zip(pairs, hits) if hit)
+
+        collided = set()
+        touching = []  # pairs of moving bodies which are touching, used to build the islands
+        for body, other in contacts:
+            collided.add(body)
+            if other in self.sleeping:
+                if glm.length(body.velocity) > self.sleep_velocity:
+                    self.wake(other)  # it got hit by something actually moving, rather than just resting on it
+            elif other in self.moving_bodies:
+                touching.append((body, other))
+
+        # anything that hit something stops, and if it ended up inside something it gets moved back to where it was
+        for body, old_position in zip(bodies, old_positions):
+            # things are resting if they're touching something and not moving much
+            # (a body floating in the air has nothing to rest on, so it'll start falling next tick)
+            if body in collided and glm.length(body.velocity) <= self.sleep_velocity:
+                self.sleep_timers[body] = self.sleep_timers.get(body, 0) + delta_t
+            else:
+                self.sleep_timers[body] = 0
+
+            if body in overlapping:
+                body.position = glm.vec3(old_position)
+            if body in collided:
+                body.velocity = glm.vec3(0, 0, 0)
+
+        # put any islands that have settled to sleep
+        for island in find_islands(bodies, touching):
+            if all(self.sleep_timers[body] >= self.time_to_sleep for body in island):
+                for body in island:
+                    self.sleeping[body] = island
+
+
+def find_islands(bodies, pairs):
+    """groups bodies into islands of bodies which are connected by the given pairs. Returns a list of frozensets"""
+    # union find, where each body points towards the root of its island
+    roots = {body: body for body in bodies}
+
+    def find(body):
+        while roots[body] is not body:
+            roots[body] = roots[roots[body]]  # path halving, keeps the trees flat
+            body = roots[body]
+        return body
+
+    for body1, body2 in pairs:
+        if body1 in roots and body2 in roots:
+            roots[find(body1)] = find(body2)
+
+    islands = {}
+    for body in bodies:
+        islands.setdefault(find(body), []).append(body)
+    return [frozenset(island) for island in islands.values()]
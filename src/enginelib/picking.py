@@ -0,0 +1,171 @@
+"""
+Ray casting against entities on the CPU, used for clicking on things in the editor.
+
+The entities' bounding spheres are put into a tree (a bounding volume hierarchy), so a ray only has to be tested
+against the few entities near it. Entities whose sphere the ray goes through are then tested properly, against the
+(world space) box of each of their meshes, which come from the same cached colliders the physics uses.
+None of this touches OpenGL, so unlike util.get_entity_at_pos it doesn't need to redraw anything or stall the GPU
+"""
+from collections import namedtuple
+from math import inf
+
+import glm
+import numpy as np
+
+from enginelib.physics import Collider, get_collider
+
+RayHit = namedtuple('RayHit', ['entity', 'point', 'distance'])
+
+
+def ray_sphere_distance(origin, direction, centre, radius):
+    """how far along the ray (with a normalised direction) it enters the sphere, or inf if it misses.
+    If the ray starts inside the sphere, it's 0"""
+    offset = centre - origin
+    along = np.dot(offset, direction)
+    closest_squared = np.dot(offset, offset) - along * along
+    if closest_squared > radius * radius:
+        return inf
+    half_chord = np.sqrt(radius * radius - closest_squared)
+    if along + half_chord < 0:
+        return inf  # it's behind the ray
+    return max(along - half_chord, 0)
+
+
+def ray_box_distance(origin, direction, corners, axes):
+    """
+    how far along the ray it first hits the box (given as corners and axes, like the physics uses), or inf if it misses.
+    If the ray starts inside the box, the distance to where it comes out is used instead, so something around the
+    camera (like a room) doesn't hide everything inside it
+    """
+    normals = axes / np.linalg.norm(axes, axis=1, keepdims=True)
+    projections = corners @ normals.T  # shape (8, 3)
+    low, high = projections.min(axis=0), projections.max(axis=0)
+    start, speed = normals @ origin, normals @ direction
+
+    # the slab test: on each axis, the ray is inside the box between two distances, so it hits the box if all 3 overlap
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance1 = (low - start) / speed
+        distance2 = (high - start) / speed
+    parallel = speed == 0
+    inside = (low <= start) & (start <= high)
+    enter = np.where(parallel, np.where(inside, -inf, inf), np.minimum(distance1, distance2)).max()
+    leave = np.where(parallel, np.where(inside, inf, -inf), np.maximum(distance1, distance2)).min()
+    if enter > leave or leave < 0:
+        return inf
+    return enter if enter >= 0 else leave
+
+
+class SphereTree:
+    """a bounding volume hierarchy of spheres, split in half along the longest axis at each level"""
+    leaf_size = 4
+
+    class Node:
+        __slots__ = ('centre', 'radius', 'children', 'items')
+
+        def __init__(self, centre, radius):
+            self.centre = centre
+            self.radius = radius
+            self.children = ()
+            self.items = ()
+
+    def __init__(self, centres, radii):
+        self.centres = np.asarray(centres, dtype=np.float64).reshape(-1, 3)
+        self.radii = np.asarray(radii, dtype=np.float64)
+        self.root = self._build(np.arange(len(self.radii))) if len(self.radii) else None
+
+    def _build(self, items):
+        centres, radii = self.centres[items], self.radii[items]
+        low, high = (centres - radii[:, None]).min(axis=0), (centres + radii[:, None]).max(axis=0)
+        centre = (low + high) / 2
+        node = self.Node(centre, (np.linalg.norm(centres - centre, axis=1) + radii).max())
+        if len(items) <= self.leaf_size:
+            node.items = items
+            return node
+
+        axis = np.argmax(high - low)
+        ordered = items[np.argsort(centres[:, axis], kind='stable')]
+        middle = len(ordered) // 2
+        node.children = (self._build(ordered[:middle]), self._build(ordered[middle:]))
+        return node
+
+    def cast_ray(self, origin, direction, item_distance, max_distance=inf):
+        """
+        returns (distance, item) for the closest item the ray hits (or (inf, None)).
+        item_distance(item) returns how far along the ray the item is hit, and is only called for items whose sphere
+        the ray goes through, and which could still be closer than the closest hit so far
+        """
+        best_distance, best_item = max_distance, None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if ray_sphere_distance(origin, direction, node.centre, node.radius) >= best_distance:
+                continue
+            for item in node.items:
+                if ray_sphere_distance(origin, direction, self.centres[item], self.radii[item]) >= best_distance:
+                    continue
+                distance = item_distance(item)
+                if distance < best_distance:
+                    best_distance, best_item = distance, item
+            stack.extend(node.children)
+        return (best_distance, best_item) if best_item is not None else (inf, None)
+
+
+def picking_collider(entity, camera_matrix=None):
+    """
+    the collider to click on the entity with. That's the physics one, unless the entity is drawn the same size on screen
+    however far away it is (like the editor's axes, see Entity.screen_scale). Then it's scaled around the entity's
+    origin to match how it's drawn from the camera (camera_matrix is projection * view)
+    """
+    screen_scale = getattr(entity, 'screen_scale', None)
+    if screen_scale is None or camera_matrix is None:
+        return get_collider(entity)
+    model_mat = entity.generate_model_mat()
+    # the same as the vertex shader does (eg axes.vert), which scales the mesh by the w of the origin in clip space
+    scale = (camera_matrix * model_mat[3]).w * screen_scale
+    return Collider(entity, model_mat * glm.scale(glm.mat4(1), glm.vec3(scale)))
+
+
+class EntityTree:
+    """a SphereTree of entities, which is only rebuilt when the list of entities changes or one of them moves"""
+    def __init__(self):
+        self.entities = []
+        self.colliders = []
+        self.tree = None
+
+    def update(self, entities, camera_matrix=None):
+        """
+        camera_matrix is needed for entities which are drawn the same size on screen (see picking_collider), which are
+        rebuilt every time, since they change whenever the camera moves
+        """
+        entities = list(entities)
+        colliders = [picking_collider(entity, camera_matrix) for entity in entities]
+        # colliders are replaced whenever an entity moves, so if they're all the same objects nothing has moved
+        if self.tree is None or len(colliders) != len(self.colliders) or \
+                any(new is not old for new, old in zip(colliders, self.colliders)) or \
+                any(new is not old for new, old in zip(entities, self.entities)):
+            self.entities, self.colliders = entities, colliders
+            self.tree = SphereTree([collider.centre for collider in colliders],
+                                   [collider.radius for collider in colliders])
+
+    def cast_ray(self, origin, direction, max_distance=inf):
+        """returns a RayHit for the closest entity the ray hits, or None if it doesn't hit anything"""
+        origin = np.array(origin, dtype=np.float64)
+        direction = np.array(direction, dtype=np.float64)
+        direction /= np.linalg.norm(direction)
+
+        def entity_distance(item):
+            collider = self.colliders[item]
+            return min((ray_box_distance(origin, direction, corners, axes)
+                        for corners, axes in zip(collider.corners, collider.axes)), default=inf)
+
+        distance, item = self.tree.cast_ray(origin, direction, entity_distance, max_distance)
+        if item is None:
+            return None
+        return RayHit(self.entities[item], glm.vec3(*(origin + direction * distance)), distance)
+
+
+def cast_ray(entities, origin, direction, max_distance=inf):
+    """returns a RayHit for the closest of the entities that the ray hits, or None if it doesn't hit anything"""
+    tree = EntityTree()
+    tree.update(entities)
+    return tree.cast_ray(origin, direction, max_distance)
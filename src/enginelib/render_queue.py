@@ -0,0 +1,97 @@
+"""
+Sorts entities into the order that's cheapest to draw them in.
+
+Each entity gets a sort key, packed into one int:
+    layer | shader program | set of textures | meshes | depth
+so sorting by it puts everything with the same program together, then within that everything with the same textures,
+then the same meshes, and draws them front to back (so more gets rejected by the depth test).
+The engine skips binding a program, vertex array or texture that's already bound (see gl_state.pxi), so the only
+state changes left are at the boundaries between runs of equal keys.
+
+The layer comes from `entity.render_layer` (0 by default), and always comes first, so it can be used to force
+some things to be drawn after others
+"""
+import glm
+
+
+class RenderQueue:
+    depth_bits = 16
+    mesh_bits = 16
+    texture_bits = 16
+    program_bits = 16
+    max_depth = (1 << depth_bits) - 1
+
+    def __init__(self):
+        # small ints for each program, texture set and mesh list, so they fit in the key.
+        # they're handed out in the order things are first seen, so the order is stable from frame to frame.
+        # programs and meshes are looked up by id(), so this doesn't keep them alive
+        self.program_ids = {}
+        self.texture_ids = {}
+        self.mesh_ids = {}
+        self.generation = 0  # changes whenever the ids are forgotten, so every cached key is worked out again
+        # stats for the last call to sort
+        self.program_changes = 0
+        self.texture_changes = 0
+        self.mesh_changes = 0
+
+    def intern(self, ids, thing, bits):
+        thing_id = ids.get(thing)
+        if thing_id is None:
+            if len(ids) == 1 << bits:
+                raise OverflowError
+            thing_id = ids[thing] = len(ids)
+        return thing_id
+
+    def forget_ids(self):
+        self.program_ids, self.texture_ids, self.mesh_ids = {}, {}, {}
+        self.generation += 1
+
+    def state_key(self, entity):
+        """
+        the part of the key that depends on the entity's program, textures and meshes.
+        It's cached on the entity, and only worked out again if its shader program or meshes are replaced
+        """
+        program, meshes = entity.shader_program, entity.meshes
+        cached = getattr(entity, '_render_state', None)
+        if cached is not None and cached[0] is program and cached[1] is meshes and cached[2] == self.generation:
+            return cached[3]
+
+        textures = tuple((unit, texture.texture) for mesh in meshes for unit, texture in sorted(mesh.textures.items()))
+        try:
+            key = self.intern(self.program_ids, id(program), self.program_bits)
+            key = (key << self.texture_bits) | self.intern(self.texture_ids, textures, self.texture_bits)
+            key = (key << self.mesh_bits) | self.intern(self.mesh_ids, tuple(map(id, meshes)), self.mesh_bits)
+        except OverflowError:
+            # lots of things have come and gone, so start again with only the ones still around
+            self.forget_ids()
+            return self.state_key(entity)
+        entity._render_state = (program, meshes, self.generation, key)
+        return key
+
+    def sort_key(self, entity, camera_position, far):
+        distance = glm.length(entity.generate_model_mat()[3].xyz - camera_position)
+        depth = min(int(distance / far * self.max_depth), self.max_depth)
+        key = (entity.render_layer << (self.program_bits + self.texture_bits + self.mesh_bits)) | self.state_key(entity)
+        return (key << self.depth_bits) | depth
+
+    def sort(self, entities, camera_position, far):
+        """returns the entities in the order they should be drawn in"""
+        generation = self.generation
+        keys = [self.sort_key(entity, camera_position, far) for entity in entities]
+        if self.generation != generation:  # the ids were forgotten part way through, so the keys don't match up
+            keys = [self.sort_key(entity, camera_position, far) for entity in entities]
+        order = sorted(range(len(entities)), key=keys.__getitem__)
+
+        # count how many times each thing changes
+        self.program_changes = self.texture_changes = self.mesh_changes = 0
+        last_program = last_textures = last_meshes = None
+        for i in order:
+            state = keys[i] >> self.depth_bits
+            meshes = state & ((1 << self.mesh_bits) - 1)
+            textures = (state >> self.mesh_bits) & ((1 << self.texture_bits) - 1)
+            program = state >> (self.mesh_bits + self.texture_bits)  # with the layer, which doesn't matter here
+            self.program_changes += program != last_program
+            self.texture_changes += textures != last_textures
+            self.mesh_changes += meshes != last_meshes
+            last_program, last_textures, last_meshes = program, textures, meshes
+        return [entities[i] for i in order]
@@ -120,3 +120,7 @@ def on_frame(**kwargs):
 
 def on_click_entity(**kwargs):
     return basic_hook('on_click_entity', **kwargs)
+
+
+def on_select_entity(**kwargs):
+    return basic_hook('on_select_entity', **kwargs)
@@ -0,0 +1,129 @@
+"""
+stand-ins for the game and its entities, since the real ones need the engine (and a GL context) to be made
+"""
+import itertools
+import sys
+import types
+from collections import defaultdict
+
+import glm
+import pytest
+
+from enginelib import hierarchy
+from enginelib.physics_world import PhysicsWorld
+
+
+class FakeMesh:
+    """a 1x1x1 cube"""
+    def __init__(self):
+        self.corners = [glm.vec3(x, y, z) for x, y, z in itertools.product([-0.5, 0.5], repeat=3)]
+        self.centre = glm.vec3(0)
+        self.bounding_radius = glm.length(glm.vec3(0.5))
+
+
+class FakeEntity:
+    """
+    just enough of an entity (a 1x1x1 cube) for the hierarchy and the physics to work with. Setting things sends the
+    same notifications enginelib.entity.Entity.__setattr__ does (which real_entity_class tests against)
+    """
+    physics_attributes = frozenset(('do_gravity', 'do_collisions'))
+    transform_attributes = frozenset(('position', 'orientation', 'scalar'))
+    wake_attributes = frozenset(('position', 'orientation', 'scalar', 'velocity'))
+    inherit_scale = True
+
+    def __init__(self, game, position=(0, 0, 0), orientation=None, scalar=(1, 1, 1), do_gravity=False,
+                 do_collisions=True):
+        self.game = game
+        self.parent = None
+        self.children = []
+        self.model_mat = None
+        self.meshes = [FakeMesh()]
+        self.bounding_radius = self.meshes[0].bounding_radius
+        self.position = glm.vec3(position)
+        self.orientation = orientation if orientation is not None else glm.quat(1, 0, 0, 0)
+        self.scalar = glm.vec3(scalar)
+        self.velocity = glm.vec3(0)
+        self.do_gravity = do_gravity
+        self.do_collisions = do_collisions
+        self.generate_model_mat()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.transform_attributes:
+            self.mark_transform_dirty()
+            if self.game.transforms is not None:
+                self.game.transforms.set(self, name, value)
+        if name in self.wake_attributes:
+            self.game.physics.wake(self)
+        elif name in self.physics_attributes:
+            self.game.physics.update_body(self)
+
+    def mark_transform_dirty(self):
+        hierarchy.mark_dirty(self)
+        self.game.dirty_transforms.add(self)
+
+    def local_model_mat(self):
+        return hierarchy.local_matrix(self)
+
+    def generate_model_mat(self):
+        self.model_mat = hierarchy.world_matrix(self)
+        return self.model_mat
+
+
+class FakeGame:
+    def __init__(self, entity_class=FakeEntity):
+        self.entity_class = entity_class
+        self.dispatches = defaultdict(list)
+        self.transforms = None
+        self.dirty_transforms = set()
+        self.physics = PhysicsWorld(self)
+
+    def add_callback(self, name, func, **_args):
+        self.dispatches[name].append(func)
+
+    def create_entity(self, *args, **kwargs):
+        """makes an entity, and adds it to the physics"""
+        entity = self.entity_class(self, *args, **kwargs)
+        self.physics.add_entity(entity)
+        return entity
+
+    def run_frames(self, count, delta_t=1/60):
+        for _ in range(count):
+            for func in self.dispatches['on_frame']:
+                func(delta_t)
+
+
+@pytest.fixture
+def stub_engine(monkeypatch):
+    """
+    lets modules which import the engine (like enginelib.entity and enginelib.util) be imported when it isn't built,
+    by putting a stand-in in its place (with a plain engine.Model, so classes can be made from it). Anything imported
+    while it's there is thrown away afterwards, so nothing else sees it
+    """
+    try:
+        import engine
+    except ImportError:
+        engine = types.ModuleType('engine')
+        engine.Model = type('Model', (), {})
+        monkeypatch.setitem(sys.modules, 'engine', engine)
+    already_imported = set(sys.modules)
+    yield engine
+    for name in set(sys.modules) - already_imported:
+        package, _, module = name.rpartition('.')
+        if package in sys.modules:
+            vars(sys.modules[package]).pop(module, None)
+        del sys.modules[name]
+
+
+@pytest.fixture
+def real_entity_class(stub_engine):
+    """
+    a subclass of the real enginelib.entity.Entity, which is set up like a FakeEntity (rather than by Entity.__init__,
+    which loads shaders), so everything else it does is tested as it is
+    """
+    from enginelib.entity import Entity
+
+    class CubeEntity(Entity):
+        __init__ = FakeEntity.__init__
+
+    return CubeEntity
@@ -0,0 +1,155 @@
+import threading
+
+from hypothesis import given, settings
+from hypothesis.strategies import lists, sampled_from
+
+from enginelib.assets import AssetLoader, cube_data
+
+# {path: [the texture paths of each mesh]}
+models = {'a': [['t1', 't2'], ['t1']], 'b': [['t2'], []], 'c': [], 'broken': None, 'bad texture': [['missing']]}
+PLACEHOLDER = ['placeholder mesh']
+PLACEHOLDER_TEXTURE = 'placeholder texture'
+
+
+class FakeMeshData:
+    def __init__(self, path, texture_paths):
+        self.path = path
+        self.texture_paths = texture_paths
+
+
+class FakeMesh:
+    def __init__(self, mesh_data, textures):
+        self.mesh_data = mesh_data
+        self.textures = dict(enumerate(textures))
+
+    def add_texture(self, texture, unit, overwrite=False):
+        assert overwrite or unit not in self.textures
+        self.textures[unit] = texture
+
+
+class FakeLoader(AssetLoader):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.imported = []
+        self.decoded = []
+        self.model_cache = {}
+        self.texture_cache = set()
+        self.main_thread = threading.get_ident()
+
+    def load_model_data(self, path, post_process):
+        assert threading.get_ident() != self.main_thread
+        self.imported.append(path)
+        if models[path] is None:
+            raise RuntimeError("that's not a model")
+        return [FakeMeshData(path, texture_paths) for texture_paths in models[path]]
+
+    def decode_image(self, path, flip_on_load):
+        assert threading.get_ident() != self.main_thread
+        self.decoded.append(path)
+        if path == 'missing':
+            raise FileNotFoundError(path)
+        return 'image ' + path
+
+    def model_cache_key(self, path, flip_on_load, post_process):
+        return path, flip_on_load
+
+    def cached_model(self, key):
+        return self.model_cache.get(key)
+
+    def cache_model(self, key, meshes):
+        self.model_cache[key] = meshes
+        return meshes
+
+    def texture_loaded(self, path, flip_on_load):
+        return (path, flip_on_load) in self.texture_cache
+
+    def upload_mesh(self, mesh_data, flip_on_load, textures):
+        assert threading.get_ident() == self.main_thread
+        return FakeMesh(mesh_data, textures)
+
+    def make_texture(self, path, flip_on_load, image):
+        assert threading.get_ident() == self.main_thread
+        if image is None:
+            assert (path, flip_on_load) in self.texture_cache, "textures which haven't been decoded shouldn't be loaded"
+        else:
+            assert image == 'image ' + path
+            self.texture_cache.add((path, flip_on_load))
+        return 'texture ' + path
+
+    def placeholder(self):
+        return PLACEHOLDER
+
+    def placeholder_texture(self):
+        return PLACEHOLDER_TEXTURE
+
+
+@settings(deadline=None)
+@given(lists(sampled_from(sorted(models)), max_size=10))
+def test_models_are_loaded_once_and_swapped_in(paths):
+    loader = FakeLoader(workers=3)
+    loaded = []
+    for path in paths:
+        assert loader.load_model(path, lambda meshes, path_=path: loaded.append((path_, meshes))) is PLACEHOLDER
+    loader.finish()
+    assert not loader.busy()
+
+    # each model is only imported once, however many times it's asked for, and every texture's only decoded once
+    assert sorted(loader.imported) == sorted(set(paths))
+    assert len(loader.decoded) == len(set(loader.decoded))
+    working = [path for path in paths if models[path] is not None]
+    assert sorted(path for path, _ in loaded) == sorted(working)
+    for path, meshes in loaded:
+        assert meshes is loader.model_cache[path, True]
+        assert [mesh.mesh_data.texture_paths for mesh in meshes] == models[path]
+        for mesh in meshes:
+            for unit, texture_path in enumerate(mesh.mesh_data.texture_paths):
+                expected = PLACEHOLDER_TEXTURE if texture_path == 'missing' else 'texture ' + texture_path
+                assert mesh.textures[unit] == expected
+        # and once it's loaded, it's used straight away
+        assert loader.load_model(path, lambda meshes: 1 / 0) is meshes
+    loader.close()
+
+
+def test_uploads_are_spread_over_frames():
+    loader = FakeLoader(upload_budget=0)
+    loaded = []
+    loader.load_model('a', loaded.append)
+    while not loader.uploads:
+        loader.handle_finished(block=True)
+
+    # with no time to spare, it does one thing a frame, which is still enough to get there eventually
+    frames = 0
+    while loader.busy():
+        loader.handle_finished(block=not loader.uploads)
+        loader.update()
+        assert loader.uploaded <= 1
+        frames += 1
+    # 2 meshes and 2 textures
+    assert frames >= 4
+    [meshes] = loaded
+    assert [mesh.textures for mesh in meshes] == [{0: 'texture t1', 1: 'texture t2'}, {0: 'texture t1'}]
+    loader.close()
+
+
+def test_broken_models_keep_the_placeholder(capsys):
+    loader = FakeLoader()
+    loaded = []
+    assert loader.load_model('broken', loaded.append) is PLACEHOLDER
+    loader.finish()
+    assert not loaded
+    assert "failed to load broken" in capsys.readouterr().err
+    loader.close()
+
+
+def test_cube():
+    data, indices = cube_data()
+    assert len(data) == 24 * 8
+    assert sorted(set(indices)) == list(range(24))
+    for face in range(12):
+        triangle = [data[8 * i:8 * i + 3] for i in indices[3 * face:3 * face + 3]]
+        normal = data[8 * indices[3 * face] + 3:8 * indices[3 * face] + 6]
+        (ax, ay, az), (bx, by, bz), (cx, cy, cz) = triangle
+        u, v = (bx - ax, by - ay, bz - az), (cx - ax, cy - ay, cz - az)
+        cross = (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+        # anticlockwise from the outside
+        assert sum(a * b for a, b in zip(cross, normal)) > 0
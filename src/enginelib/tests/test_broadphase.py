@@ -0,0 +1,116 @@
+from hypothesis import given
+from hypothesis.strategies import floats, lists, tuples, integers
+
+from enginelib.broadphase import SweepAndPrune, brute_force_pairs
+
+
+class Body:
+    def __init__(self, position, radius):
+        self.position = position
+        self.radius = radius
+
+
+def get_bounds(body):
+    return tuple(x - body.radius for x in body.position), tuple(x + body.radius for x in body.position)
+
+
+coordinates = floats(-10, 10)
+bodies = lists(tuples(tuples(coordinates, coordinates, coordinates), floats(0.1, 3)), max_size=30)
+
+
+def as_sets(pairs):
+    return {frozenset(pair) for pair in pairs}
+
+
+@given(bodies)
+def test_pairs_match_brute_force(body_data):
+    broadphase = SweepAndPrune(get_bounds=get_bounds)
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+    assert as_sets(broadphase.pairs()) == as_sets(brute_force_pairs(all_bodies, get_bounds=get_bounds))
+
+
+@given(bodies, lists(tuples(integers(0, 29), tuples(coordinates, coordinates, coordinates))))
+def test_moving_bodies_one_at_a_time(body_data, moves):
+    broadphase = SweepAndPrune(get_bounds=get_bounds)
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+
+    for index, position in moves:
+        if index >= len(all_bodies):
+            continue
+        all_bodies[index].position = position
+        broadphase.update(all_bodies[index])
+        assert as_sets(broadphase.pairs()) == as_sets(brute_force_pairs(all_bodies, get_bounds=get_bounds))
+
+
+@given(bodies, lists(tuples(coordinates, coordinates, coordinates), min_size=30, max_size=30))
+def test_moving_everything_at_once(body_data, new_positions):
+    broadphase = SweepAndPrune(get_bounds=get_bounds)
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+
+    for body, position in zip(all_bodies, new_positions):
+        body.position = position
+    broadphase.update()
+    assert as_sets(broadphase.pairs()) == as_sets(brute_force_pairs(all_bodies, get_bounds=get_bounds))
+
+
+@given(bodies, lists(tuples(integers(0, 29), tuples(coordinates, coordinates, coordinates)), max_size=30))
+def test_moving_some_bodies_at_once(body_data, moves):
+    broadphase = SweepAndPrune(get_bounds=get_bounds)
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+
+    moved = []
+    for index, position in moves:
+        if index < len(all_bodies):
+            all_bodies[index].position = position
+            moved.append(all_bodies[index])
+    # depending on how many there are, they're either bubbled into place one at a time or all sorted at once
+    broadphase.update_bodies(moved + [Body((0, 0, 0), 1)])  # bodies it isn't tracking are ignored
+    assert as_sets(broadphase.pairs()) == as_sets(brute_force_pairs(all_bodies, get_bounds=get_bounds))
+
+
+@given(bodies)
+def test_removing_bodies(body_data):
+    broadphase = SweepAndPrune(get_bounds=get_bounds)
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+    for body in all_bodies[::2]:
+        broadphase.remove(body)
+    remaining = all_bodies[1::2]
+
+    assert as_sets(broadphase.pairs()) == as_sets(brute_force_pairs(remaining, get_bounds=get_bounds))
+    for body in remaining:
+        expected = {other for pair in brute_force_pairs(remaining, get_bounds=get_bounds) if body in pair
+                    for other in pair if other is not body}
+        assert set(broadphase.potential_contacts(body)) == expected
+
+
+@given(bodies, lists(tuples(coordinates, coordinates, coordinates), min_size=30, max_size=30))
+def test_removed_pairs_are_reported(body_data, new_positions):
+    removed = []
+    broadphase = SweepAndPrune(get_bounds=get_bounds, on_pair_removed=lambda *pair: removed.append(frozenset(pair)))
+    all_bodies = [Body(position, radius) for position, radius in body_data]
+    for body in all_bodies:
+        broadphase.add(body)
+    old_pairs = as_sets(broadphase.pairs())
+    removed.clear()
+
+    for body, position in zip(all_bodies, new_positions):
+        body.position = position
+    broadphase.update()
+    # pairs can stop and start overlapping again partway through the sort, so there might be extras
+    assert set(removed) >= old_pairs - as_sets(broadphase.pairs())
+
+    removed.clear()
+    pairs = as_sets(broadphase.pairs())
+    if all_bodies:
+        broadphase.remove(all_bodies[0])
+        assert set(removed) == {pair for pair in pairs if all_bodies[0] in pair}
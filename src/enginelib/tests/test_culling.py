@@ -0,0 +1,90 @@
+import glm
+import numpy as np
+from hypothesis import given
+from hypothesis.strategies import floats, integers, lists, tuples
+
+from enginelib import culling
+from enginelib.picking import SphereTree
+
+coordinates = floats(-50, 50)
+vectors = tuples(coordinates, coordinates, coordinates)
+spheres = lists(tuples(vectors, floats(0, 5)), max_size=60)
+
+
+class FakeEntity:
+    def __init__(self, position, radius):
+        self.position = glm.vec3(position)
+        self.bounding_radius = radius
+
+    def generate_model_mat(self):
+        return glm.translate(glm.mat4(1), self.position)
+
+
+def camera_matrix(eye, target):
+    if glm.length(glm.vec3(target) - glm.vec3(eye)) < 0.1:
+        target = (eye[0], eye[1], eye[2] - 1)
+    up = glm.vec3(0, 1, 0) if abs(glm.normalize(glm.vec3(target) - glm.vec3(eye)).y) < 0.99 else glm.vec3(1, 0, 0)
+    return glm.perspective(glm.radians(75), 1.5, 0.1, 100) * glm.lookAt(glm.vec3(eye), glm.vec3(target), up)
+
+
+@given(vectors, vectors, lists(vectors, max_size=30))
+def test_planes_match_clip_space(eye, target, points):
+    matrix = camera_matrix(eye, target)
+    planes = culling.frustum_planes(matrix)
+    inside = culling.spheres_in_frustum(planes, np.array(points).reshape(-1, 3), np.zeros(len(points)))
+    for point, is_inside in zip(points, inside):
+        clip = matrix * glm.vec4(glm.vec3(point), 1)
+        if min(clip.w - abs(coordinate) for coordinate in clip.xyz) > 1e-3 * max(1, abs(clip.w)):
+            assert is_inside  # clearly inside
+        elif max(abs(coordinate) - clip.w for coordinate in clip.xyz) > 1e-3 * max(1, abs(clip.w)):
+            assert not is_inside  # clearly outside
+
+
+@given(vectors, vectors, spheres)
+def test_tree_matches_brute_force(eye, target, sphere_data):
+    planes = culling.frustum_planes(camera_matrix(eye, target))
+    centres = np.array([centre for centre, _ in sphere_data]).reshape(-1, 3)
+    radii = np.array([radius for _, radius in sphere_data])
+    tree = SphereTree(centres, radii)
+    items, _tested = culling.tree_items_in_frustum(tree, planes)
+    assert sorted(items) == list(np.flatnonzero(culling.spheres_in_frustum(planes, centres, radii)))
+
+
+@given(vectors, vectors, spheres, lists(tuples(integers(0, 59), vectors)), lists(integers(0, 59)))
+def test_culler_tracks_moves_and_removals(eye, target, sphere_data, moves, removals):
+    planes = culling.frustum_planes(camera_matrix(eye, target))
+    culler = culling.FrustumCuller()
+    culler.min_rebuild_count = 4  # so it actually rebuilds the tree sometimes
+    entities = [FakeEntity(centre, radius) for centre, radius in sphere_data]
+    for entity in entities:
+        culler.add(entity)
+    culler.visible_entities(planes)
+
+    for index, position in moves:
+        if index < len(entities):
+            entities[index].position = glm.vec3(position)
+            culler.moved(entities[index])
+            culler.visible_entities(planes)
+    for index in removals:
+        if index < len(entities) and entities[index] is not None:
+            culler.remove(entities[index])
+            entities[index] = None
+    entities = [entity for entity in entities if entity is not None]
+
+    visible = culler.visible_entities(planes)
+    expected = culling.spheres_in_frustum(planes, np.array([entity.position for entity in entities]).reshape(-1, 3),
+                                          np.array([entity.bounding_radius for entity in entities]))
+    assert set(map(id, visible)) == {id(entity) for entity, inside in zip(entities, expected) if inside}
+    assert culler.culled == len(entities) - len(visible)
+
+
+def test_most_of_a_big_scene_is_never_tested():
+    # a grid of things, with the camera looking along one edge of it
+    entities = [FakeEntity((x, 0, z), 0.5) for x in range(100) for z in range(100)]
+    culler = culling.FrustumCuller()
+    for entity in entities:
+        culler.add(entity)
+    planes = culling.frustum_planes(camera_matrix((-5, 1, 50), (-6, 1, 50)))  # looking away from everything
+    assert culler.visible_entities(planes) == []
+    assert culler.tested < len(entities) / 10
+    assert culler.culled == len(entities)
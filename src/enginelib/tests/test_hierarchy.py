@@ -0,0 +1,129 @@
+import glm
+import numpy as np
+import pytest
+from hypothesis import given
+from hypothesis.strategies import floats, integers, lists, tuples
+
+from conftest import FakeGame
+from enginelib import hierarchy
+
+coordinates = floats(-10, 10)
+vectors = tuples(coordinates, coordinates, coordinates)
+scales = tuples(floats(0.5, 2), floats(0.5, 2), floats(0.5, 2))
+angles = floats(0, 6.3)
+# each entity's transform, and the index of its parent (anything that isn't an earlier entity means no parent)
+trees = lists(tuples(vectors, angles, vectors, scales, integers(-1, 20)), min_size=1, max_size=20)
+# a rotated child of something scaled differently on each axis gets sheared, which a transform can't describe
+uniform_scales = floats(0.5, 2).map(lambda scale: (scale, scale, scale))
+uniform_trees = lists(tuples(vectors, angles, vectors, uniform_scales, integers(-1, 20)), min_size=1, max_size=20)
+
+
+def make_tree(tree_data, game=None):
+    game = game or FakeGame()
+    entities = []
+    for position, angle, axis, scalar, parent in tree_data:
+        axis = glm.vec3(axis) if glm.length(glm.vec3(axis)) > 0.01 else glm.vec3(0, 1, 0)
+        entity = game.entity_class(game, position, glm.angleAxis(angle, glm.normalize(axis)), scalar)
+        if 0 <= parent < len(entities):
+            hierarchy.set_parent(entity, entities[parent])
+        entities.append(entity)
+    return entities
+
+
+def expected_world_matrix(entity):
+    """the slow way, straight from the definition"""
+    matrix = glm.scale(glm.translate(glm.mat4(1), entity.position) * glm.mat4_cast(entity.orientation), entity.scalar)
+    if entity.parent is None:
+        return matrix
+    parent_matrix = expected_world_matrix(entity.parent)
+    if not entity.inherit_scale:
+        parent_matrix = glm.mat4(*(glm.normalize(parent_matrix[i]) for i in range(3)), parent_matrix[3])
+    return parent_matrix * matrix
+
+
+def assert_close(mat1, mat2):
+    assert np.allclose(np.array(mat1), np.array(mat2), rtol=1e-3, atol=1e-2)
+
+
+@given(trees)
+def test_world_matrices_are_relative_to_parents(tree_data):
+    entities = make_tree(tree_data)
+    for entity in entities:
+        assert_close(hierarchy.world_matrix(entity), expected_world_matrix(entity))
+
+
+@given(trees, lists(tuples(integers(0, 19), vectors)))
+def test_batched_update_matches(tree_data, moves):
+    game = FakeGame()
+    dirty = game.dirty_transforms
+    entities = make_tree(tree_data, game)
+    hierarchy.update_world_matrices(dirty)
+    dirty.clear()
+    assert all(entity._model_mat is not None for entity in entities)
+
+    old_matrices = [entity._model_mat for entity in entities]
+    moved = set()
+    for index, position in moves:
+        if index < len(entities):
+            entities[index].position = glm.vec3(position)
+            moved.add(entities[index])
+    hierarchy.update_world_matrices(dirty)
+
+    for entity, old_matrix in zip(entities, old_matrices):
+        assert_close(entity._model_mat, expected_world_matrix(entity))
+        # only things that moved (or are attached to something that moved) get rebuilt
+        ancestor = entity
+        while ancestor is not None and ancestor not in moved:
+            ancestor = ancestor.parent
+        if ancestor is None:
+            assert entity._model_mat is old_matrix
+
+
+@given(uniform_trees, integers(0, 19), integers(-1, 19))
+def test_keeping_world_transform(tree_data, index, parent_index):
+    entities = make_tree(tree_data)
+    entity = entities[index % len(entities)]
+    parent = entities[parent_index % len(entities)] if parent_index >= 0 else None
+    ancestor = parent
+    while ancestor is not None:
+        if ancestor is entity:
+            return  # that's a cycle, which is tested below
+        ancestor = ancestor.parent
+
+    before = hierarchy.world_matrix(entity)
+    hierarchy.set_parent(entity, parent, keep_world_transform=True)
+    assert entity.parent is parent
+    assert_close(hierarchy.world_matrix(entity), before)
+
+
+def test_moving_a_parent_moves_its_children():
+    game = FakeGame()
+    dirty = game.dirty_transforms
+    parent, child, grandchild = make_tree([((1, 0, 0), 0, (0, 1, 0), (1, 1, 1), -1),
+                                           ((0, 2, 0), 0, (0, 1, 0), (1, 1, 1), 0),
+                                           ((0, 0, 3), 0, (0, 1, 0), (1, 1, 1), 1)], game)
+    assert_close(hierarchy.world_matrix(grandchild)[3], glm.vec4(1, 2, 3, 1))
+    parent.position = glm.vec3(5, 0, 0)
+    assert grandchild._model_mat is None
+    hierarchy.update_world_matrices(dirty)
+    assert_close(grandchild._model_mat[3], glm.vec4(5, 2, 3, 1))
+
+
+def test_not_inheriting_scale():
+    parent, child = make_tree([((1, 0, 0), 1.5, (0, 0, 1), (4, 4, 4), -1),
+                               ((0, 1, 0), 0, (0, 1, 0), (0.5, 0.5, 0.5), 0)])
+    child.inherit_scale = False
+    matrix = hierarchy.world_matrix(child)
+    assert_close(matrix, expected_world_matrix(child))
+    assert glm.length(matrix[0].xyz) == pytest.approx(0.5)
+
+
+def test_cycles_are_rejected():
+    parent, child, grandchild = make_tree([((0, 0, 0), 0, (0, 1, 0), (1, 1, 1), -1),
+                                           ((0, 0, 0), 0, (0, 1, 0), (1, 1, 1), 0),
+                                           ((0, 0, 0), 0, (0, 1, 0), (1, 1, 1), 1)])
+    with pytest.raises(ValueError):
+        hierarchy.set_parent(parent, grandchild)
+    with pytest.raises(ValueError):
+        hierarchy.set_parent(parent, parent)
+    assert parent.parent is None
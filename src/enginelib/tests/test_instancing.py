@@ -0,0 +1,112 @@
+import glm
+import numpy as np
+from hypothesis import given
+from hypothesis.strategies import booleans, integers, lists, tuples
+
+from enginelib.instancing import InstanceBatch, Instancer
+
+programs = [object() for _ in range(3)]
+meshes = [[object()] for _ in range(3)]
+
+
+class FakeEntity:
+    def __init__(self, layer, program, mesh, x=0):
+        self.render_layer = layer
+        self.shader_program = programs[program]
+        self.meshes = meshes[mesh]
+        self.model_mat = glm.translate(glm.mat4(1), glm.vec3(x, 0, 0))
+
+    def draw(self):
+        pass
+
+    def generate_model_mat(self):
+        return self.model_mat
+
+
+class CustomEntity(FakeEntity):
+    def draw(self):
+        pass
+
+
+class FakeBuffer:
+    def __init__(self):
+        self.matrices = np.zeros((0, 4, 4), dtype=np.float32)
+        self.uploads = []
+
+    def upload(self, matrices, start, stop):
+        if len(matrices) > len(self.matrices):
+            self.matrices = matrices.copy()  # like the real one, everything is uploaded if it needs to grow
+        else:
+            self.matrices[start:stop] = matrices[start:stop]
+        self.uploads.append((start, stop))
+
+
+class FakeBatch(InstanceBatch):
+    # the last program can't be instanced
+    instanced_program = staticmethod(lambda program: program if program is not programs[2] else None)
+    make_buffer = staticmethod(FakeBuffer)
+
+
+def make_instancer():
+    instancer = Instancer()
+    instancer.batch_class = FakeBatch
+    instancer.plain_draw = FakeEntity.draw
+    return instancer
+
+
+# (layer, program, mesh, overrides draw)
+entity_data = lists(tuples(integers(0, 1), integers(0, 2), integers(0, 2), booleans()), max_size=30)
+
+
+@given(entity_data)
+def test_runs_keep_the_order(data):
+    entities = [(CustomEntity if custom else FakeEntity)(layer, program, mesh) for layer, program, mesh, custom in data]
+    entities.sort(key=lambda entity: (entity.render_layer, id(entity.shader_program), id(entity.meshes),
+                                      type(entity) is CustomEntity))
+    instancer = make_instancer()
+    runs = instancer.runs(entities)
+    assert [entity for _, run in runs for entity in run] == entities
+
+    for batch, run in runs:
+        if batch is None:
+            continue
+        assert len(run) >= instancer.min_instances
+        assert all(type(entity) is FakeEntity and batch.matches(entity) for entity in run)
+        assert batch.program is not programs[2]
+    # nothing that could have been instanced was left out
+    separate = [entity for batch, run in runs if batch is None for entity in run]
+    for entity in separate:
+        if type(entity) is FakeEntity and entity.shader_program is not programs[2]:
+            assert sum(instancer.group_key(other) == instancer.group_key(entity) for other in entities) == 1
+
+
+def test_batches_are_kept_between_frames():
+    instancer = make_instancer()
+    entities = [FakeEntity(0, 0, 0) for _ in range(3)]
+    [(batch, _)] = instancer.runs(entities)
+    [(same_batch, _)] = instancer.runs(entities)
+    assert same_batch is batch
+    instancer.runs([])
+    [(new_batch, _)] = instancer.runs(entities)
+    assert new_batch is not batch
+
+
+@given(lists(integers(0, 30), min_size=1, max_size=20), lists(tuples(integers(0, 30), integers(-5, 5))))
+def test_only_changed_matrices_are_uploaded(order, moves):
+    entities = [FakeEntity(0, 0, 0, x) for x in range(31)]
+    batch = FakeBatch(programs[0], meshes[0])
+    visible = [entities[i] for i in dict.fromkeys(order)]
+    batch.update(visible)
+
+    for index, x in moves:
+        entities[index].model_mat = glm.translate(glm.mat4(1), glm.vec3(x, 1, 0))
+    uploads_before = len(batch.buffer.uploads)
+    batch.update(visible)
+
+    moved = [i for i, entity in enumerate(visible) if any(entity is entities[index] for index, _ in moves)]
+    if moved:
+        assert batch.buffer.uploads[-1] == (min(moved), max(moved) + 1)
+    else:
+        assert len(batch.buffer.uploads) == uploads_before
+    for entity, matrix in zip(visible, batch.buffer.matrices):
+        assert np.array_equal(matrix, np.array(entity.generate_model_mat()).T)
@@ -0,0 +1,21 @@
+import numpy as np
+from hypothesis import given, settings
+from hypothesis.strategies import integers
+
+from enginelib import physics
+from enginelib.parallel_physics import ParallelNarrowPhase, random_boxes
+
+
+@settings(deadline=None, max_examples=10)
+@given(integers(0, 2**32 - 1), integers(0, 500))
+def test_parallel_matches_serial(seed, pairs):
+    rng = np.random.RandomState(seed)
+    corners, axes = random_boxes(20, rng)
+    first, second = rng.randint(0, 20, pairs), rng.randint(0, 20, pairs)
+    hints = rng.randint(-1, 15, pairs).astype(np.int8)
+
+    expected = physics.batch_separating_axes(corners[first], axes[first], corners[second], axes[second], hints)
+    with ParallelNarrowPhase(processes=3, min_pairs_per_process=1) as narrow_phase:
+        # twice, so the second time reuses the shared memory
+        for _ in range(2):
+            assert np.array_equal(narrow_phase.separating_axes(corners, axes, first, second, hints), expected)
@@ -0,0 +1,147 @@
+import itertools
+from types import SimpleNamespace
+
+import glm
+import numpy as np
+import pytest
+from hypothesis import given, settings
+from hypothesis.strategies import integers, lists
+
+from enginelib import physics
+
+
+def random_box(rng):
+    """returns a fake mesh with a random aabb, and a random model matrix to put it in the world"""
+    minimum = glm.vec3(*rng.uniform(-1, 0, 3))
+    maximum = glm.vec3(*rng.uniform(0.1, 1, 3))
+    x = (minimum, maximum)
+    corners = [glm.vec3(x[a][0], x[b][1], x[c][2]) for a, b, c in itertools.product([0, 1], repeat=3)]
+
+    model_mat = glm.translate(glm.mat4(1), glm.vec3(*rng.uniform(-2, 2, 3)))
+    model_mat = model_mat * glm.mat4_cast(glm.angleAxis(rng.uniform(0, 6.3), glm.normalize(glm.vec3(*rng.normal(size=3)))))
+    model_mat = glm.scale(model_mat, glm.vec3(*rng.uniform(0.5, 2, 3)))
+    return SimpleNamespace(corners=corners), model_mat
+
+
+needs_native = pytest.mark.skipif(physics.native is None, reason="the engine was built without the collision kernels")
+
+
+def random_pairs(seed, n=50):
+    rng = np.random.RandomState(seed)
+    pairs = [(random_box(rng), random_box(rng)) for _ in range(n)]
+    corners1, axes1 = physics.mesh_boxes([box for box, _ in pairs])
+    corners2, axes2 = physics.mesh_boxes([box for _, box in pairs])
+    return pairs, (corners1, axes1, corners2, axes2)
+
+
+def random_spheres(seed, n=50):
+    rng = np.random.RandomState(seed)
+    return rng.uniform(-2, 2, (n, 3)), rng.uniform(0, 1, n), rng.uniform(-2, 2, (n, 3)), rng.uniform(0, 1, n)
+
+
+def scalar_intersect(mesh1, model_mat1, mesh2, model_mat2):
+    corners1 = [glm.vec3(model_mat1 * glm.vec4(corner, 1)) for corner in mesh1.corners]
+    corners2 = [glm.vec3(model_mat2 * glm.vec4(corner, 1)) for corner in mesh2.corners]
+    return physics.unaligned_intersect(corners1, model_mat1, corners2, model_mat2)
+
+
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1))
+def test_numpy_matches_scalar(seed):
+    pairs, boxes = random_pairs(seed)
+    expected = [scalar_intersect(*box1, *box2) for box1, box2 in pairs]
+    assert list(physics.numpy_unaligned_intersect(*boxes)) == expected
+
+
+@needs_native
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1))
+def test_native_matches_scalar(seed):
+    pairs, boxes = random_pairs(seed)
+    expected = [scalar_intersect(*box1, *box2) for box1, box2 in pairs]
+    assert list(physics.batch_unaligned_intersect(*boxes)) == expected
+
+
+@given(integers(0, 2**32 - 1))
+def test_spheres_match_scalar(seed):
+    centres1, radii1, centres2, radii2 = random_spheres(seed)
+    expected = [glm.length(glm.vec3(*c1) - glm.vec3(*c2)) <= r1 + r2
+                for c1, r1, c2, r2 in zip(centres1, radii1, centres2, radii2)]
+    assert list(physics.batch_spheres_intersect(centres1, radii1, centres2, radii2)) == expected
+
+
+@given(integers(0, 2**32 - 1))
+def test_aabbs_match_scalar(seed):
+    centres1, radii1, centres2, radii2 = random_spheres(seed)
+    bounds = (centres1 - radii1[:, None], centres1 + radii1[:, None],
+              centres2 - radii2[:, None], centres2 + radii2[:, None])
+    expected = [physics.aabb_intersect(*(glm.vec3(*x) for x in box)) for box in zip(*bounds)]
+    assert list(physics.batch_aabb_intersect(*bounds)) == expected
+
+
+@needs_native
+def test_native_rejects_mismatched_lengths():
+    _, (corners1, axes1, corners2, axes2) = random_pairs(0)
+    with pytest.raises(ValueError):
+        physics.batch_unaligned_intersect(corners1, axes1, corners2[:-1], axes2[:-1])
+
+
+@given(lists(integers(0, 3), min_size=3, max_size=3))
+def test_axis_aligned_boxes(offset):
+    mesh = SimpleNamespace(corners=[glm.vec3(x, y, z) for x, y, z in itertools.product([0, 1], repeat=3)])
+    model_mat = glm.translate(glm.mat4(1), glm.vec3(offset))
+    corners1, axes1 = physics.mesh_boxes([(mesh, glm.mat4(1))])
+    corners2, axes2 = physics.mesh_boxes([(mesh, model_mat)])
+    # touching counts as intersecting, so anything within 1 unit on every axis intersects
+    assert physics.batch_unaligned_intersect(corners1, axes1, corners2, axes2)[0] == all(x <= 1 for x in offset)
+
+
+def check_separating_axes(separating_axes, pairs, boxes):
+    expected = [scalar_intersect(*box1, *box2) for box1, box2 in pairs]
+    assert [axis == -1 for axis in separating_axes] == expected
+    # the axes it found really do separate the boxes, so using them as hints finds them again straight away
+    assert list(physics.numpy_separating_axes(*boxes, separating_axes)) == list(separating_axes)
+
+
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1), integers(-1, 14))
+def test_numpy_separating_axes(seed, hint):
+    pairs, boxes = random_pairs(seed)
+    check_separating_axes(physics.numpy_separating_axes(*boxes, np.full(len(pairs), hint)), pairs, boxes)
+
+
+@needs_native
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1), integers(-1, 14))
+def test_native_separating_axes(seed, hint):
+    pairs, boxes = random_pairs(seed)
+    check_separating_axes(physics.batch_separating_axes(*boxes, np.full(len(pairs), hint)), pairs, boxes)
+
+
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1))
+def test_sweeps_stop_before_boxes_touch(seed):
+    rng = np.random.RandomState(seed)
+    pairs, (corners1, axes1, corners2, axes2) = random_pairs(seed)
+    motions = rng.uniform(-8, 8, (len(pairs), 3))
+    times = physics.batch_time_of_impact(corners1, axes1, motions, corners2, axes2)
+    for time in np.linspace(0, 1, 20):
+        # anywhere before the time of impact, they can't be touching (unless they were touching to begin with)
+        before_impact = (time < times) & ~physics.numpy_unaligned_intersect(corners1, axes1, corners2, axes2)
+        moved = corners1 + motions[:, None] * time
+        assert not np.any(physics.numpy_unaligned_intersect(moved, axes1, corners2, axes2) & before_impact
+                          & np.isfinite(times))
+
+
+def test_sweeping_aligned_boxes():
+    mesh = SimpleNamespace(corners=[glm.vec3(x, y, z) for x, y, z in itertools.product([0, 1], repeat=3)])
+    corners, axes = physics.mesh_boxes([(mesh, glm.mat4(1)), (mesh, glm.translate(glm.mat4(1), glm.vec3(3, 0, 0)))])
+    motions = np.array([[4, 0, 0], [1, 0, 0], [4, 3, 0]])
+    times = physics.batch_time_of_impact(corners[[0, 0, 0]], axes[[0, 0, 0]], motions, corners[[1, 1, 1]], axes[[1, 1, 1]])
+    # the gap is 2, so moving 4 takes half the motion, moving 1 never gets there,
+    # and moving up by 3 at the same time means it goes over the top of the other box
+    assert list(times) == [0.5, np.inf, np.inf]
+
+
+def test_empty_batch():
+    assert physics.entity_pairs_intersect([]) == []
@@ -0,0 +1,267 @@
+import glm
+
+from conftest import FakeGame
+from enginelib import hierarchy
+from enginelib.physics import get_collider
+from enginelib.physics_world import find_islands
+
+
+def test_bodies_fall():
+    game = FakeGame()
+    body = game.create_entity((0, 10, 0), do_gravity=True)
+    game.run_frames(60)
+    assert body.position.y < 10
+    assert body.velocity.y < 0
+
+
+def test_static_bodies_dont_move():
+    game = FakeGame()
+    floor = game.create_entity((0, 0, 0))
+    game.run_frames(60)
+    assert floor.position == glm.vec3(0, 0, 0)
+
+
+def test_falling_body_stops_on_floor():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 2, 0), do_gravity=True)
+    game.run_frames(600)
+    # it should stop just above the floor, without going through it
+    assert 1 <= body.position.y < 1.1
+    assert body.velocity == glm.vec3(0)
+
+
+def test_parented_bodies_fall_in_world_space():
+    game = FakeGame()
+    game.create_entity((5, 0, 0))
+    # upside down and twice the size, so the child's position is flipped and scaled on the way to world space
+    parent = game.create_entity((5, 3, 0), do_collisions=False)
+    parent.orientation = glm.angleAxis(glm.pi(), glm.vec3(1, 0, 0))
+    parent.scalar = glm.vec3(2)
+    body = game.create_entity((0, -1, 0), do_gravity=True)
+    hierarchy.set_parent(body, parent)
+    assert glm.distance(body.generate_model_mat()[3].xyz, glm.vec3(5, 5, 0)) < 1e-4
+
+    game.run_frames(30)
+    assert body.generate_model_mat()[3].y < 5
+    assert body.velocity.y < 0
+    game.run_frames(600)
+    # it's a 2x2x2 box now, so it stops with its middle just over 1 above the top of the floor
+    world_position = body.generate_model_mat()[3].xyz
+    assert 1.5 <= world_position.y < 1.6
+    assert glm.length(world_position.xz - glm.vec2(5, 0)) < 1e-4
+    assert parent.position == glm.vec3(5, 3, 0)
+
+
+def test_bodies_without_collisions_fall_through():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 2, 0), do_gravity=True, do_collisions=False)
+    game.run_frames(600)
+    assert body.position.y < -1
+
+
+def test_fixed_timestep():
+    game = FakeGame()
+    ticks = []
+    game.physics.tick = ticks.append
+    game.run_frames(10, delta_t=1/30)
+    assert len(ticks) == 20
+    assert all(tick == game.physics.tick_length for tick in ticks)
+
+
+def test_removed_bodies_stop_moving():
+    game = FakeGame()
+    body = game.create_entity((0, 10, 0), do_gravity=True)
+    game.physics.remove_entity(body)
+    game.run_frames(60)
+    assert body.position.y == 10
+
+
+def test_resting_bodies_fall_asleep():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    assert body in game.physics.sleeping
+    position = glm.vec3(body.position)
+    game.run_frames(60)
+    assert body.position == position
+
+
+def test_falling_bodies_stay_awake():
+    game = FakeGame()
+    body = game.create_entity((0, 10, 0), do_gravity=True, do_collisions=False)
+    game.run_frames(120)
+    assert body not in game.physics.sleeping
+
+
+def test_stacks_sleep_as_one_island():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    bottom = game.create_entity((0, 1.05, 0), do_gravity=True)
+    top = game.create_entity((0, 2.1, 0), do_gravity=True)
+    game.run_frames(120)
+    assert game.physics.sleeping[bottom] == game.physics.sleeping[top] == {bottom, top}
+
+    # waking one wakes the whole stack
+    top.velocity = glm.vec3(0, 1, 0)
+    assert bottom not in game.physics.sleeping and top not in game.physics.sleeping
+
+
+def test_scripts_wake_sleeping_bodies():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    body.position = glm.vec3(5, 5, 0)
+    assert body not in game.physics.sleeping
+    game.run_frames(10)
+    assert body.position.y < 5
+
+
+def test_removing_support_wakes_bodies():
+    game = FakeGame()
+    floor = game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    game.physics.remove_entity(floor)
+    game.run_frames(60)
+    assert body.position.y < 1
+
+
+def test_moving_support_wakes_bodies():
+    game = FakeGame()
+    floor = game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    floor.position = glm.vec3(0, -0.5, 0)
+    assert body not in game.physics.sleeping
+
+
+def test_real_entities_tell_the_physics_when_they_change(real_entity_class):
+    # the same notifications as above, but sent by Entity.__setattr__ itself
+    game = FakeGame(entity_class=real_entity_class)
+    floor = game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    assert body in game.physics.sleeping
+
+    collider = get_collider(floor)
+    game.dirty_transforms.clear()
+    floor.position = glm.vec3(0, -0.5, 0)
+    assert floor in game.dirty_transforms
+    assert get_collider(floor) is not collider
+    assert body not in game.physics.sleeping
+
+    body.do_gravity = False
+    assert body not in game.physics.moving_bodies
+    body.do_gravity = True
+    game.run_frames(60)
+    assert body.position.y < 1.05
+
+
+def test_falling_bodies_wake_what_they_hit():
+    game = FakeGame()
+    game.create_entity((0, 0, 0))
+    resting = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    assert resting in game.physics.sleeping
+
+    falling = game.create_entity((0, 4, 0), do_gravity=True)
+    for _ in range(120):
+        game.run_frames(1)
+        if resting not in game.physics.sleeping:
+            break
+    assert resting not in game.physics.sleeping
+    assert falling.position.y > resting.position.y
+
+
+def test_only_things_that_moved_are_updated_in_the_broadphase():
+    game = FakeGame()
+    floor = game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    walls = [game.create_entity((x, 0, 5)) for x in range(-20, 20, 2)]
+    game.run_frames(120)
+    assert body in game.physics.sleeping
+
+    read = []
+    get_bounds = game.physics.broadphase.get_bounds
+    game.physics.broadphase.get_bounds = lambda entity: read.append(entity) or get_bounds(entity)
+    game.run_frames(60)
+    assert not read  # everything's static or asleep
+
+    walls[0].position = glm.vec3(0, 0, 0.5)
+    game.run_frames(1)
+    assert read == [walls[0]]
+    assert walls[0] in game.physics.potential_contacts(floor)
+    floor.position = glm.vec3(0, -5, 0)
+    assert floor not in game.physics.potential_contacts(body)
+
+
+def test_find_islands():
+    islands = find_islands(range(6), [(0, 1), (1, 2), (4, 5)])
+    assert sorted(map(sorted, islands)) == [[0, 1, 2], [3], [4, 5]]
+
+
+def test_colliders_are_cached_until_entities_move():
+    game = FakeGame()
+    entity = game.create_entity((0, 0, 0))
+    collider = get_collider(entity)
+    assert get_collider(entity) is collider
+    assert collider.corners.min() == -0.5
+
+    entity.position = glm.vec3(1, 0, 0)
+    moved = get_collider(entity)
+    assert moved is not collider
+    assert moved.corners[0, :, 0].min() == 0.5
+    assert list(moved.centre) == [1, 0, 0]
+
+
+def test_sleeping_bodies_keep_their_colliders():
+    game = FakeGame()
+    floor = game.create_entity((0, 0, 0))
+    body = game.create_entity((0, 1.05, 0), do_gravity=True)
+    game.run_frames(120)
+    floor_collider, body_collider = get_collider(floor), get_collider(body)
+    game.run_frames(10)
+    assert get_collider(floor) is floor_collider and get_collider(body) is body_collider
+
+
+def test_pair_cache_remembers_separating_axes():
+    game = FakeGame()
+    # two boxes falling side by side, close enough for their bounding spheres to overlap, but not touching
+    body1 = game.create_entity((0, 10, 0), do_gravity=True)
+    body2 = game.create_entity((0, 10, 1.2), do_gravity=True)
+    game.run_frames(60)
+    cache = game.physics.pair_cache
+    assert len(cache) == 2
+    assert cache.hit_rate() > 0.95  # only the very first test of each pair should miss
+
+    # once the broad phase stops reporting them, they get forgotten about
+    body2.position = glm.vec3(0, 10, 10)
+    game.run_frames(1)
+    assert len(cache) == 0
+
+
+def fire_at_thin_floor(continuous):
+    game = FakeGame()
+    game.physics.tick_length = 1/20
+    game.physics.continuous = continuous
+    floor = game.create_entity((0, 0, 0))
+    floor.scalar = glm.vec3(4, 0.05, 4)
+    bullet = game.create_entity((0, 5, 0), do_gravity=True)
+    bullet.velocity = glm.vec3(0, -60, 0)  # 3 units per tick, so much further than the floor is thick
+    game.run_frames(40, delta_t=1/20)
+    return bullet
+
+
+def test_fast_bodies_tunnel_without_sweeping():
+    assert fire_at_thin_floor(continuous=False).position.y < 0
+
+
+def test_sweeping_stops_fast_bodies():
+    bullet = fire_at_thin_floor(continuous=True)
+    # it should end up resting on top of the floor (which is 0.025 above 0), not stuck in it or floating above it
+    assert 0.525 <= bullet.position.y < 0.55
+    assert bullet.velocity == glm.vec3(0)
@@ -0,0 +1,147 @@
+import itertools
+from math import inf
+from types import SimpleNamespace
+
+import glm
+import numpy as np
+import pytest
+from hypothesis import given, settings
+from hypothesis.strategies import integers
+
+from enginelib import picking
+
+
+class FakeEntity:
+    """a 1x1x1 cube"""
+    def __init__(self, position, scalar=(1, 1, 1), orientation=glm.quat(1, 0, 0, 0)):
+        corners = [glm.vec3(x, y, z) for x, y, z in itertools.product([-0.5, 0.5], repeat=3)]
+        self.meshes = [SimpleNamespace(corners=corners, centre=glm.vec3(0), bounding_radius=glm.length(glm.vec3(0.5)))]
+        self.bounding_radius = self.meshes[0].bounding_radius
+        self.position = glm.vec3(position)
+        self.orientation = orientation
+        self.scalar = glm.vec3(scalar)
+
+    def generate_model_mat(self):
+        self.model_mat = glm.scale(glm.translate(glm.mat4(1), self.position) * glm.mat4_cast(self.orientation),
+                                   self.scalar)
+        return self.model_mat
+
+
+def test_nearest_entity_is_hit():
+    entities = [FakeEntity((0, 0, z)) for z in (-10, -5, -20)]
+    hit = picking.cast_ray(entities, (0, 0, 0), (0, 0, -1))
+    assert hit.entity is entities[1]
+    assert hit.distance == 4.5
+    assert hit.point == glm.vec3(0, 0, -4.5)
+
+
+def test_missing_everything():
+    entities = [FakeEntity((0, 0, -5))]
+    assert picking.cast_ray(entities, (0, 0, 0), (0, 0, 1)) is None  # it's behind the ray
+    assert picking.cast_ray(entities, (0, 0.6, 0), (0, 0, -1)) is None  # just over the top of it
+    assert picking.cast_ray([], (0, 0, 0), (0, 0, -1)) is None
+
+
+def test_corners_of_bounding_spheres_dont_count():
+    # this goes through the cube's bounding sphere, but not the cube itself
+    entity = FakeEntity((0, 0, -5))
+    assert picking.cast_ray([entity], (0, 0.7, 0), (0, 0, -1)) is None
+
+
+def test_starting_inside_a_box():
+    room = FakeEntity((0, 0, 0), scalar=(20, 20, 20))
+    crate = FakeEntity((0, 0, -5))
+    assert picking.cast_ray([room, crate], (0, 0, 0), (0, 0, -1)).entity is crate
+    assert picking.cast_ray([room, crate], (0, 0, 0), (0, 0, 1)).distance == 10
+
+
+def brute_force(entities, origin, direction):
+    best = inf, None
+    for entity in entities:
+        collider = picking.get_collider(entity)
+        for corners, axes in zip(collider.corners, collider.axes):
+            distance = picking.ray_box_distance(origin, direction, corners, axes)
+            if distance < best[0]:
+                best = distance, entity
+    return best
+
+
+@settings(deadline=None)
+@given(integers(0, 2**32 - 1))
+def test_tree_matches_brute_force(seed):
+    rng = np.random.RandomState(seed)
+    entities = [FakeEntity(rng.uniform(-10, 10, 3), rng.uniform(0.2, 3, 3),
+                           glm.angleAxis(rng.uniform(0, 6.3), glm.normalize(glm.vec3(*rng.normal(size=3)))))
+                for _ in range(40)]
+    tree = picking.EntityTree()
+    tree.update(entities)
+    for _ in range(20):
+        origin = rng.uniform(-15, 15, 3)
+        direction = rng.normal(size=3)
+        direction /= np.linalg.norm(direction)
+        hit = tree.cast_ray(origin, direction)
+        distance, entity = brute_force(entities, origin, direction)
+        if entity is None:
+            assert hit is None
+        else:
+            assert hit.distance == pytest.approx(distance)
+
+
+def test_tree_is_only_rebuilt_when_something_moves():
+    entities = [FakeEntity((0, 0, -5))]
+    tree = picking.EntityTree()
+    tree.update(entities)
+    sphere_tree = tree.tree
+    tree.update(entities)
+    assert tree.tree is sphere_tree
+
+    entities[0].position = glm.vec3(0, 0, -8)
+    entities[0]._collider = None  # what setting the position on a real entity does
+    tree.update(entities)
+    assert tree.tree is not sphere_tree
+    assert tree.cast_ray((0, 0, 0), (0, 0, -1)).distance == 7.5
+
+
+class FakeCamera:
+    def __init__(self, position):
+        self.position = glm.vec3(position)
+
+    def view_matrix(self):
+        return glm.lookAt(self.position, self.position + glm.vec3(0, 0, -1), glm.vec3(0, 1, 0))
+
+
+def make_handle():
+    """like the editor's x axis: a cube moved so its origin's at one end, squashed to (1, 0.1, 0.1), and drawn with
+    axes.vert, so it's always the same size on screen"""
+    handle = FakeEntity((0, 0, 0), scalar=(1, 0.1, 0.1))
+    corners = [glm.vec3(x, y, z) for x, y, z in itertools.product([0, 1], [-0.5, 0.5], [-0.5, 0.5])]
+    radius = glm.length(glm.vec3(1, 0.5, 0.5))
+    handle.meshes = [SimpleNamespace(corners=corners, centre=glm.vec3(0.5, 0, 0), bounding_radius=radius)]
+    handle.bounding_radius = radius
+    handle.screen_scale = 0.3
+    handle.should_render = True
+    return handle
+
+
+@pytest.mark.parametrize('distance', [1, 3, 10, 50])
+def test_clicking_handles_drawn_the_same_size_on_screen(stub_engine, distance):
+    from enginelib import util
+
+    handle = make_handle()
+    game = SimpleNamespace(width=800, height=600, projection=glm.perspective(glm.radians(75), 800 / 600, 0.1, 1000),
+                           camera=FakeCamera((0, 0, distance)), overlay_entities=[handle], entities=[])
+
+    def click(point):
+        """clicks on where that point of the handle's mesh is drawn, the same way axes.vert draws it"""
+        camera_matrix = game.projection * game.camera.view_matrix()
+        scale = (camera_matrix * handle.generate_model_mat()[3]).w * handle.screen_scale
+        clip = camera_matrix * handle.generate_model_mat() * glm.vec4(glm.vec3(point) * scale, 1)
+        x, y = clip.x / clip.w, clip.y / clip.w
+        return util.cast_ray_from_cursor(game, (x / 2 + 0.5) * game.width, (0.5 - y / 2) * game.height)
+
+    for point in ((0.05, 0, 0), (0.5, 0.4, 0), (0.95, 0, 0)):
+        hit = click(point)
+        assert hit is not None and hit.entity is handle
+    # just past the end of it, and just over the top
+    assert click((1.1, 0, 0)) is None
+    assert click((0.5, 0.7, 0)) is None
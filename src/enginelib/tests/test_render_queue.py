@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import glm
+from hypothesis import given
+from hypothesis.strategies import floats, integers, lists, tuples
+
+from enginelib.render_queue import RenderQueue
+
+programs = [object() for _ in range(4)]
+textures = [SimpleNamespace(texture=name) for name in range(1, 5)]
+meshes = [[SimpleNamespace(textures={0: textures[i % 4], 1: textures[(i + 1) % 4]})] for i in range(6)]
+coordinates = floats(-50, 50)
+# (layer, program, mesh, position)
+entity_data = lists(tuples(integers(0, 2), integers(0, 3), integers(0, 5), tuples(coordinates, coordinates, coordinates)),
+                    max_size=40)
+
+
+class FakeEntity:
+    def __init__(self, layer, program, mesh, position):
+        self.render_layer = layer
+        self.shader_program = programs[program]
+        self.meshes = meshes[mesh]
+        self.position = glm.vec3(position)
+
+    def generate_model_mat(self):
+        return glm.translate(glm.mat4(1), self.position)
+
+
+def state(entity):
+    return entity.render_layer, id(entity.shader_program), id(entity.meshes)
+
+
+@given(entity_data)
+def test_same_state_is_drawn_together(data):
+    entities = [FakeEntity(*item) for item in data]
+    queue = RenderQueue()
+    ordered = queue.sort(entities, glm.vec3(0), 100)
+    assert sorted(map(id, ordered)) == sorted(map(id, entities))
+
+    # everything with the same layer, program and meshes is in one run, and the layers are in order
+    runs = [state(entity) for i, entity in enumerate(ordered) if i == 0 or state(entity) != state(ordered[i - 1])]
+    assert len(runs) == len(set(runs))
+    assert [entity.render_layer for entity in ordered] == sorted(entity.render_layer for entity in entities)
+    assert queue.program_changes == len({(entity.render_layer, id(entity.shader_program)) for entity in entities})
+
+    # and each run is drawn front to back
+    for previous, entity in zip(ordered, ordered[1:]):
+        if state(previous) == state(entity):
+            assert glm.length(previous.position) <= glm.length(entity.position) + 100 / RenderQueue.max_depth
+
+
+@given(entity_data)
+def test_running_out_of_ids(data):
+    queue = RenderQueue()
+    queue.program_bits = queue.mesh_bits = queue.texture_bits = 1  # so the ids are forgotten all the time
+    entities = [FakeEntity(*item) for item in data]
+    for _ in range(2):
+        ordered = queue.sort(entities, glm.vec3(0), 100)
+    assert sorted(map(id, ordered)) == sorted(map(id, entities))
+
+
+def test_keys_are_cached_until_the_program_changes():
+    queue = RenderQueue()
+    entity = FakeEntity(0, 0, 0, (0, 0, 0))
+    key = queue.state_key(entity)
+    assert queue.state_key(entity) == key
+    entity.shader_program = programs[1]
+    assert queue.state_key(entity) != key
@@ -0,0 +1,143 @@
+from hypothesis import given
+from hypothesis.strategies import integers, lists, sampled_from, tuples
+import pytest
+
+# the resource manager doesn't touch GL, but it's part of the engine
+engine = pytest.importorskip('engine')
+
+
+class Thing:
+    """something to cache (resources are tracked by identity, so it can't be something like an int)"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+def add(manager, key, size, kind='texture'):
+    return manager.add(kind, key, Thing(key), size)
+
+
+def test_unused_resources_are_evicted_least_recently_used_first():
+    manager = engine.ResourceManager(budget=30)
+    a, b, c = add(manager, 'a', 10), add(manager, 'b', 10), add(manager, 'c', 10)
+    assert manager.get('texture', 'a') is a  # so b is the least recently used now
+    d = add(manager, 'd', 10)
+    assert manager.get('texture', 'b') is None
+    assert [manager.get('texture', key) for key in 'acd'] == [a, c, d]
+    assert manager.total_size == 30
+    assert manager.evicted == 1
+
+
+def test_resources_are_kept_while_theyre_used():
+    manager = engine.ResourceManager(budget=20)
+    a = add(manager, 'a', 10)
+    manager.acquire(a)
+    manager.acquire(a)
+    b = add(manager, 'b', 10)
+    # over budget, but a's still being used, so the unused b goes instead
+    add(manager, 'c', 10)
+    assert manager.get('texture', 'a') is a
+    assert manager.get('texture', 'b') is None
+
+    manager.release(a)
+    d = add(manager, 'd', 10)
+    assert manager.get('texture', 'a') is a  # one user left
+    manager.release(a)
+    assert manager.get('texture', 'a') is a  # nothing's using it, but there's room for it
+    manager.budget = 10
+    manager.evict()
+    # a was used more recently than d
+    assert manager.get('texture', 'd') is None
+    assert manager.get('texture', 'a') is a
+    assert manager.total_size == 10
+    # these are ignored, since they aren't cached (any more)
+    manager.release(d)
+    manager.acquire(b)
+    manager.resize(b, 1000)
+    assert manager.total_size <= manager.budget
+
+
+def test_whats_added_isnt_evicted_to_make_room_for_itself():
+    manager = engine.ResourceManager(budget=10)
+    big = add(manager, 'big', 100)
+    assert manager.get('texture', 'big') is big
+    manager.acquire(big)
+    manager.resize(big, 200)
+    assert manager.stats()['total_size'] == 200
+
+
+def test_readding_a_key_thats_used():
+    manager = engine.ResourceManager()
+    old = add(manager, 'a', 10)
+    manager.acquire(old)
+    new = add(manager, 'a', 5)
+    assert manager.get('texture', 'a') is new
+    assert manager.total_size == 5
+    # the old one's forgotten about, so whatever's still using it doesn't affect the new one
+    manager.release(old)
+    manager.acquire(new)
+    manager.release(old)
+    assert manager.stats()['texture']['users'] == 1
+    manager.release(new)
+    manager.evict(everything=True)
+    assert manager.get('texture', 'a') is None
+    assert manager.total_size == 0
+
+
+def test_stats():
+    manager = engine.ResourceManager(budget=100)
+    texture = add(manager, 't', 10)
+    add(manager, 'u', 20)
+    model = add(manager, 'm', 30, kind='model')
+    manager.acquire(texture)
+    manager.acquire(model)
+    manager.acquire(model)
+    stats = manager.stats()
+    assert stats['texture'] == {'count': 2, 'size': 30, 'unused': 1, 'unused_size': 20, 'users': 1}
+    assert stats['model'] == {'count': 1, 'size': 30, 'unused': 0, 'unused_size': 0, 'users': 2}
+    assert stats['program'] == {'count': 0, 'size': 0, 'unused': 0, 'unused_size': 0, 'users': 0}
+    assert (stats['total_size'], stats['budget'], stats['evicted']) == (60, 100, 0)
+
+
+@given(lists(tuples(sampled_from(['add', 'acquire', 'release', 'resize', 'get', 'evict']),
+                    sampled_from('abcde'), integers(0, 20))))
+def test_budget_and_users(operations):
+    manager = engine.ResourceManager(budget=30)
+    values = {}
+    users = {}  # {key: users}, for what the manager should still have
+    for operation, key, size in operations:
+        if operation == 'add':
+            values[key] = add(manager, key, size)
+            users[key] = 0
+        elif operation == 'get':
+            manager.get('texture', key)
+        elif operation == 'evict':
+            manager.evict(everything=size < 5)
+        elif key in values:
+            if operation == 'acquire':
+                manager.acquire(values[key])
+                if key in users:
+                    users[key] += 1
+            elif operation == 'release':
+                manager.release(values[key])
+                if users.get(key):
+                    users[key] -= 1
+            else:
+                manager.resize(values[key], size)
+        # anything can be dropped as long as nothing's using it, but nothing that's being used ever is
+        for cached in list(users):
+            value = manager.get('texture', cached)
+            if value is None:
+                assert not users.pop(cached)
+            else:
+                assert value is values[cached]
+        stats = manager.stats()['texture']
+        assert stats['users'] == sum(users.values())
+        assert stats['count'] == len(users)
+        # the only way to be over budget is if what's being used (or was just added) doesn't fit
+        if manager.total_size > manager.budget:
+            assert stats['unused'] <= 1
+        assert manager.total_size == stats['size']
@@ -0,0 +1,82 @@
+import glm
+import numpy as np
+from hypothesis import given
+from hypothesis.strategies import floats, lists, tuples
+
+from enginelib.transforms import TransformStore
+
+coordinates = floats(-100, 100)
+vectors = tuples(coordinates, coordinates, coordinates)
+scales = tuples(floats(0.1, 10), floats(0.1, 10), floats(0.1, 10))
+angles = floats(0, 6.3)
+transforms = lists(tuples(vectors, angles, vectors, scales), min_size=1, max_size=20)
+
+
+class FakeEntity:
+    def __init__(self, position, orientation, scalar):
+        self.position = position
+        self.orientation = orientation
+        self.scalar = scalar
+
+
+def make_entity(position, angle, axis, scalar):
+    axis = glm.vec3(axis) if glm.length(glm.vec3(axis)) > 0.01 else glm.vec3(0, 1, 0)
+    return FakeEntity(glm.vec3(position), glm.angleAxis(angle, glm.normalize(axis)), glm.vec3(scalar))
+
+
+def glm_model_mat(entity):
+    return glm.scale(glm.translate(glm.mat4(1), entity.position) * glm.mat4_cast(entity.orientation), entity.scalar)
+
+
+def assert_close(mat1, mat2):
+    assert np.allclose(np.array(mat1), np.array(mat2), rtol=1e-4, atol=1e-3)
+
+
+@given(transforms)
+def test_matrices_match_glm(transform_data):
+    store = TransformStore(capacity=4)  # small, so it has to grow
+    entities = [make_entity(*data) for data in transform_data]
+    for entity in entities:
+        store.add(entity)
+    for entity in entities:
+        assert_close(store.model_mat(entity), glm_model_mat(entity))
+
+
+@given(transforms, vectors)
+def test_setting_transforms(transform_data, new_position):
+    store = TransformStore()
+    entities = [make_entity(*data) for data in transform_data]
+    for entity in entities:
+        store.add(entity)
+    store.update()
+    assert not store.dirty.any()
+
+    # what setting entity.position does to a real entity
+    entities[0].position = glm.vec3(new_position)
+    store.set(entities[0], 'position', entities[0].position)
+    assert store.dirty.sum() == 1
+    assert_close(store.model_mat(entities[0]), glm_model_mat(entities[0]))
+
+
+@given(transforms)
+def test_transformation_matrices(transform_data):
+    store = TransformStore()
+    entities = [make_entity(*data) for data in transform_data]
+    for entity in entities:
+        store.add(entity)
+    projection_times_view = glm.perspective(1, 1.5, 0.1, 100) * glm.lookAt(glm.vec3(5, 5, 5), glm.vec3(0), glm.vec3(0, 1, 0))
+    matrices = store.transformation_matrices(projection_times_view, entities[::-1])
+    for entity, matrix in zip(entities[::-1], matrices):
+        assert_close(matrix, projection_times_view * glm_model_mat(entity))
+
+
+def test_removed_slots_are_reused():
+    store = TransformStore()
+    entities = [make_entity((i, 0, 0), 0, (0, 1, 0), (1, 1, 1)) for i in range(3)]
+    for entity in entities:
+        store.add(entity)
+    store.remove(entities[1])
+    new_entity = make_entity((5, 0, 0), 0, (0, 1, 0), (1, 1, 1))
+    store.add(new_entity)
+    assert store.used == 3 and len(store) == 3
+    assert_close(store.model_mat(new_entity), glm_model_mat(new_entity))
@@ -0,0 +1,114 @@
+"""
+Optional structure-of-arrays storage for entity transforms (turned on with `Game(use_transform_store=True)`).
+
+Every entity gets a slot (a row) in a set of contiguous arrays: positions, orientations, scales and model matrices.
+Entities still have their normal glm attributes, but setting `position`, `orientation` or `scalar` also writes it
+into the arrays and marks the slot as dirty. Then, instead of each entity building its own model matrix in python,
+every dirty matrix is rebuilt in one vectorised call, and the renderer gets every projection * view * model matrix
+in one go as well.
+
+The matrices are stored the normal (maths) way round, ie row major, with the translation in the last column
+"""
+import glm
+import numpy as np
+
+
+def model_matrices(positions, orientations, scales):
+    """
+    builds translate * rotate * scale matrices for arrays of positions (n, 3), orientations (n, 4, as w, x, y, z)
+    and scales (n, 3). Returns an array of shape (n, 4, 4)
+    """
+    w, x, y, z = orientations.T
+    matrices = np.zeros((len(positions), 4, 4), dtype=positions.dtype)
+    # the rotation matrix of a unit quaternion, with each column multiplied by the scale on that axis
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - w * z)
+    matrices[:, 0, 2] = 2 * (x * z + w * y)
+    matrices[:, 1, 0] = 2 * (x * y + w * z)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - w * x)
+    matrices[:, 2, 0] = 2 * (x * z - w * y)
+    matrices[:, 2, 1] = 2 * (y * z + w * x)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    matrices[:, :3, :3] *= scales[:, None, :]
+    matrices[:, :3, 3] = positions
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+class TransformStore:
+    attribute_arrays = {'position': 'positions', 'orientation': 'orientations', 'scalar': 'scales'}
+
+    def __init__(self, capacity=64):
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.orientations = np.zeros((capacity, 4), dtype=np.float32)
+        self.scales = np.ones((capacity, 3), dtype=np.float32)
+        self.matrices = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.dirty = np.zeros(capacity, dtype=np.bool_)
+        self.slots = {}  # {entity: index of its row}
+        self.free_slots = []
+        self.used = 0  # every slot at or after this is free
+
+    def __contains__(self, entity):
+        return entity in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, entity):
+        if entity in self.slots:
+            return
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.used == len(self.dirty):
+                self._grow()
+            slot = self.used
+            self.used += 1
+        self.slots[entity] = slot
+        for name in self.attribute_arrays:
+            self.set(entity, name, getattr(entity, name))
+
+    def remove(self, entity):
+        slot = self.slots.pop(entity, None)
+        if slot is not None:
+            self.dirty[slot] = False
+            self.free_slots.append(slot)
+
+    def set(self, entity, name, value):
+        """called when one of the entity's transform attributes is set. Does nothing for entities that aren't stored"""
+        slot = self.slots.get(entity)
+        if slot is None:
+            return
+        if name == 'orientation':
+            value = (value.w, value.x, value.y, value.z)
+        getattr(self, self.attribute_arrays[name])[slot] = value
+        self.dirty[slot] = True
+
+    def update(self):
+        """rebuilds every dirty model matrix, all at once"""
+        dirty = np.flatnonzero(self.dirty[:self.used])
+        if not dirty.size:
+            return
+        self.matrices[dirty] = model_matrices(self.positions[dirty], self.orientations[dirty], self.scales[dirty])
+        self.dirty[dirty] = False
+
+    def model_mat(self, entity):
+        slot = self.slots[entity]
+        if self.dirty[slot]:
+            self.update()
+        return glm.mat4(self.matrices[slot])
+
+    def transformation_matrices(self, projection_times_view, entities):
+        """returns projection * view * model for each of the entities, as an array of shape (n, 4, 4)"""
+        self.update()
+        slots = np.fromiter((self.slots[entity] for entity in entities), dtype=np.intp)
+        return np.matmul(np.array(projection_times_view, dtype=np.float32), self.matrices[slots])
+
+    def _grow(self):
+        capacity = len(self.dirty) * 2
+        for name in ('positions', 'orientations', 'scales', 'matrices', 'dirty'):
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
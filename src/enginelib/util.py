@@ -2,6 +2,8 @@ import glm
 import engine
 import importlib.util
 
+from enginelib import picking
+
 
 def rotate_vec3(vec, angle, axis):
     return glm.vec3(glm.rotate(glm.mat4(1), angle, axis) * glm.vec4(vec, 1))
@@ -26,7 +28,7 @@ def rbg_to_id(r, g, b):
 def draw_entity_click_hack(i, entity):
     # ensure both shader programs use the same vertex shader
     if entity.shader_program.paths[0] != entity._click_shader.paths[0]:
-        entity._click_shader = engine.ShaderProgram(entity.shader_program.paths[0], 'shaders/clickHack.frag')
+        entity._click_shader = engine.get_shader_program(entity.shader_program.paths[0], 'shaders/clickHack.frag')
     # render
     entity._click_shader.set_value('entityColour', id_to_rgb(i))
     entity.set_transform_matrix(entity._click_shader)
@@ -38,7 +40,8 @@ def get_entity_at_pos(game, x, y):
     returns the entity at a given position. Draws to the screen, so dont use this while rendering
 
     Assigns an id in the form (0-255, 0-255, 0-255) to each object, draw it in that colour, then check what the colour
-    the pixel at that point is. Kinda slow, bit of a hack, but it works for now
+    the pixel at that point is. Kinda slow, bit of a hack, and it has to wait for the gpu to finish,
+    so the editor uses cast_ray_from_cursor instead
     """
 
     # set background to white
@@ -71,6 +74,26 @@ def get_entity_at_pos(game, x, y):
     return entity_list[index]
 
 
+def cast_ray_from_cursor(game, x, y, trees=None):
+    """
+    returns a picking.RayHit for the entity at a given position on the screen (in pixels), or None for the background.
+    Casts a ray from the camera on the cpu, so unlike get_entity_at_pos it doesn't draw anything.
+    Overlay entities (like axes) are checked first, since they're drawn on top of everything else.
+    Passing the same trees (a picking.EntityTree for the overlay entities and one for the rest) each time means the
+    trees only get rebuilt when something has moved
+    """
+    if trees is None:
+        trees = (picking.EntityTree(), picking.EntityTree())
+    vector, _ = get_world_space_vector(game, to_ndc(game, x, y))
+    camera_matrix = game.projection * game.camera.view_matrix()  # for things drawn the same size on screen, like axes
+    for tree, entities in zip(trees, (game.overlay_entities, game.entities)):
+        tree.update((entity for entity in entities if entity.should_render), camera_matrix)
+        hit = tree.cast_ray(game.camera.position, vector.xyz)
+        if hit is not None:
+            return hit
+    return None
+
+
 def get_world_space_vector(game, pos_on_screen):
     old_pos = game.camera.position
     game.camera.position = glm.vec3(0, 0, 0)
@@ -6,6 +6,8 @@ from enginelib import util
 
 class Axis(ManualEntity):
     clickable = False
+    inherit_scale = False  # the axes are attached to the selected object, but stay the same size
+    screen_scale = 0.3  # reciprScaleOnscreen in shaders/axes.vert, so they're clicked on where they're drawn
 
     def __init__(self, *args, game, data, unit_vector, should_render, **kwargs):
         # awful hack to set the origin in the right place
@@ -22,6 +24,7 @@ class Axis(ManualEntity):
         self.parent_start_pos = None
         self.is_dragging = False
         self.should_render = False
+        del self.savable_attributes['parent_id']  # whatever's selected when saving shouldn't stay selected
 
         # dont bother using hooks if not in editor mode
         if not isinstance(game, Editor):
@@ -31,30 +34,29 @@ class Axis(ManualEntity):
         self.game.add_callback('on_drag_update', self.move_axis, editor=True)
         self.game.add_callback('on_click_entity', self.on_click_entity, editor=True)
         self.game.add_callback('on_drag', self.reset_variables, editor=True)  # once the drag finishes, reset everything to none
-        self.game.add_callback('before_frame', self.update_variables, editor=True)
+        self.game.add_callback('on_select_entity', self.follow, editor=True)
 
     def remove(self):
         self.game.remove_callback('on_drag_update', self.move_axis)
         self.game.remove_callback('on_click_entity', self.on_click_entity)
         self.game.remove_callback('on_drag', self.reset_variables)
-        self.game.remove_callback('before_frame', self.update_variables)
+        self.game.remove_callback('on_select_entity', self.follow)
 
     def reset_variables(self, *_args):
         self.offset = None
         self.parent_start_pos = None
         self.is_dragging = False
 
-    def update_variables(self, *_args):
-        if self.game.selected_object is not None:
-            self.position = self.game.selected_object.position
-            self.orientation = self.game.selected_object.orientation
-            self.should_render = True
-        else:
-            self.should_render = False
+    def follow(self, entity):
+        """attaches the axis to the newly selected entity, so it moves with it without having to be updated every frame"""
+        self.set_parent(entity)
+        self.position = glm.vec3(0, 0, 0)
+        self.orientation = glm.quat(1, 0, 0, 0)
+        self.should_render = entity is not None
 
     def set_drag_start_pos(self):
         self.is_dragging = True
-        drag_start_pos = util.get_point_closest_to_cursor(self.game, self.position,
+        drag_start_pos = util.get_point_closest_to_cursor(self.game, self.game.selected_object.position,
                                                           self.vector(), self.game.cursor_location)
         self.offset = self.game.selected_object.position - drag_start_pos
         self.parent_start_pos = self.game.selected_object.position
@@ -1,28 +1,21 @@
-import glm
-
 from enginelib import script
-from enginelib.physics import two_entities_intersect
 
 
 class Physics(script.Script):
-    gravity = glm.vec3(0, -1, 0)
-
+    """Gives the entity gravity and collisions.
+    The simulation itself is done by game.physics, which steps every body at once, so this just sets the flags"""
     def __init__(self, *args, **kwargs):
         super(Physics, self).__init__(*args, **kwargs)
+        self.parent.do_gravity = True
+        # collisions are left alone if they're already on (including when loading, since the flag's saved with the
+        # entity), so removing this only turns them off if it was what turned them on
+        self.set_collisions = not self.parent.do_collisions
+        if self.set_collisions:
+            self.parent.do_collisions = True
 
-    @script.every_n_ms(16)
-    def do_gravity(self, delta_t):
-        # only run every 1/60th of a second or so
-
-        self.parent.velocity += self.gravity * delta_t
-        self.parent.position += self.parent.velocity * delta_t
-        self.parent.set_transform_matrix()
-
-        for other_entity in self.game.entities:
-            if other_entity is self.parent:
-                continue
-            if two_entities_intersect(self.parent, other_entity):
-                # don't
-                self.parent.position -= self.parent.velocity * delta_t
-                self.parent.velocity = glm.vec3(0, 0, 0)
-                break
+    def remove(self):
+        # this is what gives the entity gravity, so without it, it doesn't have any
+        self.parent.do_gravity = False
+        if self.set_collisions:
+            self.parent.do_collisions = False
+        super(Physics, self).remove()
@@ -1,6 +1,9 @@
 #version 330 core
 layout (location = 0) in vec3 aPos;
 layout (location = 1) in vec2 aTexCoord;
+#ifdef INSTANCED
+in mat4 instanceMatrix;
+#endif
 
 out vec2 TexCoord;
 
@@ -8,6 +11,10 @@ uniform mat4 transformMat;
 
 void main()
 {
+#ifdef INSTANCED
+    gl_Position = transformMat * instanceMatrix * vec4(aPos, 1.0);
+#else
     gl_Position = transformMat * vec4(aPos, 1.0);
+#endif
     TexCoord = aTexCoord;
 }
\ No newline at end of file